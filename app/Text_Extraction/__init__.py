@@ -0,0 +1,4 @@
+# __init__.py
+"""
+Math OCR for problem images. Run the example with `python -m app.Text_Extraction [image_path]`.
+"""
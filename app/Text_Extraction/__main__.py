@@ -0,0 +1,16 @@
+import sys
+
+from .ocr import extract_math_from_image, extract_math_from_images
+
+if __name__ == "__main__":
+    image_paths = sys.argv[1:] or ["data/images/Equations.jpg"]
+    if len(image_paths) == 1:
+        extracted_content = extract_math_from_image(image_paths[0])
+        if extracted_content:
+            print("\nExtracted Content:")
+            print(extracted_content)
+    else:
+        # Several images (e.g. worksheet pages) are sent in batched requests
+        for image_path, extracted_content in zip(image_paths, extract_math_from_images(image_paths)):
+            print(f"\nExtracted Content of {image_path}:")
+            print(extracted_content if extracted_content else "❌ Text extraction failed.")
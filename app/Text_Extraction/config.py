@@ -9,7 +9,4 @@ load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL_ID = os.getenv("GEMINI_MODEL_ID")
 
-if not GEMINI_API_KEY or not GEMINI_MODEL_ID:
-    raise ValueError("API key or model ID is missing in the .env file!")
-
-print("API Key and Model ID loaded successfully!")
\ No newline at end of file
+# Missing settings are reported by extract_math_from_image when it is called, not at import.
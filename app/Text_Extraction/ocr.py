@@ -1,10 +1,14 @@
 
 
 # ocr.py
-import requests
 import os
-import base64
-from config import GEMINI_API_KEY, GEMINI_MODEL_ID
+from .config import GEMINI_API_KEY, GEMINI_MODEL_ID
+
+# The pooled Gemini client, the OCR cache and the single-image OCR path (with its prompt) are
+# shared with app/models, so the same image is cached and coalesced whichever entry point gets it
+from ..models.gemini_client import get_client
+from ..models.image_ocr import OCR_PROMPT, ocr_image_bytes_async
+from ..models.batch_ocr import ocr_images_batched_async, OCR_BATCH_MAX_IMAGES, OCR_BATCH_MAX_BYTES
 
 # Assuming config.py is in the same directory or accessible via PYTHONPATH
 # from config import GEMINI_API_KEY, GEMINI_MODEL_ID
@@ -15,9 +19,10 @@ from config import GEMINI_API_KEY, GEMINI_MODEL_ID
 # Get your API key from Google AI Studio: https://aistudio.google.com/app/apikey
  # Or "gemini-pro-vision" if you prefer
 
-def extract_math_from_image(image_path):
+async def extract_math_from_image_async(image_path):
     """
-    Extracts text and mathematical expressions from an image using Gemini API.
+    Async version of extract_math_from_image using the shared pooled client, so several
+    users' images can be processed concurrently.
 
     :param image_path: Path to the image file
     :return: Extracted text and mathematical expressions
@@ -30,74 +35,102 @@ def extract_math_from_image(image_path):
         print(f"Error: Image file not found at '{absolute_image_path}'")
         return None
 
-    # Check if the API key is provided
-    if not GEMINI_API_KEY:
-        print("Error: GEMINI_API_KEY is not set. Please provide your API key.")
+    # Check if the API key and model ID are provided
+    if not GEMINI_API_KEY or not GEMINI_MODEL_ID:
+        print("Error: GEMINI_API_KEY or GEMINI_MODEL_ID is not set. Please add them to your .env file.")
         return None
 
-    # Correct Gemini API endpoint for generateContent
-    # The API key is passed as a query parameter
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL_ID}:generateContent?key={GEMINI_API_KEY}"
-
-    headers = {
-        "Content-Type": "application/json",
-    }
+    model_id = f"models/{GEMINI_MODEL_ID}"
 
     try:
         with open(absolute_image_path, "rb") as img_file:
-            # Encode image data to base64 for the API request
-            image_data_base64 = base64.b64encode(img_file.read()).decode('utf-8')
-
-        # Correct payload structure for Gemini API image input
-        payload = {
-            "contents": [
-                {
-                    "parts": [
-                        {"text": "Extract all text and mathematical expressions from this image."},
-                        {
-                            "inlineData": {
-                                "mimeType": "image/jpeg", # Adjust mimeType based on your image type (e.g., image/png)
-                                "data": image_data_base64
-                            }
-                        }
-                    ]
-                }
-            ]
-        }
-
-        response = requests.post(url, headers=headers, json=payload)
-
-        if response.status_code == 200:
-            data = response.json()
-            # Correctly parse the response for the generated text
-            if data and data.get('candidates') and data['candidates'][0].get('content') and data['candidates'][0]['content'].get('parts'):
-                extracted_text = data['candidates'][0]['content']['parts'][0].get('text', "")
-                return extracted_text
-            else:
-                print(f"Error: Unexpected response structure from Gemini API: {data}")
-                return None
-        else:
-            print(f"Error: {response.status_code} - {response.text}")
-            return None
-    except requests.exceptions.RequestException as e:
-        print(f"Network or API request error: {e}")
-        return None
+            image_bytes = img_file.read()
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         return None
+    return await _extract_math_from_bytes_async(image_bytes, absolute_image_path, model_id)
 
-# Path where the image is stored.
-# IMPORTANT: Make sure 'data/images/test.jpeg' is the correct relative path
-# from where you are running this script, or provide an absolute path.
-# For example, if 'ocr.py' is in 'app/' and 'test.jpeg' is in 'app/data/images/',
-# then 'data/images/test.jpeg' is correct if you run the script from 'app/'.
-# If you run it from the parent directory 'AskMath.ai/', then the path should be 'app/data/images/test.jpeg'.
-image_path = "data/images/Equations.jpg"
-
-# Example of using an absolute path if you know the exact location:
-# image_path = "C:\\Users\\Tanjim\\Documents\\AskMath.ai\\AskMath.ai\\app\\data\\images\\test.jpeg"
-
-extracted_content = extract_math_from_image(image_path)
-if extracted_content:
-    print("\nExtracted Content:")
-    print(extracted_content)
+async def _extract_math_from_bytes_async(image_bytes, image_path, model_id, upload=None):
+    """
+    Single-image OCR of bytes already read, through the cached and coalesced path shared
+    with app/models (see models/image_ocr.py). upload is the already preprocessed
+    (upload_bytes, mime_type) when the batched path falls back to this one.
+    """
+    return await ocr_image_bytes_async(image_bytes, GEMINI_API_KEY, model_id, image_path, upload)
+
+async def extract_math_from_images_async(image_paths, max_images=OCR_BATCH_MAX_IMAGES, max_bytes=OCR_BATCH_MAX_BYTES):
+    """
+    OCR several images (e.g. the pages of a worksheet) with as few Gemini requests as
+    possible: up to max_images images and max_bytes bytes are sent per request, and the
+    answer is split back per image. Images whose batched answer cannot be split are
+    retried one request per image, like extract_math_from_image_async.
+
+    :param image_paths: List of image file paths.
+    :param max_images: Most images per request.
+    :param max_bytes: Most (preprocessed) image bytes per request.
+    :return: List with the extracted text for each image, or None where extraction failed.
+    """
+    if not GEMINI_API_KEY or not GEMINI_MODEL_ID:
+        print("Error: GEMINI_API_KEY or GEMINI_MODEL_ID is not set. Please add them to your .env file.")
+        return [None] * len(image_paths)
+
+    model_id = f"models/{GEMINI_MODEL_ID}"
+
+    # Missing or unreadable files get None; the rest are extracted together
+    images = []
+    positions = []
+    for position, image_path in enumerate(image_paths):
+        absolute_image_path = os.path.abspath(image_path)
+        try:
+            with open(absolute_image_path, "rb") as img_file:
+                images.append((img_file.read(), absolute_image_path))
+            positions.append(position)
+        except OSError as e:
+            print(f"Error: Could not read image '{absolute_image_path}': {e}")
+
+    texts = await ocr_images_batched_async(
+        images, OCR_PROMPT, GEMINI_API_KEY, model_id,
+        lambda image_bytes, image_path, upload: _extract_math_from_bytes_async(image_bytes, image_path, model_id, upload),
+        max_images, max_bytes,
+    )
+    results = [None] * len(image_paths)
+    for position, text in zip(positions, texts):
+        results[position] = text
+    return results
+
+def extract_math_from_images(image_paths, max_images=OCR_BATCH_MAX_IMAGES, max_bytes=OCR_BATCH_MAX_BYTES):
+    """
+    Extracts text and mathematical expressions from several images with batched Gemini requests.
+
+    :param image_paths: List of image file paths
+    :param max_images: Most images per request
+    :param max_bytes: Most image bytes per request
+    :return: List of extracted texts (None where extraction failed)
+    """
+    return get_client(GEMINI_API_KEY).run(extract_math_from_images_async(image_paths, max_images, max_bytes))
+
+def extract_math_from_image(image_path):
+    """
+    Extracts text and mathematical expressions from an image using Gemini API.
+
+    :param image_path: Path to the image file
+    :return: Extracted text and mathematical expressions
+    """
+    return get_client(GEMINI_API_KEY).run(extract_math_from_image_async(image_path))
+
+if __name__ == "__main__":
+    # Path where the image is stored.
+    # IMPORTANT: Make sure 'data/images/test.jpeg' is the correct relative path
+    # from where you are running this script, or provide an absolute path.
+    # For example, if 'ocr.py' is in 'app/' and 'test.jpeg' is in 'app/data/images/',
+    # then 'data/images/test.jpeg' is correct if you run the script from 'app/'.
+    # If you run it from the parent directory 'AskMath.ai/', then the path should be 'app/data/images/test.jpeg'.
+    image_path = "data/images/Equations.jpg"
+
+    # Example of using an absolute path if you know the exact location:
+    # image_path = "C:\\Users\\Tanjim\\Documents\\AskMath.ai\\AskMath.ai\\app\\data\\images\\test.jpeg"
+
+    extracted_content = extract_math_from_image(image_path)
+    if extracted_content:
+        print("\nExtracted Content:")
+        print(extracted_content)
@@ -0,0 +1,45 @@
+# __init__.py
+"""
+OCR, embeddings, FAISS search and video recommendation for AskMath.ai.
+
+Importing the package (or any module in it) has no side effects: configuration is read but
+not validated, no request is sent and nothing under data/ is written. The public names below
+are loaded from their submodule on first access, so `from app.models import IndexManager`
+does not pull in the Gemini client, and numpy/faiss/pandas are only imported by the
+functions that use them. Command-line tools run as `python -m app.models <command>`.
+"""
+import importlib
+
+# Public name -> submodule that defines it
+_EXPORTS = {
+    "IndexManager": "index_manager",
+    "ShardedIndex": "sharded_index",
+    "get_index_manager": "index_holder",
+    "get_video_metadata": "video_metadata",
+    "chunk_text": "embedding",
+    "generate_embeddings_for_chunk": "embedding",
+    "generate_embeddings_for_chunks": "embedding",
+    "search_semantic_batch": "search",
+    "route_queries": "query_router",
+    "extract_text_from_image": "video_recommendation",
+    "recommend_video_from_image": "video_recommendation",
+    "recommend_videos_batch": "video_recommendation",
+    "recommend_videos_from_images": "video_recommendation",
+    "ingest_pdf": "ingest",
+    "RecommendationServer": "server",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
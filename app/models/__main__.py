@@ -0,0 +1,34 @@
+# __main__.py
+import runpy
+import sys
+
+# Command -> (module whose __main__ block implements it, description). Only the chosen
+# module is imported, so `python -m app.models shards list` never loads the Gemini client.
+COMMANDS = {
+    "ingest": ("ingest", "Ingest one PDF book into the index or a shard"),
+    "bulk-ingest": ("bulk_ingest", "Ingest a directory of PDF books into per-book shards"),
+    "bulk-search": ("bulk_search", "Recommend videos for a directory of images or a file of questions"),
+    "chunk": ("chunker", "Compare token-budget chunking with the fixed slicer on text files"),
+    "shards": ("sharded_index", "List or search the index shards"),
+    "recommend": ("video_recommendation", "Recommend a video for one problem image"),
+    "serve": ("server", "Run the recommendation HTTP server with micro-batched embedding"),
+    "search": ("search", "Run the example semantic search"),
+    "extract-pdf": ("pdf_extractor", "Extract the text of the example PDF"),
+    "build-sample-index": ("vector_store", "Rebuild data/processed/faiss_index from the sample text"),
+}
+
+
+def print_usage():
+    print("Usage: python -m app.models <command> [options]\n\nCommands:")
+    for command, (_, description) in COMMANDS.items():
+        print(f"  {command:<20}{description}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in COMMANDS:
+        print_usage()
+        sys.exit(0 if len(sys.argv) < 2 or sys.argv[1] in ("-h", "--help") else 2)
+
+    command = sys.argv.pop(1)
+    # alter_sys makes the command the real __main__, so its process-pool workers can unpickle it
+    runpy.run_module(f"{__package__}.{COMMANDS[command][0]}", run_name="__main__", alter_sys=True)
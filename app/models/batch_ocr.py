@@ -0,0 +1,195 @@
+# batch_ocr.py
+import asyncio
+import hashlib
+import json
+import os
+import re
+
+from .gemini_client import get_client, response_text, GeminiAPIError
+from .image_preprocess import preprocess_image, preprocess_signature
+from .metrics import metrics
+from .ocr_cache import get_ocr_cache
+
+# Settings are read from the environment directly because batched OCR is shared by
+# app/models and app/Text_Extraction, which each have their own config.py.
+OCR_BATCH_MAX_IMAGES = int(os.getenv("OCR_BATCH_MAX_IMAGES", "8"))
+# Preprocessed image bytes per request; base64 adds a third, so the default stays under the 20 MB request limit
+OCR_BATCH_MAX_BYTES = int(os.getenv("OCR_BATCH_MAX_BYTES", str(12 * 1024 * 1024)))
+
+BATCH_PROMPT = (
+    "{count} images follow, each one introduced by its number (\"Image 1\", \"Image 2\", ...). "
+    "Handle every image separately: {instruction}\n"
+    "Answer with a JSON array of exactly {count} objects, one per image in order, each of the "
+    "form {{\"image\": <image number>, \"text\": <the result for that image>}}."
+)
+
+# Structured output: Gemini returns JSON matching this schema instead of free text
+BATCH_RESPONSE_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {"image": {"type": "INTEGER"}, "text": {"type": "STRING"}},
+        "required": ["image", "text"],
+    },
+}
+
+_CODE_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+
+def pack_batches(sizes, max_images=OCR_BATCH_MAX_IMAGES, max_bytes=OCR_BATCH_MAX_BYTES):
+    """
+    Group images into requests, keeping their order.
+
+    :param sizes: Size in bytes of each image.
+    :param max_images: Most images per request.
+    :param max_bytes: Most image bytes per request; a larger image gets a request of its own.
+    :return: List of lists of image positions.
+    """
+    batches = []
+    batch, batch_bytes = [], 0
+    for position, size in enumerate(sizes):
+        if batch and (len(batch) >= max_images or batch_bytes + size > max_bytes):
+            batches.append(batch)
+            batch, batch_bytes = [], 0
+        batch.append(position)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def parse_batch_response(text, count):
+    """
+    Split a batched answer back into one text per image.
+
+    :param text: Model output, a JSON array of {"image": n, "text": ...} (code fences allowed).
+    :param count: Number of images sent.
+    :return: List of `count` texts in image order, or None if the answer does not have
+             exactly one text for every image.
+    """
+    if not text:
+        return None
+    try:
+        data = json.loads(_CODE_FENCE.sub("", text))
+    except ValueError:
+        return None
+    if isinstance(data, dict):
+        data = data.get("images") or data.get("results")
+    if not isinstance(data, list):
+        return None
+
+    texts = [None] * count
+    for position, item in enumerate(data):
+        if not isinstance(item, dict) or not isinstance(item.get("text"), str):
+            return None
+        try:
+            index = int(item.get("image", position + 1)) - 1
+        except (TypeError, ValueError):
+            return None
+        if not 0 <= index < count or texts[index] is not None:
+            return None
+        texts[index] = item["text"]
+    if any(text is None for text in texts):
+        return None
+    return texts
+
+
+async def _ocr_batch_async(uploads, instruction, api_key, model_id):
+    """
+    Send several preprocessed images in one generateContent request.
+
+    :param uploads: List of (upload_bytes, mime_type, image_name).
+    :return: List of texts in image order, or None if the request failed or the answer could not be split.
+    """
+    client = get_client(api_key)
+    generation_config = {"responseMimeType": "application/json", "responseSchema": BATCH_RESPONSE_SCHEMA}
+    try:
+        # Large images are uploaded to the Files API here, which can fail like the request itself
+        parts = [{"text": BATCH_PROMPT.format(count=len(uploads), instruction=instruction)}]
+        for number, (upload_bytes, mime_type, image_name) in enumerate(uploads, start=1):
+            parts.append({"text": f"Image {number}:"})
+            parts.append(await client.media_part(upload_bytes, mime_type, image_name and os.path.basename(image_name)))
+
+        with metrics.span("ocr", mode="batch"):
+            data = await client.generate_content(model_id, parts, generation_config)
+    except GeminiAPIError as e:
+        print(f"Error: {e}")
+        return None
+    except Exception as e:
+        # Connection errors and timeouts: the images fall back to one request each
+        print(f"An unexpected error occurred: {e}")
+        return None
+    return parse_batch_response(response_text(data), len(uploads))
+
+
+async def ocr_images_batched_async(images, instruction, api_key, model_id, single_ocr,
+                                   max_images=OCR_BATCH_MAX_IMAGES, max_bytes=OCR_BATCH_MAX_BYTES):
+    """
+    OCR several images with as few generateContent requests as possible.
+
+    Cached images are answered from the OCR cache and identical images are sent once. The
+    rest are preprocessed and packed into requests of up to max_images images and max_bytes
+    bytes; each request asks for a JSON array with one text per image. If a request fails
+    or its answer cannot be split per image, its images fall back to `single_ocr`, one
+    request per image. Results are cached under the same key as single-image OCR. Cache
+    lookups, writes and preprocessing run on worker threads, so the event loop keeps serving
+    other requests meanwhile.
+
+    :param images: List of (image_bytes, image_name); image_name may be None.
+    :param instruction: Per-image instruction, e.g. OCR_PROMPT; part of the cache key.
+    :param api_key: Gemini API key.
+    :param model_id: Full model path, e.g. "models/gemini-2.5-flash".
+    :param single_ocr: Async function (image_bytes, image_name, upload) -> text, the caller's
+                       single-image path; upload is the (upload_bytes, mime_type) already
+                       preprocessed here, so the fallback does not preprocess the image again.
+    :param max_images: Most images per request.
+    :param max_bytes: Most preprocessed image bytes per request.
+    :return: List with the extracted text (or None) for each image.
+    """
+    results = [None] * len(images)
+    loop = asyncio.get_running_loop()
+    cache_model_id = f"{model_id}|{preprocess_signature()}"
+    ocr_cache = get_ocr_cache()
+
+    # Step 1: Answer cached images and group identical ones
+    positions_by_digest = {}
+    for position, (image_bytes, _) in enumerate(images):
+        cached_text = None
+        if ocr_cache is not None:
+            cached_text = await loop.run_in_executor(None, ocr_cache.get, image_bytes, cache_model_id, instruction)
+        if cached_text is not None:
+            results[position] = cached_text
+        else:
+            positions_by_digest.setdefault(hashlib.sha256(image_bytes).hexdigest(), []).append(position)
+    groups = list(positions_by_digest.values())
+    if not groups:
+        return results
+
+    # Step 2: Shrink the uploads, then pack them into requests
+    uploads = []
+    with metrics.span("image_preprocess"):
+        for positions in groups:
+            image_bytes, image_name = images[positions[0]]
+            upload_bytes, mime_type, _ = await loop.run_in_executor(None, preprocess_image, image_bytes, image_name)
+            uploads.append((upload_bytes, mime_type, image_name))
+    batches = pack_batches([len(upload[0]) for upload in uploads], max_images, max_bytes)
+
+    async def run_batch(batch):
+        texts = None
+        if len(batch) > 1:
+            texts = await _ocr_batch_async([uploads[i] for i in batch], instruction, api_key, model_id)
+            metrics.increment("askmath_ocr_batch_total", result="ok" if texts is not None else "fallback")
+        if texts is None:
+            # One request per image, through the caller's cached and coalesced path
+            texts = await asyncio.gather(*(single_ocr(*images[groups[i][0]], uploads[i][:2]) for i in batch))
+        elif ocr_cache is not None:
+            for i, text in zip(batch, texts):
+                await loop.run_in_executor(None, ocr_cache.put, images[groups[i][0]][0], cache_model_id, instruction, text)
+        for i, text in zip(batch, texts):
+            for position in groups[i]:
+                results[position] = text
+
+    # Step 3: Send the requests concurrently (bounded by the client's concurrency limit)
+    await asyncio.gather(*(run_batch(batch) for batch in batches))
+    metrics.increment("askmath_ocr_batch_images_total", len(uploads))
+    return results
@@ -0,0 +1,241 @@
+# bulk_ingest.py
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+from .chapter_map import get_chapter_map, load_chapter_map
+from .config import EMBEDDING_REQUESTS_PER_SECOND, EMBEDDING_BURST
+from .ingest import file_sha256, ingest_pdf
+from .rate_limiter import TokenBucket
+from .sharded_index import FAISS_SHARDS_DIR, ShardedIndex
+
+MANIFEST_FILE = "manifest.json"
+
+
+def shard_name_for(pdf_path, books_dir):
+    """
+    :param pdf_path: Path of a PDF inside books_dir.
+    :param books_dir: Root directory of the books.
+    :return: Shard name from the relative path, e.g. "class9/Algebra Book.pdf" -> "class9-Algebra_Book".
+    """
+    relative = os.path.splitext(os.path.relpath(pdf_path, books_dir))[0]
+    name = "-".join(part for part in re.split(r"[\\/]+", relative) if part)
+    return re.sub(r"\s+", "_", name).lstrip(".")
+
+
+def find_books(books_dir):
+    """
+    :param books_dir: Directory to walk (recursively).
+    :return: Sorted list of PDF paths.
+    """
+    books = []
+    for directory, subdirectories, files in os.walk(books_dir):
+        subdirectories[:] = sorted(name for name in subdirectories if not name.startswith("."))
+        books.extend(os.path.join(directory, name) for name in files if name.lower().endswith(".pdf"))
+    return sorted(books)
+
+
+def load_manifest(manifest_path):
+    """
+    :param manifest_path: Path of the manifest JSON.
+    :return: Dict of shard name -> entry (empty if there is no manifest yet).
+    """
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            return json.load(f).get("books", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest_path, books):
+    """
+    Write the manifest atomically, so an interrupted run never leaves a truncated file.
+
+    :param manifest_path: Path of the manifest JSON.
+    :param books: Dict of shard name -> entry.
+    """
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"books": dict(sorted(books.items()))}, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def ingest_book(pdf_path, shard, shards_dir, reset, tags, options, embedding_rate=None):
+    """
+    Ingest one book into its own shard. Runs inside a pool worker.
+
+    :param pdf_path: Path to the PDF file.
+    :param shard: Shard name.
+    :param shards_dir: Directory containing the shards.
+    :param reset: Drop the shard's previous contents first (the file changed).
+    :param tags: Tags recorded in the shard's shard.json.
+    :param options: Keyword arguments for ingest_pdf.
+    :param embedding_rate: Optional (requests per second, burst) for this worker's embedding requests.
+    :return: Ingestion stats, see ingest_pdf_async.
+    """
+    if embedding_rate is not None:
+        # A limiter of the worker's own: process workers do not share the module-level one
+        options = dict(options, rate_limiter=TokenBucket(*embedding_rate))
+    with ShardedIndex(shards_dir).writer(shard, reset=reset, **tags) as manager:
+        return ingest_pdf(pdf_path, manager, **options)
+
+
+def bulk_ingest(books_dir, shards_dir=FAISS_SHARDS_DIR, workers=2, use_threads=False, force=False,
+                pages_per_request=1, max_concurrency=8, subject=None, grade=None, max_tokens=None, overlap_tokens=None,
+                chapter_map=None):
+    """
+    Ingest every PDF under a directory into per-book shards, skipping unchanged books.
+
+    Books are spread over a process pool (or a thread pool with use_threads); pages of one
+    book are still extracted concurrently inside its worker. The workers share one Gemini
+    budget: each gets an equal part of max_concurrency and of the embedding rate
+    (EMBEDDING_REQUESTS_PER_SECOND, EMBEDDING_BURST), so adding workers does not multiply
+    the requests sent. A book is skipped when its
+    SHA-256 matches a completed manifest entry; a changed book has its shard rebuilt, and
+    a partially ingested one resumes from its checkpoint.
+
+    :param books_dir: Directory of PDF books, walked recursively.
+    :param shards_dir: Directory for the shards and manifest.json.
+    :param workers: Books ingested at the same time.
+    :param use_threads: Use threads instead of processes.
+    :param force: Re-ingest every book from scratch.
+    :param pages_per_request: Pages sent to Gemini per extraction request.
+    :param max_concurrency: Page ranges extracted at once across all books (at least one per worker).
+    :param subject: Subject tag recorded for every shard.
+    :param grade: Grade/class tag recorded for every shard.
+    :param max_tokens: Token budget per chunk (defaults to CHUNK_MAX_TOKENS).
+    :param overlap_tokens: Overlap between chunks (defaults to CHUNK_OVERLAP_TOKENS).
+    :param chapter_map: ChapterMap used to store each chunk's chapter and section
+                        (defaults to get_chapter_map(), i.e. CHAPTER_MAP_PATH if it exists).
+    :return: Dict of shard name -> manifest entry for the books processed in this run.
+    """
+    manifest_path = os.path.join(shards_dir, MANIFEST_FILE)
+    manifest = load_manifest(manifest_path)
+    options = {"pages_per_request": pages_per_request}
+    if max_tokens is not None:
+        options["max_tokens"] = max_tokens
+    if overlap_tokens is not None:
+        options["overlap_tokens"] = overlap_tokens
+    # The map is sent to every worker with the other options (it pickles like plain data)
+    options["chapter_map"] = chapter_map if chapter_map is not None else get_chapter_map()
+    if options["chapter_map"] is None:
+        print("⚠️ No chapter map: chunks are stored without chapter/section")
+
+    # Step 1: Hash the books and decide what needs work
+    jobs = []
+    for pdf_path in find_books(books_dir):
+        shard = shard_name_for(pdf_path, books_dir)
+        sha256 = file_sha256(pdf_path)
+        previous = manifest.get(shard, {})
+        if not force and previous.get("sha256") == sha256 and previous.get("status") == "done":
+            print(f"⏭️  {shard}: unchanged, skipped")
+            continue
+        reset = force or previous.get("sha256") not in (None, sha256)
+        if reset:
+            # Recorded before the shard is rebuilt, so an interrupted run resumes from its
+            # checkpoint next time instead of seeing the old hash and resetting again
+            manifest[shard] = {"path": os.path.relpath(pdf_path, books_dir), "sha256": sha256, "status": "in_progress"}
+        book = os.path.splitext(os.path.basename(pdf_path))[0]
+        tags = {"book": book, "source": os.path.relpath(pdf_path, books_dir), "subject": subject, "grade": grade}
+        jobs.append((pdf_path, shard, sha256, reset, tags))
+    if any(reset for _, _, _, reset, _ in jobs):
+        save_manifest(manifest_path, manifest)
+
+    if not jobs:
+        print("✅ All books are up to date.")
+        return {}
+
+    # Step 2: Split the Gemini budget between the workers
+    pool_size = max(1, min(workers, len(jobs)))
+    options["max_concurrency"] = max(1, max_concurrency // pool_size)
+    embedding_rate = (EMBEDDING_REQUESTS_PER_SECOND / pool_size, max(1, EMBEDDING_BURST // pool_size))
+
+    # Step 3: Ingest the books in parallel, recording each one as soon as it finishes
+    results = {}
+    total_pages = 0
+    started = time.perf_counter()
+    pool_class = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+    with pool_class(max_workers=pool_size) as pool:
+        futures = {
+            pool.submit(ingest_book, pdf_path, shard, shards_dir, reset, tags, dict(options, book=tags["book"]),
+                        embedding_rate): (pdf_path, shard, sha256)
+            for pdf_path, shard, sha256, reset, tags in jobs
+        }
+        for done_count, future in enumerate(as_completed(futures), start=1):
+            pdf_path, shard, sha256 = futures[future]
+            entry = {
+                "path": os.path.relpath(pdf_path, books_dir),
+                "sha256": sha256,
+                "ingested_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            }
+            try:
+                stats = future.result()
+            except Exception as e:
+                entry.update(status="failed", error=str(e))
+                print(f"❌ [{done_count}/{len(jobs)}] {shard}: {e}")
+            else:
+                # Books with failed pages are retried (from their checkpoint) on the next run
+                entry.update(
+                    status="partial" if stats["pages_failed"] else "done",
+                    pages=stats["pages"],
+                    pages_failed=stats["pages_failed"],
+                    chunks=stats["chunks"],
+                    chunk_fill=round(stats["chunk_fill"], 3),
+                    seconds=round(stats["seconds"], 2),
+                )
+                pages_done = stats["pages"] - stats["pages_skipped"] - len(stats["pages_failed"])
+                total_pages += pages_done
+                print(f"✅ [{done_count}/{len(jobs)}] {shard}: {pages_done} pages, {stats['chunks']} chunks "
+                      f"({stats['chunk_fill']:.0%} full) "
+                      f"in {stats['seconds']:.1f}s ({pages_done / stats['seconds'] if stats['seconds'] else 0:.2f} pages/s)")
+
+            manifest[shard] = results[shard] = entry
+            save_manifest(manifest_path, manifest)
+
+            elapsed = time.perf_counter() - started
+            print(f"   Progress: {done_count}/{len(jobs)} books, {total_pages} pages, "
+                  f"{total_pages / elapsed if elapsed else 0:.2f} pages/s overall")
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest a directory of PDF books into per-book index shards.")
+    parser.add_argument("books_dir", help="Directory of PDF books (searched recursively)")
+    parser.add_argument("--shards-dir", default=FAISS_SHARDS_DIR, help="Directory for the shards and manifest")
+    parser.add_argument("--workers", type=int, default=2, help="Books ingested at the same time")
+    parser.add_argument("--threads", action="store_true", help="Use a thread pool instead of a process pool")
+    parser.add_argument("--force", action="store_true", help="Re-ingest unchanged books too")
+    parser.add_argument("--pages-per-request", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Page ranges extracted at once across all books (split between the workers)")
+    parser.add_argument("--subject", help="Subject tag recorded for every shard")
+    parser.add_argument("--grade", help="Grade/class tag recorded for every shard")
+    parser.add_argument("--max-tokens", type=int, help="Token budget per chunk")
+    parser.add_argument("--overlap-tokens", type=int, help="Overlap between chunks")
+    parser.add_argument("--chapter-map", help="JSON or CSV of page ranges -> chapter, section (see chapter_map.py; "
+                                              "default: CHAPTER_MAP_PATH if it exists)")
+    args = parser.parse_args()
+
+    results = bulk_ingest(
+        args.books_dir,
+        args.shards_dir,
+        workers=args.workers,
+        use_threads=args.threads,
+        force=args.force,
+        pages_per_request=args.pages_per_request,
+        max_concurrency=args.concurrency,
+        subject=args.subject,
+        grade=args.grade,
+        max_tokens=args.max_tokens,
+        overlap_tokens=args.overlap_tokens,
+        chapter_map=load_chapter_map(args.chapter_map) if args.chapter_map else None,
+    )
+    if any(entry["status"] != "done" for entry in results.values()):
+        sys.exit(1)
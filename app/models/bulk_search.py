@@ -0,0 +1,87 @@
+# bulk_search.py
+import argparse
+import csv
+import os
+import sys
+
+from .query_router import route_queries
+from .video_recommendation import recommend_videos_from_images
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".gif", ".heic")
+FIELDS = ["input", "extracted_text", "path", "chapter", "section", "video", "distance", "score"]
+
+
+def list_images(image_dir):
+    """
+    :param image_dir: Directory containing problem images.
+    :return: Sorted list of image file paths in the directory.
+    """
+    return sorted(
+        os.path.join(image_dir, name) for name in os.listdir(image_dir)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def read_questions(questions_path):
+    """
+    :param questions_path: Text file with one question per line.
+    :return: List of non-empty questions.
+    """
+    with open(questions_path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def bulk_recommend(image_dir=None, questions_path=None, top_k=1):
+    """
+    Recommend videos for a whole exercise set at once.
+
+    :param image_dir: Directory of problem images (OCR'd concurrently).
+    :param questions_path: Text file with one question per line.
+    :param top_k: Nearest chunks considered per query.
+    :return: List of result rows (dicts with the FIELDS keys).
+    """
+    if image_dir:
+        inputs = list_images(image_dir)
+        recommendations = [
+            dict(recommendation, path="vector") if recommendation and recommendation.get("video") else recommendation
+            for recommendation in recommend_videos_from_images(inputs, top_k=top_k)
+        ]
+    else:
+        # Questions that name the exercise are answered locally; the rest go through hybrid search
+        inputs = read_questions(questions_path)
+        recommendations = [
+            {key: value for key, value in result.items() if key != "query"}
+            for result in route_queries(inputs, top_k=top_k)
+        ]
+
+    rows = []
+    for item, recommendation in zip(inputs, recommendations):
+        row = dict.fromkeys(FIELDS, "")
+        row.update(recommendation or {})
+        row["input"] = item
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recommend videos for a directory of problem images or a file of questions.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--images", help="Directory of problem images")
+    source.add_argument("--questions", help="Text file with one question per line")
+    parser.add_argument("--top-k", type=int, default=3, help="Nearest chunks considered per query")
+    parser.add_argument("--output", help="CSV file to write (default: stdout)")
+    args = parser.parse_args()
+
+    rows = bulk_recommend(args.images, args.questions, args.top_k)
+
+    output = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        writer = csv.DictWriter(output, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    finally:
+        if args.output:
+            output.close()
+
+    found = sum(1 for row in rows if row["video"])
+    print(f"✅ Recommended videos for {found} of {len(rows)} inputs", file=sys.stderr)
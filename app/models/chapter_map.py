@@ -0,0 +1,132 @@
+# chapter_map.py
+import bisect
+import csv
+import json
+import os
+import threading
+
+from .config import CHAPTER_MAP_PATH
+from .index_holder import IndexHolder
+
+
+def parse_page_range(value):
+    """
+    :param value: "12", "12-18", 12 or [12, 18].
+    :return: Tuple (first_page, last_page), 1-based and inclusive.
+    """
+    if isinstance(value, int):
+        return value, value
+    if isinstance(value, (list, tuple)):
+        first_page, last_page = value
+        return int(first_page), int(last_page)
+    first_page, _, last_page = str(value).partition("-")
+    return int(first_page), int(last_page or first_page)
+
+
+class ChapterMap:
+    """
+    Page -> (chapter, section) lookup built from page ranges of the books.
+
+    Ranges may name the book they belong to; ranges without a book apply to every book.
+    When ranges overlap, the one that starts last wins, so a section range can sit inside
+    a whole-chapter range.
+    """
+
+    def __init__(self, ranges):
+        """
+        :param ranges: List of (first_page, last_page, chapter, section, book); book may be None.
+        """
+        self.ranges = {}
+        for first_page, last_page, chapter, section, book in ranges:
+            self.ranges.setdefault(book, []).append((first_page, last_page, chapter, section))
+        for book_ranges in self.ranges.values():
+            book_ranges.sort(key=lambda entry: entry[0])
+        self._starts = {book: [entry[0] for entry in book_ranges] for book, book_ranges in self.ranges.items()}
+
+    def _find(self, page, book):
+        book_ranges = self.ranges.get(book)
+        if not book_ranges:
+            return None
+        position = bisect.bisect_right(self._starts[book], page)
+        for first_page, last_page, chapter, section in reversed(book_ranges[:position]):
+            if first_page <= page <= last_page:
+                return chapter, section
+        return None
+
+    def __call__(self, page, book=None):
+        """
+        :param page: 1-based PDF page number.
+        :param book: Book name, to prefer ranges recorded for that book.
+        :return: Tuple (chapter, section); (None, None) if no range covers the page.
+        """
+        if page is None:
+            return None, None
+        found = (self._find(page, book) if book is not None else None) or self._find(page, None)
+        return found or (None, None)
+
+
+def load_chapter_map(path):
+    """
+    Read a chapter map from JSON or CSV.
+
+    JSON is a list of objects {"pages": "12-18", "chapter": "অধ্যায় ২", "section": "২.১", "book": "..."};
+    CSV has the same names as header columns. "section" and "book" are optional.
+
+    :param path: Path of the .json or .csv file.
+    :return: ChapterMap.
+    """
+    if os.path.splitext(path)[1].lower() == ".csv":
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            entries = list(csv.DictReader(f))
+    else:
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+
+    ranges = []
+    for entry in entries:
+        first_page, last_page = parse_page_range(entry["pages"])
+        ranges.append((first_page, last_page, entry.get("chapter") or None, entry.get("section") or None,
+                       entry.get("book") or None))
+    return ChapterMap(ranges)
+
+
+_holders = {}
+_holders_lock = threading.Lock()
+
+
+def get_chapter_map(chapter_map_path=CHAPTER_MAP_PATH):
+    """
+    Return the process-wide chapter map, reloaded only when the file changes.
+
+    :param chapter_map_path: Path of the chapter map file.
+    :return: ChapterMap, or None if the file does not exist (or the path is empty).
+    """
+    if not chapter_map_path:
+        return None
+    key = os.path.abspath(chapter_map_path)
+    with _holders_lock:
+        holder = _holders.get(key)
+        if holder is None:
+            holder = IndexHolder(chapter_map_path, load_chapter_map)
+            _holders[key] = holder
+    return holder.get()
+
+
+def chunk_chapter_section(match, chapter_map=None):
+    """
+    Chapter and section of an indexed chunk.
+
+    Uses the chapter and section stored with the chunk; chunks ingested without them fall
+    back to the chapter map entry for their book and page.
+
+    :param match: Chunk metadata from IndexManager.lookup, or None.
+    :param chapter_map: Optional ChapterMap.
+    :return: Tuple (chapter, section); (None, None) if neither source knows the chunk.
+    """
+    if match is None:
+        return None, None
+    if match.get("chapter") or match.get("section"):
+        return match.get("chapter"), match.get("section")
+    if chapter_map is not None:
+        return chapter_map(match.get("page"), match.get("book"))
+    return None, None
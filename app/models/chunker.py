@@ -0,0 +1,342 @@
+# chunker.py
+import argparse
+import math
+import re
+import unicodedata
+from collections import namedtuple
+
+from .config import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, EMBEDDING_BATCH_SIZE
+
+# Input limit of models/embedding-001; a chunk budget above it would be truncated by the API
+EMBEDDING_MODEL_MAX_TOKENS = 2048
+
+Chunk = namedtuple("Chunk", ["text", "offset", "tokens"])
+
+# ASCII words, runs of other scripts (Bangla), or a single symbol
+_TOKEN_RUNS = re.compile(r"[A-Za-z0-9]+|[^\x00-\x7F\s]+|\S")
+
+# LaTeX spans that must not be cut: display math, environments and inline math
+_DISPLAY_MATH = r"\$\$.+?\$\$|\\\[.+?\\\]|\\begin\{(?P<env>[A-Za-z*]+)\}.+?\\end\{(?P=env)\}"
+_INLINE_MATH = r"\$[^$\n]+?\$|\\\(.+?\\\)"
+# A unit ends after sentence punctuation (including the Bangla dari) or at a line break
+_UNITS = re.compile(
+    rf"(?P<display>{_DISPLAY_MATH})|(?P<inline>{_INLINE_MATH})|(?<=[.!?।॥])\s+|\n\s*",
+    re.DOTALL,
+)
+
+_VIRAMA_OR_JOINER = {"্", "‌", "‍"}
+
+
+def estimate_tokens(text):
+    """
+    Estimate the number of model tokens in a text without calling the API.
+
+    English words count one token per 4 characters, Bangla (and other non-ASCII) runs one
+    per 2 characters, symbols one each. This errs on the high side, so packed chunks stay
+    under the budget.
+
+    :param text: Text to measure.
+    :return: Estimated token count.
+    """
+    tokens = 0
+    for run in _TOKEN_RUNS.findall(text):
+        if run.isascii():
+            tokens += (len(run) + 3) // 4 if run[0].isalnum() else 1
+        else:
+            tokens += (len(run) + 1) // 2
+    return tokens
+
+
+def _grapheme_cut(text, position):
+    # Move a cut point back so it never separates a Bangla vowel sign, virama or joiner from its letter
+    while 0 < position < len(text) and (
+        unicodedata.category(text[position]) in ("Mn", "Mc", "Me")
+        or text[position] in _VIRAMA_OR_JOINER
+        or text[position - 1] in _VIRAMA_OR_JOINER
+    ):
+        position -= 1
+    return position
+
+
+def _blocks(pieces, max_buffer):
+    """
+    Re-split streamed text into blocks that end at a paragraph break, so no unit spans two
+    blocks. Only the unfinished paragraph is buffered; one without any break is cut at a
+    line or word boundary once it reaches max_buffer characters.
+
+    :return: Generator of (offset, block).
+    """
+    buffer = ""
+    offset = 0
+    for piece in pieces:
+        buffer += piece
+        cut = buffer.rfind("\n\n") + 2
+        if cut == 1 and len(buffer) >= max_buffer:
+            cut = max(buffer.rfind("\n"), buffer.rfind(" ")) + 1 or _grapheme_cut(buffer, max_buffer)
+        if cut > 1:
+            yield offset, buffer[:cut]
+            offset += cut
+            buffer = buffer[cut:]
+    if buffer:
+        yield offset, buffer
+
+
+def _units(offset, block):
+    """
+    Split a block into sentences, lines and display equations; inline math is never split.
+    Every unit keeps its trailing whitespace, so the units concatenate back to the block.
+
+    :return: Generator of (offset, unit).
+    """
+    start = 0
+    for match in _UNITS.finditer(block):
+        if match.group("inline"):
+            continue
+        # A display equation is a unit of its own
+        boundaries = (match.start(), match.end()) if match.group("display") else (match.end(),)
+        for boundary in boundaries:
+            if boundary > start:
+                yield offset + start, block[start:boundary]
+                start = boundary
+    if start < len(block):
+        yield offset + start, block[start:]
+
+
+def _split_oversized(offset, unit, max_tokens, token_counter, first_limit):
+    """
+    Split a unit above the budget at word boundaries, and a single word above the budget
+    at grapheme boundaries. The first piece is limited to first_limit tokens, the room left
+    in the chunk being filled, so that chunk is not emitted nearly empty.
+
+    :return: Generator of (offset, text, tokens).
+    """
+    words = re.findall(r"\S+\s*|\s+", unit)
+    piece, piece_tokens, piece_offset = "", 0, offset
+    limit = first_limit
+    for word in words:
+        word_tokens = token_counter(word)
+        if piece and piece_tokens + word_tokens > limit:
+            yield piece_offset, piece, piece_tokens
+            piece_offset += len(piece)
+            piece, piece_tokens = "", 0
+            limit = max_tokens
+        if word_tokens > max_tokens:
+            # Cut proportionally to the token estimate, then snap back to a grapheme boundary
+            step = max(1, len(word) * max_tokens // word_tokens)
+            while word:
+                cut = _grapheme_cut(word, min(step, len(word))) or min(step, len(word))
+                yield piece_offset, word[:cut], token_counter(word[:cut])
+                piece_offset += cut
+                word = word[cut:]
+            continue
+        piece += word
+        piece_tokens += word_tokens
+    if piece:
+        yield piece_offset, piece, piece_tokens
+
+
+class ChunkStats:
+    """
+    Running totals for a chunking pass: chunk count, tokens and fill ratio against the budget.
+    """
+
+    def __init__(self, max_tokens=CHUNK_MAX_TOKENS):
+        """
+        :param max_tokens: Token budget the fill ratio is measured against.
+        """
+        self.max_tokens = max_tokens
+        self.chunks = 0
+        self.tokens = 0
+        self.characters = 0
+
+    def add(self, chunk):
+        self.chunks += 1
+        self.tokens += chunk.tokens
+        self.characters += len(chunk.text)
+
+    @property
+    def average_fill(self):
+        """Mean share of the token budget used per chunk, 0..1."""
+        return self.tokens / (self.chunks * self.max_tokens) if self.chunks else 0.0
+
+    def as_dict(self):
+        return {
+            "chunks": self.chunks,
+            "tokens": self.tokens,
+            "characters": self.characters,
+            "average_tokens": self.tokens / self.chunks if self.chunks else 0.0,
+            "average_fill": self.average_fill,
+        }
+
+
+def iter_chunks(text, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS, token_counter=estimate_tokens,
+                stats=None, max_buffer=65536):
+    """
+    Pack whole sentences, lines and equations into chunks of up to max_tokens tokens.
+
+    Works as a stream: `text` may be one string or an iterable of string pieces (file reads,
+    PDF pages), and chunks are yielded as soon as they are full, so only the current chunk
+    and the unfinished paragraph are held in memory. Units larger than the budget are split
+    at word boundaries, and words at Bangla grapheme boundaries, never inside a character.
+
+    :param text: A string or an iterable of strings.
+    :param max_tokens: Token budget per chunk (at most EMBEDDING_MODEL_MAX_TOKENS).
+    :param overlap_tokens: Up to this many tokens of trailing sentences are repeated at the
+                           start of the next chunk (0 for no overlap).
+    :param token_counter: Callable text -> token count, e.g. a real tokenizer.
+    :param stats: Optional ChunkStats updated with every chunk.
+    :param max_buffer: Characters buffered before a paragraph without breaks is cut.
+    :return: Generator of Chunk(text, offset, tokens); offset is the character offset of the
+             chunk in the full text.
+    """
+    if not 0 < max_tokens <= EMBEDDING_MODEL_MAX_TOKENS:
+        raise ValueError(f"max_tokens must be between 1 and {EMBEDDING_MODEL_MAX_TOKENS}, got {max_tokens}")
+    if not 0 <= overlap_tokens < max_tokens:
+        raise ValueError(f"overlap_tokens must be at least 0 and below max_tokens, got {overlap_tokens}")
+
+    pieces = [text] if isinstance(text, str) else text
+    current = []  # (offset, text, tokens) of the units in the chunk being filled
+    current_tokens = 0
+
+    def emit(units):
+        chunk_text = "".join(unit[1] for unit in units)
+        stripped = chunk_text.lstrip()
+        chunk = Chunk(stripped.rstrip(), units[0][0] + len(chunk_text) - len(stripped), sum(unit[2] for unit in units))
+        if stats is not None:
+            stats.add(chunk)
+        return chunk
+
+    for block_offset, block in _blocks(pieces, max_buffer):
+        for unit_offset, unit in _units(block_offset, block):
+            if not unit.strip():
+                # Whitespace between units stays attached to the chunk being filled
+                if current:
+                    offset, text_so_far, tokens = current[-1]
+                    current[-1] = (offset, text_so_far + unit, tokens)
+                continue
+            unit_tokens = token_counter(unit)
+            if unit_tokens > max_tokens:
+                parts = _split_oversized(unit_offset, unit, max_tokens, token_counter, max_tokens - current_tokens)
+            else:
+                parts = ((unit_offset, unit, unit_tokens),)
+
+            for part in parts:
+                if current and current_tokens + part[2] > max_tokens:
+                    yield emit(current)
+                    # Carry whole trailing sentences into the next chunk, never the entire chunk
+                    overlap = []
+                    overlap_total = 0
+                    for previous in reversed(current[1:]):
+                        if overlap_total + previous[2] > overlap_tokens:
+                            break
+                        overlap.insert(0, previous)
+                        overlap_total += previous[2]
+                    while overlap and overlap_total + part[2] > max_tokens:
+                        overlap_total -= overlap.pop(0)[2]
+                    current, current_tokens = overlap, overlap_total
+                current.append(part)
+                current_tokens += part[2]
+
+    if current and "".join(unit[1] for unit in current).strip():
+        yield emit(current)
+
+
+def trailing_text(text, max_tokens, token_counter=estimate_tokens):
+    """
+    The end of a text that the text after it may continue, e.g. a problem running over a
+    page break: whole units of the last paragraph, up to max_tokens tokens.
+
+    :param text: Text whose end is wanted.
+    :param max_tokens: Token budget of the returned suffix.
+    :param token_counter: Callable text -> token count.
+    :return: Suffix of `text`; "" if it ends with a paragraph break or its last unit alone is over the budget.
+    """
+    start = text.rfind("\n\n") + 2 if "\n\n" in text else 0
+    if not text[start:].strip():
+        return ""
+
+    tail_start, tokens = len(text), 0
+    for offset, unit in reversed(list(_units(start, text[start:]))):
+        tokens += token_counter(unit)
+        if tokens > max_tokens:
+            break
+        tail_start = offset
+    return text[tail_start:]
+
+
+def compare_with_fixed_slicer(text, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS, chunk_size=500,
+                              batch_size=EMBEDDING_BATCH_SIZE, token_counter=estimate_tokens):
+    """
+    Chunk a text with iter_chunks and with the fixed character slicer (embedding.chunk_text)
+    and count the embedding requests each would need.
+
+    :param text: A string or an iterable of strings (consumed once).
+    :param max_tokens: Token budget per chunk.
+    :param overlap_tokens: Overlap between token chunks.
+    :param chunk_size: Characters per chunk of the fixed slicer.
+    :param batch_size: Chunks per batchEmbedContents request.
+    :param token_counter: Callable text -> token count.
+    :return: Dict with "token" and "fixed" stats (chunks, tokens, average_tokens, average_fill,
+             batch_requests) and the percentage of chunks and batch requests saved.
+    """
+    pieces = [text] if isinstance(text, str) else text
+    fixed = ChunkStats(max_tokens)
+    leftover = ""
+
+    def counted(pieces):
+        # Tee the stream through the fixed slicer, which cuts every chunk_size characters
+        nonlocal leftover
+        for piece in pieces:
+            yield piece
+            leftover += piece
+            while len(leftover) >= chunk_size:
+                fixed.add(Chunk(leftover[:chunk_size], 0, token_counter(leftover[:chunk_size])))
+                leftover = leftover[chunk_size:]
+
+    token = ChunkStats(max_tokens)
+    for _ in iter_chunks(counted(pieces), max_tokens, overlap_tokens, token_counter, stats=token):
+        pass
+    if leftover:
+        fixed.add(Chunk(leftover, 0, token_counter(leftover)))
+
+    result = {"token": token.as_dict(), "fixed": fixed.as_dict()}
+    for stats in result.values():
+        stats["batch_requests"] = math.ceil(stats["chunks"] / batch_size)
+    result["chunks_saved_pct"] = 100.0 * (1 - token.chunks / fixed.chunks) if fixed.chunks else 0.0
+    result["batch_requests_saved_pct"] = (
+        100.0 * (1 - result["token"]["batch_requests"] / result["fixed"]["batch_requests"])
+        if result["fixed"]["batch_requests"] else 0.0
+    )
+    return result
+
+
+def _read_pieces(path, size=1 << 16):
+    with open(path, encoding="utf-8") as f:
+        for piece in iter(lambda: f.read(size), ""):
+            yield piece
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare token-budget chunking with the fixed 500-character slicer.")
+    parser.add_argument("paths", nargs="+", help="UTF-8 text files (read as a stream)")
+    parser.add_argument("--max-tokens", type=int, default=CHUNK_MAX_TOKENS)
+    parser.add_argument("--overlap-tokens", type=int, default=CHUNK_OVERLAP_TOKENS)
+    parser.add_argument("--chunk-size", type=int, default=500, help="Characters per chunk of the fixed slicer")
+    parser.add_argument("--show", type=int, default=0, help="Print the first N token chunks of each file")
+    args = parser.parse_args()
+
+    print(f"{'file':<30}{'chunker':<10}{'chunks':>8}{'avg tokens':>12}{'avg fill':>10}{'batch calls':>13}")
+    for path in args.paths:
+        result = compare_with_fixed_slicer(_read_pieces(path), args.max_tokens, args.overlap_tokens, args.chunk_size)
+        for name in ("fixed", "token"):
+            stats = result[name]
+            print(f"{path[-30:]:<30}{name:<10}{stats['chunks']:>8}{stats['average_tokens']:>12.1f}"
+                  f"{stats['average_fill']:>10.1%}{stats['batch_requests']:>13}")
+        print(f"✅ {result['chunks_saved_pct']:.1f}% fewer embedding inputs, "
+              f"{result['batch_requests_saved_pct']:.1f}% fewer batch requests")
+        if args.show:
+            for chunk in iter_chunks(_read_pieces(path), args.max_tokens, args.overlap_tokens):
+                print(f"--- offset {chunk.offset}, {chunk.tokens} tokens\n{chunk.text}")
+                args.show -= 1
+                if not args.show:
+                    break
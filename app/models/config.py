@@ -10,7 +10,46 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL_ID = os.getenv("GEMINI_MODEL_ID")
 # GEMINI_Embedded_MODEL_ID = os.getenv("GEMINI_Embedded_MODEL_ID")
 
-if not GEMINI_API_KEY or not GEMINI_MODEL_ID :
-    raise ValueError("API key or model ID is missing in the .env file!")
+# Embedding throughput settings (batchEmbedContents accepts at most 100 requests per call)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+EMBEDDING_REQUESTS_PER_SECOND = float(os.getenv("EMBEDDING_REQUESTS_PER_SECOND", "1"))
+EMBEDDING_BURST = int(os.getenv("EMBEDDING_BURST", "5"))
 
-print("API Key, Model ID and Embedded Model loaded successfully!")
\ No newline at end of file
+# Token-budget chunking: chunks are packed with whole sentences/equations up to CHUNK_MAX_TOKENS
+# (estimated), and the next chunk repeats up to CHUNK_OVERLAP_TOKENS of trailing sentences
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "512"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "0"))
+# Ingestion chunks each PDF page together with up to this many tokens of the unfinished
+# paragraph at the end of the previous page, so text running over a page break stays whole
+CHUNK_PAGE_CARRY_TOKENS = int(os.getenv("CHUNK_PAGE_CARRY_TOKENS", "128"))
+
+# On-disk embedding cache (set EMBEDDING_CACHE_PATH to an empty string to disable it)
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/cache/embeddings.sqlite")
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# Page ranges -> chapter (অধ্যায়) and section (অনুশীলনী), see chapter_map.py. Used to label chunks
+# at ingestion and to resolve chunks that were ingested without a chapter (empty to disable)
+CHAPTER_MAP_PATH = os.getenv("CHAPTER_MAP_PATH", "data/csv/chapter_map.json")
+
+# Lexical fast path: answer explicit chapter/section queries without an embedding call when
+# the best sheet row covers this share of the query's BM25 weight and beats the runner-up by this margin
+LEXICAL_MIN_COVERAGE = float(os.getenv("LEXICAL_MIN_COVERAGE", "0.6"))
+LEXICAL_MIN_MARGIN = float(os.getenv("LEXICAL_MIN_MARGIN", "0.2"))
+
+# Recommendation server (server.py): embedding requests from concurrent users are collected
+# for up to SERVER_BATCH_WINDOW_MS (or until SERVER_MAX_BATCH_SIZE queries) and sent as one
+# batch; beyond SERVER_MAX_QUEUE queued queries or SERVER_MAX_INFLIGHT requests the server answers 503
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+SERVER_BATCH_WINDOW_MS = float(os.getenv("SERVER_BATCH_WINDOW_MS", "10"))
+SERVER_MAX_BATCH_SIZE = int(os.getenv("SERVER_MAX_BATCH_SIZE", "64"))
+SERVER_MAX_QUEUE = int(os.getenv("SERVER_MAX_QUEUE", "256"))
+SERVER_MAX_INFLIGHT = int(os.getenv("SERVER_MAX_INFLIGHT", "128"))
+SERVER_MAX_UPLOAD_BYTES = int(os.getenv("SERVER_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+# The server paces its batched embedding calls with a limiter of its own, so user queries are
+# not queued behind ingestion's EMBEDDING_REQUESTS_PER_SECOND; keep the sum within the API quota
+SERVER_EMBEDDING_REQUESTS_PER_SECOND = float(os.getenv("SERVER_EMBEDDING_REQUESTS_PER_SECOND", "10"))
+SERVER_EMBEDDING_BURST = int(os.getenv("SERVER_EMBEDDING_BURST", "20"))
+
+# Missing settings are reported when a Gemini request is made, not at import, so modules
+# that never call Gemini (local embeddings, shard listing, lexical search) import cleanly.
@@ -1,8 +1,26 @@
-import requests
-import os
-import numpy as np
-import time
-from config import GEMINI_API_KEY
+import asyncio
+from .config import (GEMINI_API_KEY, EMBEDDING_BATCH_SIZE, EMBEDDING_REQUESTS_PER_SECOND, EMBEDDING_BURST,
+                    EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES)
+from .rate_limiter import TokenBucket
+from .gemini_client import get_client, GeminiAPIError
+from .embedding_cache import EmbeddingCache, cache_key
+from .embedding_backends import get_embedding_backend
+from .metrics import metrics
+from .single_flight import SingleFlight
+from .chunker import iter_chunks
+
+# Shared limiter so every embedding request in the process respects the same API rate
+embedding_rate_limiter = TokenBucket(EMBEDDING_REQUESTS_PER_SECOND, EMBEDDING_BURST)
+
+# Shared on-disk cache; repeated chunks and queries never reach the API
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES) if EMBEDDING_CACHE_PATH else None
+
+# Backend selected by EMBEDDING_BACKEND; with "local" no embedding ever leaves the machine
+embedding_backend = get_embedding_backend()
+
+# Concurrent requests to embed the same text share one in-flight API call
+embedding_flight = SingleFlight("embedding")
+
 # Function to split large text into smaller chunks
 def chunk_text(text, chunk_size=500):
     """
@@ -11,57 +29,70 @@ def chunk_text(text, chunk_size=500):
     :param text: The text content to chunk.
     :param chunk_size: The maximum size of each chunk.
     :return: A list of text chunks.
+
+    Slices every chunk_size characters regardless of word or sentence boundaries; ingestion
+    uses chunker.iter_chunks instead, and this is kept for compatibility and comparison.
     """
     # Split the text into chunks of the specified size
     chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
     return chunks
 
-def generate_embeddings_for_chunk(chunk, api_key, model_id="models/embedding-001"):
+async def generate_embeddings_for_chunk_async(chunk, api_key, model_id="models/embedding-001"):
     """
-    Generate embeddings for a single text chunk using the Gemini API.
+    Async version of generate_embeddings_for_chunk using the shared pooled client.
 
     :param chunk: A single chunk of text to generate embeddings for.
     :param api_key: Your Gemini API key.
     :param model_id: The ID of the Gemini embedding model to use.
     :return: A numpy array of embeddings for the chunk.
     """
-    # Corrected endpoint for embedding content
-    url = f"https://generativelanguage.googleapis.com/v1beta/{model_id}:embedContent?key={api_key}"
+    if embedding_backend.local:
+        with metrics.span("embedding", mode="local"):
+            return embedding_backend.embed([chunk])[0]
 
-    headers = {
-        "Content-Type": "application/json",
-    }
+    if embedding_cache is not None:
+        cached = await asyncio.get_running_loop().run_in_executor(None, embedding_cache.get, model_id, chunk)
+        if cached is not None:
+            return cached
 
-    payload = {
-        "model": model_id,
-        "content": {
-            "parts": [{"text": chunk}]
-        }
-    }
+    return await embedding_flight.do(cache_key(model_id, chunk), lambda: _embed_chunk_async(chunk, api_key, model_id))
+
+async def _embed_chunk_async(chunk, api_key, model_id):
+    """
+    Call embedContent for one chunk and cache the result. Only run through embedding_flight.
+    """
+    import numpy as np
 
     try:
-        response = requests.post(url, headers=headers, json=payload)
-
-        # Check for valid response and status
-        if response.status_code == 200:
-            data = response.json()
-            # Correctly access the embedding values
-            if "embedding" in data and "values" in data["embedding"]:
-                return np.array(data["embedding"]["values"])  # Access 'values' key inside 'embedding'
-            else:
-                # Print the full response if embedding is missing for debugging
-                print(f"Error: Missing 'embedding' or 'values' in the response: {data}")
-                return None
-        else:
-            print(f"Error: {response.status_code} - {response.text}")
-            return None
-    except requests.exceptions.RequestException as e:
-        print(f"Network or API request error: {e}")
+        with metrics.span("embedding", mode="single"):
+            data = await get_client(api_key).embed_content(model_id, chunk)
+    except GeminiAPIError as e:
+        print(f"Error: {e}")
         return None
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+
+    # Correctly access the embedding values
+    if "embedding" in data and "values" in data["embedding"]:
+        embedding = np.array(data["embedding"]["values"], dtype=np.float32)  # Access 'values' key inside 'embedding'
+        if embedding_cache is not None:
+            await asyncio.get_running_loop().run_in_executor(None, embedding_cache.put, model_id, chunk, embedding)
+        return embedding
+    else:
+        # Print the full response if embedding is missing for debugging
+        print(f"Error: Missing 'embedding' or 'values' in the response: {data}")
         return None
 
+def generate_embeddings_for_chunk(chunk, api_key, model_id="models/embedding-001"):
+    """
+    Generate embeddings for a single text chunk using the Gemini API, or locally when
+    EMBEDDING_BACKEND is "local" (model_id is then ignored).
+
+    :param chunk: A single chunk of text to generate embeddings for.
+    :param api_key: Your Gemini API key.
+    :param model_id: The ID of the Gemini embedding model to use.
+    :return: A numpy array of embeddings for the chunk.
+    """
+    return get_client(api_key).run(generate_embeddings_for_chunk_async(chunk, api_key, model_id))
+
 def generate_embeddings_for_text(text, api_key, model_id="models/embedding-001"):
     """
     Split the text into chunks and generate embeddings for each chunk.
@@ -71,34 +102,182 @@ def generate_embeddings_for_text(text, api_key, model_id="models/embedding-001")
     :param model_id: The ID of the Gemini embedding model to use.
     :return: A list of embeddings for each chunk.
     """
-    # Step 1: Split the text into smaller chunks
-    chunks = chunk_text(text)
+    # Step 1: Split the text into chunks of whole sentences within the token budget
+    chunks = [chunk.text for chunk in iter_chunks(text)]
 
     # Step 2: Generate embeddings for each chunk
     embeddings = []
     for chunk in chunks:
+        # Wait for a token instead of sleeping a fixed second after every request
+        if not embedding_backend.local:
+            embedding_rate_limiter.acquire()
         embedding = generate_embeddings_for_chunk(chunk, api_key, model_id)
         if embedding is not None:
             embeddings.append(embedding)
-        # Add a small delay between requests to avoid overwhelming the API
-        time.sleep(1)  # 1-second delay to avoid rate limiting (you can adjust based on API's rate limit)
 
     # Return the list of embeddings for all chunks
     return embeddings
 
-# Example usage: Generate embeddings for the extracted text
-extracted_text = "Sample extracted text from the PDF. This is a longer text to demonstrate chunking and embedding generation for multiple parts. The more text you have, the more important it is to break it down into manageable pieces for API calls. Embeddings are numerical representations of text that capture semantic meaning. They are widely used in natural language processing tasks like search, recommendation, and classification. Generating good quality embeddings is crucial for the performance of these applications."  # Replace this with the actual extracted text
+async def generate_embeddings_for_batch_async(chunks, api_key, model_id="models/embedding-001"):
+    """
+    Async version of generate_embeddings_for_batch using the shared pooled client.
+
+    :param chunks: A list of text chunks (at most 100 per request).
+    :param api_key: Your Gemini API key.
+    :param model_id: The ID of the Gemini embedding model to use.
+    :return: A list of embedding value lists, one per chunk, or None if the request failed.
+    """
+    try:
+        data = await get_client(api_key).batch_embed_contents(model_id, chunks)
+    except GeminiAPIError as e:
+        print(f"Error: {e}")
+        return None
+
+    embeddings = data.get("embeddings")
+    # The response must contain exactly one embedding per request to keep rows aligned
+    if embeddings is None or len(embeddings) != len(chunks):
+        print(f"Error: Unexpected batch response, expected {len(chunks)} embeddings: {data}")
+        return None
+    return [embedding.get("values") for embedding in embeddings]
+
+def generate_embeddings_for_batch(chunks, api_key, model_id="models/embedding-001"):
+    """
+    Generate embeddings for several text chunks with a single batchEmbedContents request.
+
+    :param chunks: A list of text chunks (at most 100 per request).
+    :param api_key: Your Gemini API key.
+    :param model_id: The ID of the Gemini embedding model to use.
+    :return: A list of embedding value lists, one per chunk, or None if the request failed.
+    """
+    return get_client(api_key).run(generate_embeddings_for_batch_async(chunks, api_key, model_id))
+
+async def generate_embeddings_for_chunks_async(chunks, api_key, model_id="models/embedding-001", batch_size=EMBEDDING_BATCH_SIZE, rate_limiter=None):
+    """
+    Async version of generate_embeddings_for_chunks. Batches are sent concurrently, bounded
+    by the client's concurrency limit and paced by the rate limiter.
+
+    :return: Tuple (embeddings, chunk_ids, failed_ids), see generate_embeddings_for_chunks.
+    """
+    import numpy as np
+
+    if embedding_backend.local:
+        with metrics.span("embedding", mode="local"):
+            embeddings = embedding_backend.embed(chunks)
+        return embeddings, list(range(len(chunks))), []
+
+    if rate_limiter is None:
+        rate_limiter = embedding_rate_limiter
+
+    # Serve what we can from the cache and only send the misses to the API. SQLite is used
+    # from a worker thread, so the event loop is not blocked on disk while it waits
+    loop = asyncio.get_running_loop()
+    if embedding_cache is not None:
+        vectors = await loop.run_in_executor(None, embedding_cache.get_many, model_id, chunks)
+    else:
+        vectors = [None] * len(chunks)
+
+    # Identical chunks (repeated headers, boilerplate) are sent once and the vector reused
+    first_id_for_key = {}
+    duplicate_of = {}
+    missing_ids = []
+    for i, vector in enumerate(vectors):
+        if vector is not None:
+            continue
+        key = cache_key(model_id, chunks[i])
+        if key in first_id_for_key:
+            duplicate_of[i] = first_id_for_key[key]
+        else:
+            first_id_for_key[key] = i
+            missing_ids.append(i)
+
+    async def embed_batch(start):
+        batch_ids = missing_ids[start:start + batch_size]
+        await rate_limiter.acquire_async()
+        return batch_ids, await generate_embeddings_for_batch_async([chunks[i] for i in batch_ids], api_key, model_id)
+
+    with metrics.span("embedding", mode="batch"):
+        results = await asyncio.gather(*(embed_batch(start) for start in range(0, len(missing_ids), batch_size)))
+
+    for batch_ids, values in results:
+        if values is None:
+            continue
+        fresh_ids = [i for i, vector in zip(batch_ids, values) if vector]
+        for i, vector in zip(batch_ids, values):
+            if vector:
+                vectors[i] = vector
+        if embedding_cache is not None and fresh_ids:
+            await loop.run_in_executor(
+                None, embedding_cache.put_many, model_id, [chunks[i] for i in fresh_ids], [vectors[i] for i in fresh_ids]
+            )
+    for i, first_id in duplicate_of.items():
+        vectors[i] = vectors[first_id]
+
+    rows = []
+    chunk_ids = []
+    failed_ids = []
+    for i, vector in enumerate(vectors):
+        if vector is None:
+            failed_ids.append(i)
+        else:
+            rows.append(vector)
+            chunk_ids.append(i)
+
+    if rows:
+        embeddings = np.ascontiguousarray(rows, dtype=np.float32)
+    else:
+        embeddings = np.empty((0, 0), dtype=np.float32)
+
+    if failed_ids:
+        print(f"Warning: {len(failed_ids)} of {len(chunks)} chunks failed to embed: {failed_ids}")
+
+    return embeddings, chunk_ids, failed_ids
+
+def generate_embeddings_for_chunks(chunks, api_key, model_id="models/embedding-001", batch_size=EMBEDDING_BATCH_SIZE, rate_limiter=None):
+    """
+    Generate embeddings for a list of chunks using batched requests.
+
+    Rows of the returned matrix follow the order of `chunk_ids`, so a failed chunk never
+    shifts the alignment between vectors and the chunks they came from.
+    With EMBEDDING_BACKEND="local" the whole list is embedded on the CPU in one call.
+
+    :param chunks: A list of text chunks.
+    :param api_key: Your Gemini API key.
+    :param model_id: The ID of the Gemini embedding model to use.
+    :param batch_size: Number of chunks packed into each batchEmbedContents request.
+    :param rate_limiter: TokenBucket used to pace requests (defaults to the shared limiter).
+    :return: Tuple (embeddings, chunk_ids, failed_ids) where embeddings is a contiguous
+             float32 matrix of shape (len(chunk_ids), dimension).
+    """
+    return get_client(api_key).run(generate_embeddings_for_chunks_async(chunks, api_key, model_id, batch_size, rate_limiter))
+
+def generate_embeddings_for_text_batched(text, api_key, model_id="models/embedding-001", batch_size=EMBEDDING_BATCH_SIZE, rate_limiter=None):
+    """
+    Split the text into token-budget chunks and embed them with batched requests.
+
+    :param text: The text content to generate embeddings for.
+    :param api_key: Your Gemini API key.
+    :param model_id: The ID of the Gemini embedding model to use.
+    :param batch_size: Number of chunks packed into each batchEmbedContents request.
+    :param rate_limiter: TokenBucket used to pace requests (defaults to the shared limiter).
+    :return: Tuple (embeddings, chunk_ids, failed_ids), see generate_embeddings_for_chunks.
+    """
+    chunks = [chunk.text for chunk in iter_chunks(text)]
+    return generate_embeddings_for_chunks(chunks, api_key, model_id, batch_size, rate_limiter)
+
+if __name__ == "__main__":
+    # Example usage: Generate embeddings for the extracted text
+    extracted_text = "Sample extracted text from the PDF. This is a longer text to demonstrate chunking and embedding generation for multiple parts. The more text you have, the more important it is to break it down into manageable pieces for API calls. Embeddings are numerical representations of text that capture semantic meaning. They are widely used in natural language processing tasks like search, recommendation, and classification. Generating good quality embeddings is crucial for the performance of these applications."  # Replace this with the actual extracted text
 
-# Directly use the API key here (AGAIN, NOT RECOMMENDED FOR PRODUCTION)
+    # Directly use the API key here (AGAIN, NOT RECOMMENDED FOR PRODUCTION)
 
 
-GEMINI_MODEL_ID_DIRECT = "models/embedding-001"  # Using the publicly available embedding model
+    GEMINI_MODEL_ID_DIRECT = "models/embedding-001"  # Using the publicly available embedding model
 
-embeddings = generate_embeddings_for_text(extracted_text, GEMINI_API_KEY, GEMINI_MODEL_ID_DIRECT)
+    embeddings = generate_embeddings_for_text(extracted_text, GEMINI_API_KEY, GEMINI_MODEL_ID_DIRECT)
 
-if embeddings:
-    print("Generated Embeddings for Chunks:")
-    for i, embedding in enumerate(embeddings[:5]):  # Print first 5 chunk embeddings
-        print(f"Embedding {i+1} (first 10 values): {embedding[:10]}")
-else:
-    print("No embeddings were generated.")
+    if embeddings:
+        print("Generated Embeddings for Chunks:")
+        for i, embedding in enumerate(embeddings[:5]):  # Print first 5 chunk embeddings
+            print(f"Embedding {i+1} (first 10 values): {embedding[:10]}")
+    else:
+        print("No embeddings were generated.")
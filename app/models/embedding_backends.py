@@ -0,0 +1,121 @@
+# embedding_backends.py
+import os
+import re
+import unicodedata
+import zlib
+
+# Settings are read from the environment directly (not from config.py) so the index code
+# can check backends without requiring a Gemini API key, e.g. for fully offline runs.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "gemini")
+EMBEDDING_MODEL_ID = os.getenv("EMBEDDING_MODEL_ID", "models/embedding-001")
+EMBEDDING_LOCAL_DIMENSION = int(os.getenv("EMBEDDING_LOCAL_DIMENSION", "384"))
+
+# Name recorded for indexes built before backends were tracked; those were always Gemini
+LEGACY_BACKEND_NAME = "gemini:models/embedding-001"
+
+_WORD = re.compile(r"(?:\w|[\u0980-\u09FF])+")
+
+
+class GeminiEmbeddingBackend:
+    """
+    Remote embeddings from the Gemini API. The requests themselves are made in
+    embedding.py; this object only describes the backend.
+    """
+    local = False
+
+    def __init__(self, model_id=EMBEDDING_MODEL_ID):
+        """
+        :param model_id: Gemini embedding model ID.
+        """
+        self.model_id = model_id
+        self.name = f"gemini:{model_id}"
+        # Known from the first response; the index records whatever it receives
+        self.dimension = None
+
+
+class HashingEmbeddingBackend:
+    """
+    Local CPU embeddings via the hashing trick: word unigrams, word bigrams and character
+    trigrams are hashed (CRC32) into a fixed number of signed buckets, weighted by
+    log(1 + tf) and L2-normalized.
+
+    Needs no model file, no training and no network, so ingestion and search work
+    offline at thousands of chunks per second. Quality is lexical rather than semantic:
+    good for dev/test runs and near-duplicate text, weaker on paraphrases.
+    """
+    local = True
+
+    def __init__(self, dimension=EMBEDDING_LOCAL_DIMENSION, char_ngram=3):
+        """
+        :param dimension: Output vector dimension (number of hash buckets).
+        :param char_ngram: Length of the character n-grams taken from each word (0 disables them).
+        """
+        self.dimension = dimension
+        self.char_ngram = char_ngram
+        self.name = f"local-hash:v1:n{char_ngram}"
+        # Word -> signed buckets of the word and its character n-grams
+        self._buckets = {}
+
+    def _bucket(self, feature):
+        value = zlib.crc32(feature.encode("utf-8"))
+        # Low bits pick the column, the top bit the sign, so collisions tend to cancel out
+        return value % self.dimension, 1 if value & 0x80000000 else -1
+
+    def _word_buckets(self, word):
+        # A word's own bucket plus its character n-grams; words repeat a lot across chunks
+        buckets = self._buckets.get(word)
+        if buckets is None:
+            features = [word]
+            n = self.char_ngram
+            if n:
+                padded = f"<{word}>"
+                features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+            buckets = [self._bucket(feature) for feature in features]
+            if len(self._buckets) < 1_000_000:
+                self._buckets[word] = buckets
+        return buckets
+
+    def _text_buckets(self, text):
+        words = _WORD.findall(unicodedata.normalize("NFC", text).casefold())
+        buckets = []
+        for word in words:
+            buckets.extend(self._word_buckets(word))
+        buckets.extend(self._bucket(f"{first} {second}") for first, second in zip(words, words[1:]))
+        return buckets
+
+    def embed(self, texts):
+        """
+        Embed a batch of texts.
+
+        :param texts: List of strings.
+        :return: Contiguous float32 matrix of shape (len(texts), dimension).
+        """
+        import numpy as np
+
+        flat_positive, flat_negative = [], []
+        for row, text in enumerate(texts):
+            offset = row * self.dimension
+            for column, sign in self._text_buckets(text):
+                (flat_positive if sign > 0 else flat_negative).append(offset + column)
+
+        # Term frequencies per cell for each sign, then sublinear tf weighting
+        size = len(texts) * self.dimension
+        positive = np.bincount(np.asarray(flat_positive, dtype=np.int64), minlength=size)
+        negative = np.bincount(np.asarray(flat_negative, dtype=np.int64), minlength=size)
+        matrix = (np.log1p(positive) - np.log1p(negative)).astype(np.float32).reshape(len(texts), self.dimension)
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return np.ascontiguousarray(matrix)
+
+
+def get_embedding_backend(name=EMBEDDING_BACKEND):
+    """
+    :param name: "gemini" (default) or "local".
+    :return: Backend object with `name`, `dimension` and `local` attributes.
+    """
+    if name == "gemini":
+        return GeminiEmbeddingBackend()
+    if name == "local":
+        return HashingEmbeddingBackend()
+    raise ValueError(f"Unknown EMBEDDING_BACKEND '{name}', expected 'gemini' or 'local'")
@@ -0,0 +1,165 @@
+# embedding_cache.py
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from .metrics import metrics
+
+
+def normalize_text(text):
+    """
+    Normalize text before hashing so trivially different strings share a cache entry.
+
+    :param text: Raw chunk or query text.
+    :return: NFC-normalized text with runs of whitespace collapsed and ends stripped.
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(model_id, text):
+    """
+    Content address of an embedding: hash of the model ID and the normalized text.
+
+    :param model_id: Embedding model ID, e.g. "models/embedding-001".
+    :param text: Text that was embedded.
+    :return: Hex SHA-256 digest.
+    """
+    return hashlib.sha256(f"{model_id}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent, content-addressed embedding cache backed by SQLite.
+
+    Vectors are stored as raw float32 blobs. The cache is bounded by entry count and evicts
+    least recently used entries first; hits and misses are counted for the current process.
+    """
+
+    def __init__(self, path, max_entries=200000):
+        """
+        :param path: Path of the SQLite database file (created on first use).
+        :param max_entries: Maximum number of vectors kept before LRU eviction.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, dimension INTEGER NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        return self._conn
+
+    def get_many(self, model_id, texts):
+        """
+        Look up several texts at once.
+
+        :param model_id: Embedding model ID.
+        :param texts: List of texts.
+        :return: List with a float32 vector for each hit and None for each miss.
+        """
+        import numpy as np
+
+        keys = [cache_key(model_id, text) for text in texts]
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            unique_keys = list(set(keys))
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+
+            if found:
+                now = time.time()
+                conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                conn.commit()
+
+            results = [found.get(key) for key in keys]
+            hits = sum(1 for vector in results if vector is not None)
+            self.hits += hits
+            self.misses += len(results) - hits
+        metrics.increment("askmath_cache_requests_total", hits, cache="embedding", result="hit")
+        metrics.increment("askmath_cache_requests_total", len(results) - hits, cache="embedding", result="miss")
+        return results
+
+    def get(self, model_id, text):
+        """
+        Look up a single text.
+
+        :param model_id: Embedding model ID.
+        :param text: Text to look up.
+        :return: Cached float32 vector, or None on a miss.
+        """
+        return self.get_many(model_id, [text])[0]
+
+    def put_many(self, model_id, texts, vectors):
+        """
+        Store several embeddings and evict the least recently used entries if over the bound.
+
+        :param model_id: Embedding model ID.
+        :param texts: List of texts that were embedded.
+        :param vectors: Matching list (or matrix rows) of embedding vectors.
+        """
+        import numpy as np
+
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            vector = np.asarray(vector, dtype=np.float32)
+            rows.append((cache_key(model_id, text), vector.shape[0], vector.tobytes(), now))
+
+        with self._lock:
+            conn = self._connection()
+            conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows)
+            overflow = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)", (overflow,)
+                )
+            conn.commit()
+
+    def put(self, model_id, text, vector):
+        """
+        Store a single embedding.
+
+        :param model_id: Embedding model ID.
+        :param text: Text that was embedded.
+        :param vector: Embedding vector.
+        """
+        self.put_many(model_id, [text], [vector])
+
+    def stats(self):
+        """
+        :return: Dict with hits, misses, hit_rate and the number of stored entries.
+        """
+        with self._lock:
+            entries = self._connection().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+            }
@@ -0,0 +1,400 @@
+# gemini_client.py
+import asyncio
+import atexit
+import email.utils
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+
+from .metrics import metrics
+from .request_body import InlinePart, JSONRequestBody
+
+# Settings are read from the environment directly so this module can be shared by
+# app/models and app/Text_Extraction, which each have their own config.py.
+GEMINI_API_BASE_URL = os.getenv("GEMINI_API_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "120"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+
+# Files up to this size are sent inline (base64, streamed into the request body); larger
+# ones are uploaded through the Files API first and referenced by URI. Requests are limited
+# to 20 MB and base64 adds a third, so the default keeps inline requests under the limit.
+GEMINI_INLINE_MAX_BYTES = int(os.getenv("GEMINI_INLINE_MAX_BYTES", str(14 * 1024 * 1024)))
+# Files API upload root; derived from GEMINI_API_BASE_URL when not set (".../upload/v1beta")
+GEMINI_UPLOAD_BASE_URL = os.getenv("GEMINI_UPLOAD_BASE_URL", "")
+GEMINI_FILE_PROCESSING_TIMEOUT = float(os.getenv("GEMINI_FILE_PROCESSING_TIMEOUT", "300"))
+
+# Status codes worth retrying: rate limiting and transient server-side failures
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class GeminiAPIError(Exception):
+    """Raised when a Gemini request fails after all retries."""
+
+    def __init__(self, status_code, text):
+        super().__init__(f"{status_code} - {text}" if status_code is not None else text)
+        self.status_code = status_code
+        self.text = text
+
+
+def response_text(data):
+    """
+    Pull the generated text out of a generateContent response.
+
+    :param data: Parsed JSON response from the Gemini API.
+    :return: The text of the first candidate part, or None if the structure is unexpected.
+    """
+    if data and data.get('candidates') and data['candidates'][0].get('content') and data['candidates'][0]['content'].get('parts'):
+        return data['candidates'][0]['content']['parts'][0].get('text', "")
+    return None
+
+
+def upload_base_url(base_url):
+    """
+    :param base_url: API root, e.g. https://generativelanguage.googleapis.com/v1beta.
+    :return: The matching Files API upload root, e.g. https://generativelanguage.googleapis.com/upload/v1beta.
+    """
+    parts = urllib.parse.urlsplit(base_url)
+    return urllib.parse.urlunsplit((parts.scheme, parts.netloc, "/upload" + parts.path.rstrip("/"), "", ""))
+
+
+def _retry_after_seconds(value):
+    """
+    Parse a Retry-After header given either as seconds or as an HTTP date.
+
+    :param value: Header value (may be None).
+    :return: Number of seconds to wait, or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class _LoopThread:
+    """Background event loop that lets synchronous code share one pooled client."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="gemini-client-loop", daemon=True)
+        self.thread.start()
+
+    def run(self, coro):
+        if threading.current_thread() is self.thread:
+            raise RuntimeError("Synchronous Gemini call made from the client event loop; await the coroutine instead.")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+class GeminiClient:
+    """
+    Async Gemini REST client with keep-alive connection pooling, bounded concurrency,
+    timeouts and retry with exponential backoff that honors 429/Retry-After.
+
+    The client can be awaited from any event loop; each loop gets its own aiohttp session
+    because sessions cannot be shared across loops. Synchronous callers use `run`, which
+    executes coroutines on a shared background loop so connections stay warm between calls.
+    """
+
+    def __init__(self, api_key, base_url=GEMINI_API_BASE_URL, max_concurrency=GEMINI_MAX_CONCURRENCY,
+                 timeout=GEMINI_TIMEOUT_SECONDS, max_retries=GEMINI_MAX_RETRIES, backoff_base=1.0, backoff_max=30.0,
+                 upload_url=GEMINI_UPLOAD_BASE_URL, inline_max_bytes=GEMINI_INLINE_MAX_BYTES):
+        """
+        :param api_key: Gemini API key, sent in the x-goog-api-key header.
+        :param base_url: API root, e.g. https://generativelanguage.googleapis.com/v1beta.
+        :param max_concurrency: Maximum number of requests in flight per event loop.
+        :param timeout: Total timeout for a single HTTP attempt, in seconds.
+        :param max_retries: Number of retries after the first attempt.
+        :param backoff_base: Initial backoff delay in seconds, doubled on each retry.
+        :param backoff_max: Upper bound for a single backoff delay in seconds.
+        :param upload_url: Files API upload root (derived from base_url if empty).
+        :param inline_max_bytes: Largest file sent inline by media_part; larger files are uploaded.
+        """
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.upload_url = (upload_url or upload_base_url(self.base_url)).rstrip("/")
+        self.inline_max_bytes = inline_max_bytes
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_count = 0
+        self._loop_state = {}
+
+    def _state(self):
+        loop = asyncio.get_running_loop()
+        state = self._loop_state.get(loop)
+        if state is None or state[0].closed:
+            # aiohttp takes ~0.3 s to import, so it is only loaded once a request is made
+            import aiohttp
+
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Content-Type": "application/json", "x-goog-api-key": self.api_key or ""},
+            )
+            state = (session, asyncio.Semaphore(self.max_concurrency))
+            self._loop_state[loop] = state
+        return state
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        # Full jitter keeps parallel workers from retrying in lockstep
+        return random.uniform(0, delay)
+
+    async def _request(self, method, url, endpoint, body=None, headers=None, max_retries=None):
+        """
+        Send a request with bounded concurrency and retries, and return the parsed response.
+
+        :param method: HTTP method.
+        :param url: Full URL.
+        :param endpoint: Label for the metrics, e.g. "generateContent".
+        :param body: None, bytes, or an object with `size` and `stream()` (JSONRequestBody,
+                     InlinePart) that is streamed again on every attempt.
+        :param headers: Extra request headers.
+        :param max_retries: Retries for this request (defaults to the client's).
+        :return: Tuple (parsed JSON response or {} if empty, response headers).
+        :raises GeminiAPIError: If the request still fails after all retries.
+        """
+        import aiohttp
+
+        session, semaphore = self._state()
+        max_retries = self.max_retries if max_retries is None else max_retries
+        headers = dict(headers or {})
+        if body is not None and not isinstance(body, bytes):
+            # A known length avoids chunked encoding, which some upload endpoints reject
+            headers["Content-Length"] = str(body.size)
+
+        attempt = 0
+        while True:
+            retry_after = None
+            async with semaphore:
+                try:
+                    with metrics.span("api_request", endpoint=endpoint):
+                        data = body if body is None or isinstance(body, bytes) else body.stream()
+                        async with session.request(method, url, data=data, headers=headers) as response:
+                            metrics.increment("askmath_api_responses_total", endpoint=endpoint, status=response.status)
+                            if response.status == 200:
+                                content = await response.read()
+                                return (json.loads(content) if content.strip() else {}), response.headers
+                            text = await response.text()
+                            if response.status not in RETRYABLE_STATUS_CODES or attempt >= max_retries:
+                                raise GeminiAPIError(response.status, text)
+                            retry_after = _retry_after_seconds(response.headers.get("Retry-After"))
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    if attempt >= max_retries:
+                        raise GeminiAPIError(None, f"Network or API request error: {e!r}") from e
+
+            # Sleep outside the semaphore so waiting retries do not block other requests
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+            attempt += 1
+            self.retry_count += 1
+            metrics.increment("askmath_api_retries_total", endpoint=endpoint)
+
+    async def post(self, path, payload):
+        """
+        POST a JSON payload to `{base_url}/{path}` and return the parsed JSON response.
+
+        InlinePart objects in the payload are base64-encoded while the body is sent, so
+        large files are never held in memory as a whole.
+
+        :param path: Endpoint path relative to the API root, e.g. "models/embedding-001:embedContent".
+        :param payload: JSON-serializable request body, possibly containing InlinePart objects.
+        :return: Parsed JSON response.
+        :raises GeminiAPIError: If the request still fails after all retries.
+        """
+        if not self.api_key:
+            raise GeminiAPIError(None, "GEMINI_API_KEY is missing in the .env file!")
+
+        endpoint = path.rsplit(":", 1)[-1]
+
+        # Serialize once: the same body is reused across retries and its size is recorded
+        body = JSONRequestBody(payload)
+        metrics.observe("askmath_api_request_bytes", body.size, endpoint=endpoint)
+        data, _ = await self._request("POST", f"{self.base_url}/{path}", endpoint, body if body.streamed else body.to_bytes())
+        return data
+
+    async def upload_file(self, source, mime_type, display_name=None):
+        """
+        Upload a file with the Files API (resumable protocol) and wait until it can be used.
+
+        The content is streamed from the file, so memory use does not grow with its size. A
+        failed upload is restarted from the beginning with a new upload session.
+
+        :param source: File path, bytes-like object or InlinePart.
+        :param mime_type: MIME type of the file.
+        :param display_name: Name shown for the file in the Files API.
+        :return: The file resource (name, uri, mimeType, state, ...).
+        :raises GeminiAPIError: If the upload or the file's processing fails.
+        """
+        if not self.api_key:
+            raise GeminiAPIError(None, "GEMINI_API_KEY is missing in the .env file!")
+
+        part = source if isinstance(source, InlinePart) else InlinePart(source, mime_type)
+        metrics.observe("askmath_api_upload_bytes", part.size)
+        attempt = 0
+        while True:
+            try:
+                with metrics.span("file_upload"):
+                    # Step 1: Open an upload session
+                    start = json.dumps({"file": {"display_name": display_name or "upload"}}).encode("utf-8")
+                    _, headers = await self._request("POST", f"{self.upload_url}/files", "upload_start", start, headers={
+                        "X-Goog-Upload-Protocol": "resumable",
+                        "X-Goog-Upload-Command": "start",
+                        "X-Goog-Upload-Header-Content-Length": str(part.size),
+                        "X-Goog-Upload-Header-Content-Type": part.mime_type,
+                    })
+                    session_url = headers.get("X-Goog-Upload-URL")
+                    if not session_url:
+                        raise GeminiAPIError(None, "Upload session URL missing from the Files API response")
+
+                    # Step 2: Stream the content and finalize; a broken upload restarts with a new session
+                    data, _ = await self._request("POST", session_url, "upload", part, max_retries=0, headers={
+                        "Content-Type": part.mime_type,
+                        "X-Goog-Upload-Offset": "0",
+                        "X-Goog-Upload-Command": "upload, finalize",
+                    })
+                break
+            except GeminiAPIError as e:
+                if e.status_code not in RETRYABLE_STATUS_CODES | {None} or attempt >= self.max_retries:
+                    raise
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+            self.retry_count += 1
+            metrics.increment("askmath_api_retries_total", endpoint="upload")
+
+        # Step 3: Wait until the file has been processed (PDFs and videos are not usable right away)
+        file = data.get("file", data)
+        deadline = time.monotonic() + GEMINI_FILE_PROCESSING_TIMEOUT
+        while file.get("state") == "PROCESSING":
+            if time.monotonic() > deadline:
+                raise GeminiAPIError(None, f"Uploaded file {file.get('name')} is still processing")
+            await asyncio.sleep(1.0)
+            file, _ = await self._request("GET", f"{self.base_url}/{file['name']}", "files_get")
+        if file.get("state") == "FAILED" or not file.get("uri"):
+            raise GeminiAPIError(None, f"Uploaded file {file.get('name')} could not be processed: {file}")
+        return file
+
+    async def media_part(self, source, mime_type, display_name=None):
+        """
+        Build the request part for a file: inline data streamed into the request for files up
+        to inline_max_bytes, otherwise an upload-then-reference `fileData` part.
+
+        :param source: File path or bytes-like object.
+        :param mime_type: MIME type of the content.
+        :param display_name: Name shown in the Files API if the file is uploaded.
+        :return: InlinePart or a `fileData` part dict, for use in generate_content parts.
+        """
+        part = InlinePart(source, mime_type)
+        if part.size <= self.inline_max_bytes:
+            return part
+        file = await self.upload_file(part, mime_type, display_name)
+        return {"fileData": {"mimeType": file.get("mimeType", mime_type), "fileUri": file["uri"]}}
+
+    async def generate_content(self, model_id, parts, generation_config=None):
+        """
+        Call `{model_id}:generateContent` with a single user turn.
+
+        :param model_id: Full model path, e.g. "models/gemini-2.5-flash".
+        :param parts: List of content parts (text, inlineData, fileData or InlinePart).
+        :param generation_config: Optional generationConfig, e.g. a responseMimeType and
+                                  responseSchema for structured output.
+        :return: Parsed JSON response.
+        """
+        payload = {"contents": [{"parts": parts}]}
+        if generation_config:
+            payload["generationConfig"] = generation_config
+        return await self.post(f"{model_id}:generateContent", payload)
+
+    async def embed_content(self, model_id, text):
+        """
+        Call `{model_id}:embedContent` for one piece of text.
+
+        :param model_id: Full model path, e.g. "models/embedding-001".
+        :param text: Text to embed.
+        :return: Parsed JSON response.
+        """
+        payload = {"model": model_id, "content": {"parts": [{"text": text}]}}
+        return await self.post(f"{model_id}:embedContent", payload)
+
+    async def batch_embed_contents(self, model_id, texts):
+        """
+        Call `{model_id}:batchEmbedContents` for several pieces of text.
+
+        :param model_id: Full model path, e.g. "models/embedding-001".
+        :param texts: List of texts to embed (at most 100).
+        :return: Parsed JSON response.
+        """
+        payload = {
+            "requests": [
+                {"model": model_id, "content": {"parts": [{"text": text}]}}
+                for text in texts
+            ]
+        }
+        return await self.post(f"{model_id}:batchEmbedContents", payload)
+
+    def run(self, coro):
+        """
+        Run a coroutine to completion from synchronous code on the shared background loop.
+
+        :param coro: Coroutine to execute.
+        :return: The coroutine's result.
+        """
+        return _background_loop().run(coro)
+
+    async def close(self):
+        """Close the session owned by the current event loop."""
+        state = self._loop_state.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state[0].close()
+
+
+_loop_thread = None
+_clients = {}
+_lock = threading.Lock()
+
+
+def _background_loop():
+    global _loop_thread
+    with _lock:
+        if _loop_thread is None:
+            _loop_thread = _LoopThread()
+            atexit.register(_close_background_sessions)
+        return _loop_thread
+
+
+def _close_background_sessions():
+    """Close the pooled sessions owned by the background loop at interpreter exit."""
+    async def close_all():
+        for client in list(_clients.values()):
+            await client.close()
+
+    asyncio.run_coroutine_threadsafe(close_all(), _loop_thread.loop).result(timeout=5)
+
+
+def get_client(api_key):
+    """
+    Return the process-wide client for an API key, creating it on first use.
+
+    :param api_key: Gemini API key.
+    :return: Shared GeminiClient instance.
+    """
+    with _lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = GeminiClient(api_key)
+            _clients[api_key] = client
+        return client
@@ -0,0 +1,94 @@
+# image_ocr.py
+import asyncio
+import hashlib
+import os
+
+from .gemini_client import get_client, response_text, GeminiAPIError
+from .image_preprocess import preprocess_image, preprocess_signature
+from .metrics import metrics
+from .ocr_cache import get_ocr_cache
+from .single_flight import SingleFlight
+
+# Instruction sent with every image. OCR results are cached per prompt text,
+# so editing this string invalidates previously cached extractions.
+OCR_PROMPT = "Extract all text and mathematical expressions from this image."
+
+# Concurrent uploads of the same image share one in-flight OCR request, whether they come
+# through video_recommendation, Text_Extraction/ocr.py or the server
+ocr_flight = SingleFlight("ocr")
+
+
+async def ocr_image_bytes_async(image_bytes, api_key, model_id, image_name=None, upload=None):
+    """
+    OCR one image already in memory with OCR_PROMPT.
+
+    The result is looked up in the OCR cache first; on a miss the image is preprocessed and
+    sent to Gemini, and identical images requested at the same time share that one request.
+    The cache lookups and the preprocessing run on worker threads, so a server's event loop
+    keeps handling other requests meanwhile.
+    Errors (API errors, connection failures, timeouts) are printed and give None, so they
+    never propagate to the callers waiting on the shared request.
+
+    :param image_bytes: Encoded image (JPEG, PNG, ...).
+    :param api_key: Gemini API key.
+    :param model_id: Full model path, e.g. "models/gemini-2.5-flash".
+    :param image_name: File name used to guess the image type when it cannot be sniffed.
+    :param upload: Optional (upload_bytes, mime_type) already produced by preprocess_image for
+                   this image, so it is not preprocessed again.
+    :return: Extracted text, or None on failure.
+    """
+    try:
+        # Repeat uploads of the same image are answered from the cache
+        loop = asyncio.get_running_loop()
+        cache_model_id = f"{model_id}|{preprocess_signature()}"
+        ocr_cache = get_ocr_cache()
+        if ocr_cache is not None:
+            cached_text = await loop.run_in_executor(None, ocr_cache.get, image_bytes, cache_model_id, OCR_PROMPT)
+            if cached_text is not None:
+                return cached_text
+
+        flight_key = (hashlib.sha256(image_bytes).hexdigest(), cache_model_id, OCR_PROMPT)
+        return await ocr_flight.do(
+            flight_key, lambda: _ocr_image_async(image_bytes, image_name, api_key, model_id, cache_model_id, ocr_cache, upload)
+        )
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+        return None
+
+
+async def _ocr_image_async(image_bytes, image_name, api_key, model_id, cache_model_id, ocr_cache, upload=None):
+    """
+    Preprocess and send one image to Gemini, caching the text. Only run through ocr_flight.
+    """
+    try:
+        # Shrink the upload: EXIF rotation, downscaling, grayscale and compact re-encoding
+        loop = asyncio.get_running_loop()
+        if upload is not None:
+            upload_bytes, mime_type = upload
+        else:
+            with metrics.span("image_preprocess"):
+                upload_bytes, mime_type, _ = await loop.run_in_executor(None, preprocess_image, image_bytes, image_name)
+
+        # The image is base64-encoded while the request is sent, not built up in memory first;
+        # images over GEMINI_INLINE_MAX_BYTES are uploaded and referenced instead
+        client = get_client(api_key)
+        parts = [
+            {"text": OCR_PROMPT},
+            await client.media_part(upload_bytes, mime_type, image_name and os.path.basename(image_name)),
+        ]
+        with metrics.span("ocr"):
+            data = await client.generate_content(model_id, parts)
+
+        extracted_text = response_text(data)
+        if extracted_text is None:
+            print(f"Error: Unexpected response structure from Gemini API: {data}")
+        elif ocr_cache is not None:
+            await loop.run_in_executor(None, ocr_cache.put, image_bytes, cache_model_id, OCR_PROMPT, extracted_text)
+        return extracted_text
+    except GeminiAPIError as e:
+        print(f"Error: {e}")
+        return None
+    except Exception as e:
+        # Connection errors and timeouts too: every caller waiting on this request gets None
+        print(f"An unexpected error occurred: {e}")
+        return None
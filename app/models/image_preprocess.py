@@ -0,0 +1,128 @@
+# image_preprocess.py
+import io
+import mimetypes
+import os
+
+from .metrics import metrics
+
+# Settings are read from the environment directly because preprocessing is shared by
+# app/models and app/Text_Extraction, which each have their own config.py.
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "2048"))
+IMAGE_GRAYSCALE = os.getenv("IMAGE_GRAYSCALE", "1") == "1"
+IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "JPEG").upper()
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+
+_OUTPUT_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+def detect_mime_type(image_bytes, image_path=None):
+    """
+    Detect an image's MIME type from its magic bytes, falling back to the file extension.
+
+    :param image_bytes: Raw image file bytes.
+    :param image_path: Optional file name used when the bytes are not recognized.
+    :return: MIME type such as "image/png".
+    """
+    if image_bytes.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if image_bytes.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if image_bytes[:4] == b"RIFF" and image_bytes[8:12] == b"WEBP":
+        return "image/webp"
+    if image_bytes[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if image_bytes[4:8] == b"ftyp" and image_bytes[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        return "image/heic"
+    if image_path:
+        guessed, _ = mimetypes.guess_type(image_path)
+        if guessed and guessed.startswith("image/"):
+            return guessed
+    return "image/jpeg"
+
+
+def preprocess_signature():
+    """
+    :return: String describing the active settings, mixed into OCR cache keys so changing
+             the size/quality trade-off does not serve results produced under other settings.
+    """
+    return f"max={IMAGE_MAX_DIMENSION},gray={int(IMAGE_GRAYSCALE)},fmt={IMAGE_OUTPUT_FORMAT},q={IMAGE_QUALITY}"
+
+
+def _record(stats, result):
+    # Upload sizes and savings go to the metrics registry instead of a log line per image
+    metrics.increment("askmath_image_preprocess_total", result=result)
+    metrics.observe("askmath_image_original_bytes", stats["original_bytes"])
+    metrics.observe("askmath_image_upload_bytes", stats["processed_bytes"])
+    if stats["bytes_saved"] > 0:
+        metrics.increment("askmath_image_bytes_saved_total", stats["bytes_saved"])
+    return stats
+
+
+def preprocess_image(image_bytes, image_path=None, max_dimension=IMAGE_MAX_DIMENSION, grayscale=IMAGE_GRAYSCALE,
+                     output_format=IMAGE_OUTPUT_FORMAT, quality=IMAGE_QUALITY):
+    """
+    Shrink an image before uploading it for OCR.
+
+    Applies EXIF orientation, downscales so the longest side is at most `max_dimension`,
+    optionally converts to grayscale with auto-contrast, and re-encodes in a compact format.
+    If Pillow is not installed or the image cannot be decoded, the original bytes are
+    returned with their detected MIME type.
+
+    :param image_bytes: Raw image file bytes.
+    :param image_path: Optional file name used for MIME detection.
+    :param max_dimension: Longest allowed side in pixels.
+    :param grayscale: Convert to grayscale and normalize contrast.
+    :param output_format: "JPEG", "WEBP" or "PNG".
+    :param quality: Encoder quality for JPEG/WEBP.
+    :return: Tuple (upload_bytes, mime_type, stats) where stats has original_bytes,
+             processed_bytes and bytes_saved (also recorded in the askmath_image_* metrics).
+    """
+    original_mime_type = detect_mime_type(image_bytes, image_path)
+    unchanged = (image_bytes, original_mime_type, {
+        "original_bytes": len(image_bytes),
+        "processed_bytes": len(image_bytes),
+        "bytes_saved": 0,
+    })
+
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        _record(unchanged[2], "skipped")
+        return unchanged
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as original:
+            # EXIF tag 0x0112 is the orientation phones record instead of rotating pixels
+            rotated = original.getexif().get(0x0112, 1) != 1
+            image = ImageOps.exif_transpose(original)
+            resized = max(image.size) > max_dimension
+            if resized:
+                image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+            if grayscale:
+                image = ImageOps.autocontrast(image.convert("L"), cutoff=1)
+            elif image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+
+            buffer = io.BytesIO()
+            save_options = {"optimize": True}
+            if output_format in ("JPEG", "WEBP"):
+                save_options["quality"] = quality
+            image.save(buffer, format=output_format, **save_options)
+    except Exception as e:
+        print(f"Warning: image preprocessing skipped: {e}")
+        _record(unchanged[2], "skipped")
+        return unchanged
+
+    processed = buffer.getvalue()
+    # Re-encoding an already small image can make it bigger; keep the original unless it had to change shape
+    if len(processed) >= len(image_bytes) and not (rotated or resized):
+        _record(unchanged[2], "unchanged")
+        return unchanged
+
+    stats = _record({
+        "original_bytes": len(image_bytes),
+        "processed_bytes": len(processed),
+        "bytes_saved": len(image_bytes) - len(processed),
+    }, "processed")
+    return processed, _OUTPUT_MIME_TYPES.get(output_format, "image/jpeg"), stats
@@ -0,0 +1,116 @@
+# index_factory.py
+import os
+
+# Read with FAISS's mmap IO flag so worker processes share one page-cached copy of the index
+FAISS_INDEX_MMAP = os.getenv("FAISS_INDEX_MMAP", "0") == "1"
+
+# Supported index types and the FAISS factory string each one maps to
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+
+def index_factory_string(index_type, embedding_dimension, nlist=100, pq_m=16, pq_nbits=8, hnsw_m=32):
+    """
+    Build the FAISS index_factory description for an index type.
+
+    :param index_type: One of INDEX_TYPES.
+    :param embedding_dimension: Dimension of the vectors.
+    :param nlist: Number of IVF clusters (ivf_flat, ivf_pq).
+    :param pq_m: Number of PQ sub-quantizers, must divide the dimension (ivf_pq).
+    :param pq_nbits: Bits per PQ code (ivf_pq).
+    :param hnsw_m: Number of neighbors per HNSW node (hnsw).
+    :return: Factory string such as "IVF100,PQ16x8".
+    """
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        if embedding_dimension % pq_m:
+            raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {embedding_dimension}")
+        return f"IVF{nlist},PQ{pq_m}x{pq_nbits}"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m}"
+    raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+
+
+def create_faiss_index(embedding_dimension, index_type="flat", **params):
+    """
+    Create an empty (possibly untrained) L2 index of the requested type.
+
+    :param embedding_dimension: Dimension of the vectors.
+    :param index_type: One of INDEX_TYPES.
+    :param params: Extra arguments for index_factory_string.
+    :return: FAISS index.
+    """
+    import faiss
+
+    return faiss.index_factory(embedding_dimension, index_factory_string(index_type, embedding_dimension, **params), faiss.METRIC_L2)
+
+
+def train_faiss_index(index, embeddings):
+    """
+    Train an index if its type needs it (IVF coarse quantizer, PQ codebooks).
+
+    :param index: FAISS index, optionally wrapped in an ID map.
+    :param embeddings: Float32 training matrix; IVF needs at least `nlist` rows.
+    """
+    import numpy as np
+
+    if not index.is_trained:
+        index.train(np.ascontiguousarray(embeddings, dtype="float32"))
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """
+    Set query-time accuracy knobs on an index.
+
+    :param index: FAISS index, optionally wrapped in an ID map.
+    :param nprobe: Number of IVF clusters visited per query.
+    :param ef_search: HNSW candidate list size per query.
+    """
+    import faiss
+
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    if nprobe is not None:
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = nprobe
+    if ef_search is not None and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+
+
+def build_faiss_index(embeddings, index_type="flat", **params):
+    """
+    Create, train and fill an index in one step.
+
+    :param embeddings: Float32 matrix of shape (n, dimension).
+    :param index_type: One of INDEX_TYPES.
+    :param params: Extra arguments for index_factory_string.
+    :return: Trained FAISS index containing all embeddings.
+    """
+    import numpy as np
+
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    index = create_faiss_index(embeddings.shape[1], index_type, **params)
+    train_faiss_index(index, embeddings)
+    index.add(embeddings)
+    return index
+
+
+def read_faiss_index(faiss_index_path, mmap=FAISS_INDEX_MMAP):
+    """
+    Read a FAISS index, memory-mapping it when requested and supported by the index type.
+
+    :param faiss_index_path: The path where the FAISS index is stored.
+    :param mmap: Map the file read-only instead of copying it into process memory.
+    :return: Loaded FAISS index.
+    """
+    import faiss
+
+    if mmap:
+        try:
+            return faiss.read_index(faiss_index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError as e:
+            print(f"Warning: could not memory-map '{faiss_index_path}', reading it into memory instead: {e}")
+    return faiss.read_index(faiss_index_path)
@@ -0,0 +1,108 @@
+# index_holder.py
+import os
+import threading
+import time
+
+from .index_factory import FAISS_INDEX_MMAP, read_faiss_index
+from .index_manager import IndexManager
+
+# Minimum number of seconds between checks of the index file for changes
+FAISS_INDEX_CHECK_INTERVAL = float(os.getenv("FAISS_INDEX_CHECK_INTERVAL", "1"))
+
+
+class IndexHolder:
+    """
+    Lazily loads an object built from an index file once and shares it across requests.
+
+    `get` re-stats the file at most every `check_interval` seconds. When the file changes
+    (writers replace it atomically with os.replace), a new object is loaded and swapped in
+    with a single reference assignment; callers still holding the old one keep using it
+    until `close` (if given) releases its resources.
+    """
+
+    def __init__(self, path, loader, check_interval=FAISS_INDEX_CHECK_INTERVAL, close=None):
+        """
+        :param path: Path of the file to watch.
+        :param loader: Callable taking the path and returning the loaded object.
+        :param check_interval: Minimum seconds between file change checks.
+        :param close: Optional callable run on the old object after a new one was swapped in.
+        """
+        self.path = path
+        self.loader = loader
+        self.check_interval = check_interval
+        self.close = close
+        self._value = None
+        self._signature = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def get(self):
+        """
+        :return: The loaded object, reloaded if the file changed since the last check,
+                 or None while the file does not exist.
+        """
+        now = time.monotonic()
+        if self._value is not None and now - self._last_check < self.check_interval:
+            return self._value
+
+        with self._lock:
+            if self._value is not None and now - self._last_check < self.check_interval:
+                return self._value
+            self._last_check = now
+            signature = self._file_signature()
+            if signature != self._signature:
+                old_value = self._value
+                self._value = self.loader(self.path) if signature is not None else None
+                self._signature = signature
+                if old_value is not None and self.close is not None:
+                    self.close(old_value)
+            return self._value
+
+
+_holders = {}
+_holders_lock = threading.Lock()
+
+
+def _holder(kind, path, loader, close=None):
+    key = (kind, os.path.abspath(path))
+    with _holders_lock:
+        holder = _holders.get(key)
+        if holder is None:
+            holder = IndexHolder(path, loader, close=close)
+            _holders[key] = holder
+        return holder
+
+
+def get_faiss_index(faiss_index_path="data/processed/faiss_index", mmap=FAISS_INDEX_MMAP):
+    """
+    Return the process-wide FAISS index for a path, loading it on first use.
+
+    :param faiss_index_path: The path where the FAISS index is stored.
+    :param mmap: Memory-map the index file instead of reading it into memory.
+    :return: Loaded FAISS index, or None if the file does not exist.
+    """
+    return _holder(("faiss", mmap), faiss_index_path, lambda path: read_faiss_index(path, mmap)).get()
+
+
+def get_index_manager(faiss_index_path="data/processed/faiss_index", mmap=FAISS_INDEX_MMAP):
+    """
+    Return a process-wide read-only IndexManager (index plus chunk metadata) for a path.
+
+    Opening it writes nothing to disk. When the index file changes, the replaced manager's
+    metadata store is closed.
+
+    :param faiss_index_path: The path where the FAISS index is stored.
+    :param mmap: Memory-map the index file instead of reading it into memory.
+    :return: Loaded IndexManager, or None if the index file does not exist.
+    """
+    return _holder(
+        ("manager", mmap), faiss_index_path,
+        lambda path: IndexManager(path, mmap=mmap, read_only=True), close=IndexManager.close,
+    ).get()
@@ -0,0 +1,361 @@
+# index_manager.py
+import os
+import sqlite3
+import threading
+import urllib.request
+
+from .index_factory import create_faiss_index, train_faiss_index, read_faiss_index
+from .embedding_backends import get_embedding_backend, LEGACY_BACKEND_NAME
+
+
+class IndexManager:
+    """
+    Incremental FAISS index with a side metadata store.
+
+    Vectors live in an IndexIDMap2 so individual documents can be added, removed or
+    replaced without rebuilding. Every vector ID maps to the book, chapter (অধ্যায়),
+    section (অনুশীলনী), PDF page and character offset of the chunk it was built from.
+    Metadata is persisted in SQLite next to the index and mirrored in memory for O(1) lookups.
+    Metadata changes are committed by save(), right after the new index file is in place, so
+    a vector's chunk is never removed while other processes can still load the vector. A reader
+    that loads in between may find new vectors whose chunks are not committed yet; read-only
+    managers fetch such rows from the store when they are first looked up. Vector IDs are never
+    reused, so a reader holding an older index never resolves a vector to another chunk.
+    The store also records which embedding backend and dimension produced the vectors, and
+    an index built with a different backend is rejected instead of returning nonsense matches.
+    """
+
+    def __init__(self, faiss_index_path="data/processed/faiss_index", metadata_path=None, index_type="flat", index_params=None, mmap=False,
+                 embedding_backend=None, read_only=False):
+        """
+        :param faiss_index_path: Path of the FAISS index file.
+        :param metadata_path: Path of the SQLite metadata store (defaults to `<index>.meta.sqlite`).
+        :param index_type: Index type used when a new index is created (see index_factory.INDEX_TYPES).
+                           IVF types are trained on the first batch added, which must hold at least
+                           `nlist` vectors. HNSW indexes do not support removing documents.
+        :param index_params: Extra arguments for index_factory.create_faiss_index.
+        :param mmap: Memory-map the index file read-only (for serving; the index cannot be modified).
+        :param embedding_backend: Backend the query and chunk vectors come from (defaults to the one
+                                  selected by EMBEDDING_BACKEND, see embedding_backends.py).
+        :param read_only: Open for serving: nothing is created, migrated or written on disk, and
+                          documents cannot be added or removed.
+        :raises ValueError: If the stored index was built with another backend or dimension.
+        """
+        self.faiss_index_path = faiss_index_path
+        self.metadata_path = metadata_path or f"{faiss_index_path}.meta.sqlite"
+        self.index_type = index_type
+        self.index_params = index_params or {}
+        self.mmap = mmap
+        self.read_only = read_only
+        self.embedding_backend = embedding_backend or get_embedding_backend()
+        self.index = None
+        self._metadata = {}
+        self._next_id = 0
+        self._info = {}
+        self._row_query = None
+        self._lock = threading.RLock()
+
+        self._conn = self._connect_read_only() if read_only else self._connect()
+        if self._conn is not None and self._has_table("index_info"):
+            self._info = dict(self._conn.execute("SELECT key, value FROM index_info"))
+        # IDs of removed vectors stay used: the highest ones may no longer be in the index or the store
+        self._next_id = int(self._info.pop("next_id", 0))
+
+        self._load()
+        self._check_backend()
+        if not read_only:
+            self._conn.commit()
+
+    def _connect(self):
+        directory = os.path.dirname(self.metadata_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.metadata_path, check_same_thread=False)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id INTEGER PRIMARY KEY, doc_id TEXT NOT NULL, book TEXT, chapter TEXT, section TEXT, "
+            "char_offset INTEGER, char_length INTEGER, text TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS chunks_doc_id ON chunks(doc_id)")
+        # Stores created before page tracking lack the page column
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(chunks)")]
+        if "page" not in columns:
+            conn.execute("ALTER TABLE chunks ADD COLUMN page INTEGER")
+        conn.execute("CREATE TABLE IF NOT EXISTS index_info (key TEXT PRIMARY KEY, value TEXT)")
+        conn.commit()
+        return conn
+
+    def _connect_read_only(self):
+        # Indexes from before chunk metadata have no store at all
+        if not os.path.exists(self.metadata_path):
+            return None
+        uri = f"file:{urllib.request.pathname2url(os.path.abspath(self.metadata_path))}?mode=ro"
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    def _has_table(self, name):
+        return self._conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ValueError(f"Index '{self.faiss_index_path}' was opened read-only")
+
+    def _load(self):
+        import faiss
+        import numpy as np
+
+        if self._conn is not None and self._has_table("chunks"):
+            # A read-only store is not migrated, so it may predate the page column
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")]
+            page = "page" if "page" in columns else "NULL"
+            self._row_query = f"SELECT id, doc_id, book, chapter, section, char_offset, char_length, {page} FROM chunks"
+            for row in self._conn.execute(self._row_query):
+                self._metadata[row[0]] = row[1:]
+                self._next_id = max(self._next_id, row[0] + 1)
+
+        if not os.path.exists(self.faiss_index_path):
+            return
+
+        index = read_faiss_index(self.faiss_index_path, self.mmap)
+        if not isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            # Indexes written before IDs were tracked use their row positions as IDs
+            vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else None
+            index = faiss.IndexIDMap2(faiss.IndexFlatL2(index.d))
+            if vectors is not None:
+                index.add_with_ids(vectors, np.arange(len(vectors), dtype=np.int64))
+        self.index = index
+        if index.ntotal:
+            self._next_id = max(self._next_id, int(faiss.vector_to_array(index.id_map).max()) + 1)
+
+    def embedding_info(self):
+        """
+        :return: Dict with the recorded embedding_backend and dimension (empty for a new index).
+        """
+        info = dict(self._info)
+        if "dimension" in info:
+            info["dimension"] = int(info["dimension"])
+        return info
+
+    def _record_backend(self, backend_name, dimension):
+        self._info.update({"embedding_backend": backend_name, "dimension": str(dimension)})
+        if self.read_only:
+            return
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO index_info VALUES (?, ?)",
+            [("embedding_backend", backend_name), ("dimension", str(dimension))],
+        )
+
+    def _check_backend(self):
+        info = self.embedding_info()
+        stored = info.get("embedding_backend")
+        if stored is None and self.index is not None and self.index.ntotal:
+            # Indexes from before backends were recorded were built with Gemini embeddings
+            stored = LEGACY_BACKEND_NAME
+            self._record_backend(stored, self.index.d)
+        if stored is None or (self.index is None and not self._metadata):
+            return
+
+        if stored != self.embedding_backend.name:
+            raise ValueError(
+                f"Index '{self.faiss_index_path}' was built with embedding backend '{stored}', "
+                f"but '{self.embedding_backend.name}' is selected. Rebuild the index or change EMBEDDING_BACKEND."
+            )
+        expected = self.embedding_backend.dimension
+        dimension = self.index.d if self.index is not None else info.get("dimension")
+        if expected is not None and dimension is not None and dimension != expected:
+            raise ValueError(
+                f"Index '{self.faiss_index_path}' has dimension {dimension}, "
+                f"but the '{self.embedding_backend.name}' backend produces {expected}-dimensional vectors."
+            )
+
+    def _ensure_index(self, embeddings):
+        import faiss
+
+        dimension = embeddings.shape[1]
+        expected = self.embedding_backend.dimension
+        if expected is not None and dimension != expected:
+            raise ValueError(f"Embedding dimension {dimension} does not match the {expected} of backend '{self.embedding_backend.name}'")
+        if self.index is None:
+            self.index = faiss.IndexIDMap2(create_faiss_index(dimension, self.index_type, **self.index_params))
+            self._record_backend(self.embedding_backend.name, dimension)
+        elif self.index.d != dimension:
+            raise ValueError(f"Embedding dimension {dimension} does not match index dimension {self.index.d}")
+        train_faiss_index(self.index, embeddings)
+
+    def add_document(self, doc_id, chunks, embeddings, book=None, chapter=None, section=None, offsets=None, pages=None):
+        """
+        Append the chunks of one document to the index.
+
+        :param doc_id: Stable identifier of the document (used for remove/update).
+        :param chunks: List of chunk texts, one per embedding row.
+        :param embeddings: Float32 matrix of shape (len(chunks), dimension).
+        :param book: Book the document belongs to.
+        :param chapter: Chapter (অধ্যায়) of the document.
+        :param section: Exercise section (অনুশীলনী) of the document.
+        :param offsets: Character offset of each chunk in the document text.
+        :param pages: Source PDF page number of each chunk.
+        :return: List of vector IDs assigned to the chunks.
+        """
+        import numpy as np
+
+        self._check_writable()
+        embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+        if len(chunks) != len(embeddings):
+            raise ValueError("chunks and embeddings must have the same length")
+        if offsets is None:
+            offsets = [None] * len(chunks)
+        if pages is None:
+            pages = [None] * len(chunks)
+
+        with self._lock:
+            if len(chunks) == 0:
+                return []
+            self._ensure_index(embeddings)
+            ids = list(range(self._next_id, self._next_id + len(chunks)))
+            self.index.add_with_ids(embeddings, np.array(ids, dtype=np.int64))
+            self._next_id += len(chunks)
+
+            rows = [
+                (vector_id, doc_id, book, chapter, section, offset, len(chunk), page, chunk)
+                for vector_id, chunk, offset, page in zip(ids, chunks, offsets, pages)
+            ]
+            self._conn.executemany(
+                "INSERT INTO chunks (id, doc_id, book, chapter, section, char_offset, char_length, page, text) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            for row in rows:
+                self._metadata[row[0]] = row[1:8]
+            return ids
+
+    def remove_document(self, doc_id):
+        """
+        Remove every vector that belongs to a document.
+
+        :param doc_id: Identifier passed to add_document.
+        :return: Number of vectors removed.
+        """
+        import numpy as np
+
+        self._check_writable()
+        with self._lock:
+            ids = [row[0] for row in self._conn.execute("SELECT id FROM chunks WHERE doc_id = ?", (doc_id,))]
+            if not ids:
+                return 0
+            if self.index is not None:
+                self.index.remove_ids(np.array(ids, dtype=np.int64))
+            self._conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+            for vector_id in ids:
+                self._metadata.pop(vector_id, None)
+            return len(ids)
+
+    def update_document(self, doc_id, chunks, embeddings, book=None, chapter=None, section=None, offsets=None, pages=None):
+        """
+        Replace a document's vectors and metadata with a new version.
+
+        :return: List of vector IDs assigned to the new chunks.
+        """
+        with self._lock:
+            self.remove_document(doc_id)
+            return self.add_document(doc_id, chunks, embeddings, book, chapter, section, offsets, pages)
+
+    def lookup(self, vector_id):
+        """
+        Resolve a vector ID returned by a search to its chunk metadata.
+
+        :param vector_id: ID from the FAISS search results.
+        :return: Dict with doc_id, book, chapter, section, char_offset, char_length and page, or None.
+        """
+        row = self._metadata.get(int(vector_id))
+        if row is None and self.read_only:
+            row = self._fetch_row(int(vector_id))
+        if row is None:
+            return None
+        return dict(zip(("doc_id", "book", "chapter", "section", "char_offset", "char_length", "page"), row))
+
+    def _fetch_row(self, vector_id):
+        # The index file may have been loaded just before the writer committed its chunks
+        with self._lock:
+            if self._conn is None or self._row_query is None:
+                return None
+            row = self._conn.execute(f"{self._row_query} WHERE id = ?", (vector_id,)).fetchone()
+            if row is None:
+                return None
+            self._metadata[row[0]] = row[1:]
+            return row[1:]
+
+    def chunk_text(self, vector_id):
+        """
+        :param vector_id: ID from the FAISS search results.
+        :return: The stored chunk text, or None if unknown (or the manager was closed).
+        """
+        with self._lock:
+            if self._conn is None:
+                return None
+            row = self._conn.execute("SELECT text FROM chunks WHERE id = ?", (int(vector_id),)).fetchone()
+        return row[0] if row else None
+
+    def iter_chunks(self):
+        """
+        Iterate over every stored chunk, e.g. to build a lexical index.
+
+        :return: Generator of (vector_id, text, chapter, section).
+        """
+        with self._lock:
+            if self._conn is None:
+                return iter(())
+            rows = self._conn.execute("SELECT id, text, chapter, section FROM chunks ORDER BY id").fetchall()
+        return (tuple(row) for row in rows)
+
+    def search(self, query_embeddings, top_k=5):
+        """
+        Search the index and resolve every hit to its metadata.
+
+        :param query_embeddings: A single query vector or a matrix of query vectors.
+        :param top_k: The number of most similar results to return per query.
+        :return: Tuple (distances, indices, metadata) where metadata[i][j] describes indices[i][j].
+        """
+        import numpy as np
+
+        queries = np.ascontiguousarray(query_embeddings, dtype="float32")
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        if self.index is None or self.index.ntotal == 0:
+            empty = np.empty((len(queries), 0))
+            return empty, empty.astype(np.int64), [[] for _ in queries]
+
+        if queries.shape[1] != self.index.d:
+            raise ValueError(f"Query dimension {queries.shape[1]} does not match index dimension {self.index.d}")
+        distances, indices = self.index.search(queries, top_k)
+        metadata = [[self.lookup(vector_id) if vector_id != -1 else None for vector_id in row] for row in indices]
+        return distances, indices, metadata
+
+    def save(self):
+        """
+        Write the index to disk atomically (write to a temporary file, then rename) and commit
+        the metadata changes made since the last save.
+        """
+        import faiss
+
+        self._check_writable()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO index_info VALUES ('next_id', ?)", (str(self._next_id),))
+            if self.index is None:
+                self._conn.commit()
+                return
+            directory = os.path.dirname(self.faiss_index_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.faiss_index_path}.tmp"
+            faiss.write_index(self.index, tmp_path)
+            # Index first, then the metadata: removed chunks stay in the store until no new
+            # reader can load their vectors; readers look up added chunks missing from a snapshot
+            os.replace(tmp_path, self.faiss_index_path)
+            self._conn.commit()
+
+    def close(self):
+        """
+        Close the metadata store. Changes not written by save() are discarded.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
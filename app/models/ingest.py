@@ -0,0 +1,317 @@
+# ingest.py
+import argparse
+import asyncio
+import collections
+import hashlib
+import io
+import json
+import os
+import re
+import time
+
+from .config import GEMINI_API_KEY, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, CHUNK_PAGE_CARRY_TOKENS
+from .chapter_map import get_chapter_map, load_chapter_map
+from .gemini_client import get_client
+from .embedding import generate_embeddings_for_chunks_async
+from .chunker import ChunkStats, iter_chunks, trailing_text
+from .index_manager import IndexManager
+from .sharded_index import ShardedIndex
+from .pdf_extractor import extract_text_from_pdf_bytes_async
+
+PAGE_MARKER = re.compile(r"^=== PAGE (\d+) ===\s*$", re.MULTILINE)
+SINGLE_PAGE_PROMPT = "Extract all the content from this PDF page."
+
+
+def split_pdf_pages(pdf, pages_per_request=1):
+    """
+    Split a PDF into page ranges, each returned as a standalone PDF.
+
+    Requires the optional `pypdf` package.
+
+    :param pdf: Raw PDF file content, or a seekable binary file open on the PDF. A file is read
+                as pages are needed, so the whole book is never held in memory; it must stay
+                open until the generator is exhausted.
+    :param pages_per_request: Number of pages in each range.
+    :return: Tuple (page_count, generator of (first_page, last_page, range_pdf_bytes)) with 1-based pages.
+    """
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError as e:
+        raise ImportError("Page-parallel ingestion needs pypdf: pip install pypdf") from e
+
+    reader = PdfReader(io.BytesIO(pdf) if isinstance(pdf, (bytes, bytearray)) else pdf)
+    page_count = len(reader.pages)
+
+    def ranges():
+        for start in range(0, page_count, pages_per_request):
+            end = min(start + pages_per_request, page_count)
+            writer = PdfWriter()
+            for page_number in range(start, end):
+                writer.add_page(reader.pages[page_number])
+            buffer = io.BytesIO()
+            writer.write(buffer)
+            yield start + 1, end, buffer.getvalue()
+
+    return page_count, ranges()
+
+
+def page_range_prompt(first_page, last_page):
+    """
+    :return: Extraction prompt that asks for a marker line before each page's text.
+    """
+    if first_page == last_page:
+        return SINGLE_PAGE_PROMPT
+    return (
+        f"This PDF contains pages {first_page} to {last_page} of a book. Extract all the content from every page. "
+        f"Before the content of each page write a line of the form '=== PAGE n ===', numbering pages "
+        f"from {first_page} to {last_page}."
+    )
+
+
+def split_page_range_text(text, first_page, last_page):
+    """
+    Split the response for a page range back into per-page text using the page markers.
+
+    :return: Dict of page number -> text, or None if the markers are missing or incomplete.
+    """
+    if first_page == last_page:
+        return {first_page: text}
+
+    markers = list(PAGE_MARKER.finditer(text))
+    pages = {}
+    for i, marker in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(text)
+        pages[int(marker.group(1))] = text[marker.end():end].strip()
+
+    if set(pages) != set(range(first_page, last_page + 1)):
+        return None
+    return pages
+
+
+class IngestCheckpoint:
+    """
+    Per-book progress record so an interrupted ingestion resumes where it stopped.
+
+    The checkpoint is tied to the SHA-256 of the PDF; a changed file starts from scratch.
+    It is only written after the index has been saved, so every page it lists is durable.
+    """
+
+    def __init__(self, path, pdf_sha256):
+        self.path = path
+        self.pdf_sha256 = pdf_sha256
+        self.pages_done = set()
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("pdf_sha256") == pdf_sha256:
+                self.pages_done = set(data.get("pages_done", []))
+        except (OSError, ValueError):
+            pass
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"pdf_sha256": self.pdf_sha256, "pages_done": sorted(self.pages_done)}, f)
+        os.replace(tmp_path, self.path)
+
+
+def file_sha256(path, chunk_bytes=1 << 20):
+    """
+    :return: Hex SHA-256 of a file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_bytes), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+async def ingest_pdf_async(pdf_path, manager, book=None, api_key=GEMINI_API_KEY, pages_per_request=1, max_concurrency=4,
+                           max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS, checkpoint_every=5, checkpoint_path=None, chapter_map=None,
+                           carry_tokens=CHUNK_PAGE_CARRY_TOKENS, rate_limiter=None):
+    """
+    Ingest a PDF page range by page range: extract concurrently, then stream each finished
+    range through chunking, embedding and index append, checkpointing as it goes.
+
+    Ranges are split out of the PDF only as earlier ones finish, with at most
+    2 * max_concurrency of them in flight, so memory stays bounded whatever the book size.
+    Pages are indexed in order, and each page is chunked together with the unfinished
+    paragraph at the end of the page before it, so text running over a page break is not cut.
+
+    :param pdf_path: Path to the PDF file.
+    :param manager: IndexManager that receives the vectors.
+    :param book: Book name stored in the metadata (defaults to the file name).
+    :param api_key: Your Gemini API key.
+    :param pages_per_request: Pages sent to Gemini per extraction request.
+    :param max_concurrency: Maximum page ranges being extracted at once.
+    :param max_tokens: Token budget per chunk, see chunker.iter_chunks.
+    :param overlap_tokens: Tokens of trailing sentences repeated in the next chunk.
+    :param checkpoint_every: Save the index and checkpoint after this many completed pages.
+    :param checkpoint_path: Checkpoint file (defaults to `<index>.<book>.checkpoint.json`).
+    :param chapter_map: Optional ChapterMap; each page's chunks are stored with the chapter and
+                        section its ranges give for this book and page.
+    :param carry_tokens: Most tokens of the previous page carried into a page's first chunk (0 to disable).
+    :param rate_limiter: TokenBucket pacing the embedding requests (defaults to the shared limiter).
+    :return: Dict with pages, pages_skipped, pages_failed, chunks, chunks_failed, chunk_fill
+             (average share of the token budget used per chunk) and seconds.
+    """
+    started = time.perf_counter()
+    book = book or os.path.splitext(os.path.basename(pdf_path))[0]
+    checkpoint_path = checkpoint_path or f"{manager.faiss_index_path}.{book}.checkpoint.json"
+    checkpoint = IngestCheckpoint(checkpoint_path, file_sha256(pdf_path))
+
+    # Kept open while ingesting: pages are read from the file as their ranges are split out
+    pdf_file = open(pdf_path, "rb")
+    try:
+        page_count, ranges = split_pdf_pages(pdf_file, pages_per_request)
+    except Exception:
+        pdf_file.close()
+        raise
+    stats = {"pages": page_count, "pages_skipped": 0, "pages_failed": [], "chunks": 0, "chunks_failed": 0}
+    semaphore = asyncio.Semaphore(max_concurrency)
+    chunk_stats = ChunkStats(max_tokens)
+
+    async def extract_range(first_page, last_page, range_bytes):
+        async with semaphore:
+            text = await extract_text_from_pdf_bytes_async(range_bytes, page_range_prompt(first_page, last_page))
+        if text is None:
+            return first_page, last_page, None
+        pages = split_page_range_text(text, first_page, last_page)
+        if pages is None:
+            # The model ignored the page markers; fall back to one request per page
+            _, single_pages = split_pdf_pages(range_bytes, 1)
+            pages = {}
+            for offset, (_, _, page_bytes) in enumerate(single_pages):
+                async with semaphore:
+                    pages[first_page + offset] = await extract_text_from_pdf_bytes_async(page_bytes, SINGLE_PAGE_PROMPT)
+        return first_page, last_page, pages
+
+    async def index_page(page, text, previous_text):
+        # The previous page's unfinished paragraph is repeated in front of this page; chunks
+        # that start in it keep the previous page's number and offset
+        carried = trailing_text(previous_text, min(carry_tokens, max_tokens // 2)) if previous_text and carry_tokens else ""
+        prefix = f"{carried}\n" if carried else ""
+        chunks = list(iter_chunks(prefix + text, max_tokens, overlap_tokens, stats=chunk_stats))
+        embeddings, chunk_ids, failed_ids = await generate_embeddings_for_chunks_async(
+            [chunk.text for chunk in chunks], api_key, rate_limiter=rate_limiter
+        )
+        stats["chunks_failed"] += len(failed_ids)
+        if failed_ids:
+            # Keep the page's previously indexed vectors; the page is retried on the next run
+            return False
+        chapter, section = chapter_map(page, book) if chapter_map is not None else (None, None)
+        pages, offsets = [], []
+        for i in chunk_ids:
+            if chunks[i].offset < len(carried):
+                pages.append(page - 1)
+                offsets.append(len(previous_text) - len(carried) + chunks[i].offset)
+            else:
+                pages.append(page)
+                offsets.append(chunks[i].offset - len(prefix))
+        # One document per page, so re-ingesting a page replaces only that page's vectors
+        manager.update_document(
+            f"{book}#page={page}",
+            [chunks[i].text for i in chunk_ids],
+            embeddings,
+            book=book,
+            chapter=chapter,
+            section=section,
+            offsets=offsets,
+            pages=pages,
+        )
+        stats["chunks"] += len(chunk_ids)
+        return True
+
+    # Extraction tasks in page order; refilled as the oldest one is indexed
+    in_flight = collections.deque()
+    max_in_flight = 2 * max_concurrency
+
+    def schedule():
+        # Resumes the ranges generator, so each range is split out of the PDF only when there is room
+        while len(in_flight) < max_in_flight:
+            for first_page, last_page, range_bytes in ranges:
+                if all(page in checkpoint.pages_done for page in range(first_page, last_page + 1)):
+                    stats["pages_skipped"] += last_page - first_page + 1
+                    continue
+                in_flight.append(asyncio.ensure_future(extract_range(first_page, last_page, range_bytes)))
+                break
+            else:
+                return
+
+    unsaved = 0
+    previous = (None, None)  # (page, text) of the last page extracted, for the carry-over
+    try:
+        schedule()
+        while in_flight:
+            # Later ranges keep extracting while the oldest one is awaited and indexed
+            first_page, last_page, pages = await in_flight.popleft()
+            schedule()
+            for page in range(first_page, last_page + 1):
+                text = pages.get(page) if pages else None
+                previous_text = previous[1] if previous[0] == page - 1 else None
+                previous = (page, text)
+                # Pages that fail are left out of the checkpoint so the next run retries them
+                if text is None or not await index_page(page, text, previous_text):
+                    stats["pages_failed"].append(page)
+                    continue
+                checkpoint.pages_done.add(page)
+                unsaved += 1
+
+            print(f"Ingested pages {first_page}-{last_page} of {page_count} ({len(checkpoint.pages_done)} done)")
+            if unsaved >= checkpoint_every:
+                manager.save()
+                checkpoint.save()
+                unsaved = 0
+    finally:
+        for task in in_flight:
+            task.cancel()
+        pdf_file.close()
+
+    manager.save()
+    checkpoint.save()
+    stats["pages_failed"].sort()
+    stats["chunk_fill"] = chunk_stats.average_fill
+    stats["seconds"] = time.perf_counter() - started
+    return stats
+
+
+def ingest_pdf(pdf_path, manager, **kwargs):
+    """
+    Synchronous wrapper for ingest_pdf_async.
+
+    :return: Ingestion stats, see ingest_pdf_async.
+    """
+    return get_client(kwargs.get("api_key", GEMINI_API_KEY)).run(ingest_pdf_async(pdf_path, manager, **kwargs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest a PDF book page by page into the FAISS index.")
+    parser.add_argument("pdf_path", help="Path to the PDF file")
+    parser.add_argument("--book", help="Book name stored in the chunk metadata (default: file name)")
+    parser.add_argument("--index", default="data/processed/faiss_index", help="FAISS index path")
+    parser.add_argument("--shard", help="Ingest into this shard of the sharded index instead of --index")
+    parser.add_argument("--subject", help="Subject tag recorded for the shard")
+    parser.add_argument("--grade", help="Grade/class tag recorded for the shard")
+    parser.add_argument("--pages-per-request", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-tokens", type=int, default=CHUNK_MAX_TOKENS, help="Token budget per chunk")
+    parser.add_argument("--overlap-tokens", type=int, default=CHUNK_OVERLAP_TOKENS, help="Overlap between chunks")
+    parser.add_argument("--chapter-map", help="JSON or CSV of page ranges -> chapter, section (see chapter_map.py; "
+                                              "default: CHAPTER_MAP_PATH if it exists)")
+    args = parser.parse_args()
+
+    chapter_map = load_chapter_map(args.chapter_map) if args.chapter_map else get_chapter_map()
+    if chapter_map is None:
+        print("⚠️ No chapter map: chunks are stored without chapter/section")
+    options = {"book": args.book, "pages_per_request": args.pages_per_request, "max_concurrency": args.concurrency,
+               "max_tokens": args.max_tokens, "overlap_tokens": args.overlap_tokens, "chapter_map": chapter_map}
+    if args.shard:
+        # Other processes can ingest other shards at the same time; the same shard waits for the lock
+        with ShardedIndex().writer(args.shard, book=args.book, subject=args.subject, grade=args.grade) as manager:
+            result = ingest_pdf(args.pdf_path, manager, **options)
+    else:
+        result = ingest_pdf(args.pdf_path, IndexManager(args.index), **options)
+    print(f"✅ Ingestion finished: {result}")
@@ -0,0 +1,254 @@
+# lexical_search.py
+import math
+import re
+import threading
+from collections import Counter
+
+from .video_metadata import normalize_key, CHAPTER_COLUMN, SECTION_COLUMN
+
+# Dotted numbers ("2.1") stay one token; Bangla vowel signs are not \w, so the block is listed explicitly
+_TOKEN = re.compile(r"\d+(?:\.\d+)*|(?:[^\W\d_]|[\u0980-\u09FF])+")
+
+# Ways students write the two sheet column names, each mapped to one canonical token
+_FIELD_WORDS = {
+    "chapter": ("chapter", "chap", "ch", "adhyay", "odhyay", CHAPTER_COLUMN),
+    "exercise": ("exercise", "ex", "anushiloni", "onushiloni", SECTION_COLUMN, "অনুশীলন"),
+}
+_CANONICAL_FIELDS = {normalize_key(word): field for field, words in _FIELD_WORDS.items() for word in words}
+
+
+def tokenize(text):
+    """
+    Split text into lexical tokens after normalize_key (Bangla digits become ASCII).
+
+    Chapter and exercise words are mapped to the tokens "chapter" and "exercise", and a
+    number right after one is also emitted qualified, so "অধ্যায় ২" yields
+    ["chapter", "2", "chapter:2"] and cannot be confused with a problem numbered 2.
+
+    :param text: Query, chunk text or sheet label.
+    :return: List of tokens.
+    """
+    tokens = []
+    field = None
+    for token in _TOKEN.findall(normalize_key(text)):
+        canonical = _CANONICAL_FIELDS.get(token)
+        if canonical is not None:
+            tokens.append(canonical)
+            field = canonical
+            continue
+        tokens.append(token)
+        if field is not None and token[0].isdigit():
+            tokens.append(f"{field}:{token}")
+        field = None
+    return tokens
+
+
+class BM25Index:
+    """
+    Okapi BM25 over an in-memory inverted index (term -> postings of (doc, term frequency)).
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        """
+        :param documents: List of token lists; a document's ID is its position.
+        :param k1: Term frequency saturation.
+        :param b: Document length normalization.
+        """
+        self.k1 = k1
+        self.doc_count = len(documents)
+        lengths = [len(tokens) for tokens in documents]
+        average_length = sum(lengths) / self.doc_count if self.doc_count else 1.0
+        self._length_norm = [k1 * (1.0 - b + b * length / (average_length or 1.0)) for length in lengths]
+
+        self.postings = {}
+        for doc_id, tokens in enumerate(documents):
+            for term, frequency in Counter(tokens).items():
+                self.postings.setdefault(term, []).append((doc_id, frequency))
+        self.idf = {term: self._idf(len(postings)) for term, postings in self.postings.items()}
+
+    def _idf(self, document_frequency):
+        return math.log(1.0 + (self.doc_count - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def score(self, tokens):
+        """
+        :param tokens: Query tokens.
+        :return: Dict of doc ID -> BM25 score for every document sharing a term with the query.
+        """
+        scores = {}
+        for term in set(tokens):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            weight = self.idf[term] * (self.k1 + 1.0)
+            for doc_id, frequency in postings:
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight * frequency / (frequency + self._length_norm[doc_id])
+        return scores
+
+    def max_score(self, tokens):
+        """
+        Score a document of average length containing every query term once would get.
+        Terms missing from the index count with the IDF of a term no document has, so
+        queries that are mostly unknown words get a low coverage.
+
+        :param tokens: Query tokens.
+        :return: Upper reference score for coverage.
+        """
+        unseen = self._idf(0)
+        return sum(self.idf.get(term, unseen) for term in set(tokens))
+
+
+def _problem_numbers(tokens):
+    # Plain numbers not qualified by a preceding chapter/exercise word, e.g. the "1" in "2.1 er 1. (ক)"
+    return {
+        token for i, token in enumerate(tokens)
+        if token.isdigit() and not (i + 1 < len(tokens) and tokens[i + 1].endswith(f":{token}"))
+    }
+
+
+def _ranked(scores):
+    return [doc_id for doc_id, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0]))]
+
+
+class LexicalIndex:
+    """
+    BM25 indexes over the video sheet's chapter/section labels and over the text of the
+    stored chunks, both resolving to rows of the sheet.
+
+    The sheet index is tiny, so `match` (the fast path) answers in microseconds; the chunk
+    index only takes part in hybrid ranking.
+    """
+
+    def __init__(self, video_metadata, chunks=()):
+        """
+        :param video_metadata: VideoMetadata whose rows are the possible answers.
+        :param chunks: Iterable of (vector_id, text, chapter, section), e.g. IndexManager.iter_chunks().
+        """
+        self.video_metadata = video_metadata
+        sheet_tokens = [
+            tokenize(f"{CHAPTER_COLUMN} {chapter or ''} {SECTION_COLUMN} {section or ''}")
+            for chapter, section, _ in video_metadata.rows
+        ]
+        self.sheet = BM25Index(sheet_tokens)
+        self.row_tokens = [set(tokens) for tokens in sheet_tokens]
+
+        # Exercise number ("2.1") and problem number ("1") each row's section names, if any
+        self.row_problems = []
+        for _, section, _ in video_metadata.rows:
+            section_tokens = tokenize(section or "")
+            exercise = next((token for token in section_tokens if "." in token and token[0].isdigit()), None)
+            problem = next((token for token in section_tokens if token.isdigit()), None)
+            self.row_problems.append((exercise, problem))
+
+        chunk_tokens = []
+        self.chunk_rows = []
+        for _, text, chapter, section in chunks:
+            row_index = video_metadata.find_index(chapter, section)
+            if row_index is not None:
+                chunk_tokens.append(tokenize(text or ""))
+                self.chunk_rows.append(row_index)
+        self.chunks = BM25Index(chunk_tokens)
+
+    def match(self, query, min_coverage, min_margin):
+        """
+        Fast path: answer queries that name one sheet row's exercise and problem explicitly.
+
+        The best sheet row must cover `min_coverage` of the query's BM25 weight and beat
+        every other row by `min_margin` (relative). The query must contain the row's exercise
+        number and problem number, and no term the sheet knows from other rows only, nor a
+        chapter or exercise number the row does not have. Anything less specific ("Chapter 2",
+        "2.1") or contradictory ("chapter 4 3.2") returns None and goes to the vector path.
+
+        :param query: Query text.
+        :param min_coverage: Minimum share of the query's weight matched, 0..1.
+        :param min_margin: Minimum relative lead over rows of other chapters, 0..1.
+        :return: Tuple (row_index, coverage), or None if the match is not confident.
+        """
+        tokens = tokenize(query)
+        scores = self.sheet.score(tokens)
+        if not scores:
+            return None
+
+        ranked = _ranked(scores)
+        row_index = ranked[0]
+        best = scores[row_index]
+        coverage = min(1.0, best / self.sheet.max_score(tokens))
+        if coverage < min_coverage:
+            return None
+        if len(ranked) > 1 and scores[ranked[1]] > best * (1.0 - min_margin):
+            return None
+
+        # Terms of other rows, or a qualified chapter/exercise number the row lacks, contradict it
+        row_tokens = self.row_tokens[row_index]
+        if any(token not in row_tokens and (token in self.sheet.idf or ":" in token) for token in tokens):
+            return None
+
+        exercise, problem = self.row_problems[row_index]
+        if exercise is not None and exercise not in tokens:
+            return None
+        if problem is not None and problem not in _problem_numbers(tokens):
+            return None
+        return row_index, coverage
+
+    def rankings(self, query, limit=20):
+        """
+        Lexical rankings for hybrid fusion.
+
+        :param query: Query text.
+        :param limit: Maximum rows per ranking.
+        :return: Tuple (sheet_rows, chunk_rows) of sheet row indices, best first.
+        """
+        tokens = tokenize(query)
+        sheet_rows = _ranked(self.sheet.score(tokens))[:limit]
+
+        chunk_rows = []
+        for chunk_id in _ranked(self.chunks.score(tokens)):
+            row_index = self.chunk_rows[chunk_id]
+            if row_index not in chunk_rows:
+                chunk_rows.append(row_index)
+                if len(chunk_rows) == limit:
+                    break
+        return sheet_rows, chunk_rows
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse several rankings of the same items: score(item) = sum of 1 / (k + rank).
+
+    :param rankings: Iterable of lists, each best first.
+    :param k: Damping constant; 60 is the usual choice.
+    :return: Dict of item -> fused score.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (k + rank)
+    return fused
+
+
+_cached_index = None
+# (video_metadata, index_manager, vector_count) the cached index was built from. The objects
+# themselves are kept, not their id(): a reloaded sheet or index could otherwise be allocated
+# at a freed object's address and be mistaken for it
+_cached_sources = None
+_cache_lock = threading.Lock()
+
+
+def get_lexical_index(video_metadata, index_manager=None):
+    """
+    Return a LexicalIndex for the current sheet and chunk store, rebuilt only when either
+    was reloaded or chunks were added.
+
+    :param video_metadata: VideoMetadata from get_video_metadata.
+    :param index_manager: IndexManager from get_index_manager, or None for sheet-only matching.
+    :return: LexicalIndex.
+    """
+    global _cached_index, _cached_sources
+    vector_count = index_manager.index.ntotal if index_manager is not None and index_manager.index is not None else 0
+    with _cache_lock:
+        if _cached_sources is None or not (
+            _cached_sources[0] is video_metadata and _cached_sources[1] is index_manager and _cached_sources[2] == vector_count
+        ):
+            chunks = index_manager.iter_chunks() if index_manager is not None else ()
+            _cached_index = LexicalIndex(video_metadata, chunks)
+            _cached_sources = (video_metadata, index_manager, vector_count)
+        return _cached_index
@@ -0,0 +1,216 @@
+# metrics.py
+import json
+import os
+import sys
+import threading
+import time
+
+# Settings are read from the environment directly because metrics are shared by
+# app/models and app/Text_Extraction, which each have their own config.py.
+METRICS_ENABLED = os.getenv("ASKMATH_METRICS", "0") == "1"
+# Path for structured JSON span logs ("-" for stderr, empty to disable)
+METRICS_JSON_LOG = os.getenv("ASKMATH_METRICS_JSON_LOG", "")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7, 2.5e7, 1e8)
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    def __init__(self, metrics, stage, labels):
+        self.metrics = metrics
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.started
+        labels = dict(self.labels, stage=self.stage)
+        self.metrics.observe("askmath_stage_seconds", duration, **labels)
+        if exc_type is not None:
+            self.metrics.increment("askmath_stage_errors_total", **labels)
+        self.metrics.log_event("span", duration_ms=round(duration * 1000.0, 3), error=exc_type is not None, **labels)
+        return False
+
+
+class Metrics:
+    """
+    Lightweight in-process metrics: stage timers, histograms and counters, exportable in
+    Prometheus text format and as structured JSON span logs.
+
+    When disabled every call returns immediately and `span` hands back a shared no-op
+    context manager, so instrumented code pays only an attribute check.
+    """
+
+    def __init__(self, enabled=METRICS_ENABLED, json_log=METRICS_JSON_LOG):
+        """
+        :param enabled: Record metrics.
+        :param json_log: Path for JSON span logs, "-" for stderr, or "" to disable.
+        """
+        self.enabled = enabled
+        self.json_log = json_log
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def span(self, stage, **labels):
+        """
+        Time a pipeline stage: `with metrics.span("faiss_search"): ...`.
+
+        :param stage: Stage name, exported as the `stage` label.
+        :param labels: Extra labels.
+        :return: Context manager.
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, stage, labels)
+
+    def observe(self, name, value, **labels):
+        """
+        Record a value in a histogram. Names ending in `_bytes` use size buckets.
+
+        :param name: Metric name.
+        :param value: Observed value (seconds or bytes).
+        :param labels: Metric labels.
+        """
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = _Histogram(SIZE_BUCKETS if name.endswith("_bytes") else LATENCY_BUCKETS)
+                self._histograms[key] = histogram
+            histogram.observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        """
+        Add to a counter.
+
+        :param name: Metric name (conventionally ending in `_total`).
+        :param amount: Amount to add.
+        :param labels: Metric labels.
+        """
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def log_event(self, event, **fields):
+        """
+        Write one structured JSON log line if JSON logging is configured.
+
+        :param event: Event type, e.g. "span".
+        :param fields: Extra fields.
+        """
+        if not (self.enabled and self.json_log):
+            return
+        line = json.dumps(dict(fields, event=event, ts=time.time()), ensure_ascii=False)
+        with self._lock:
+            if self.json_log == "-":
+                print(line, file=sys.stderr)
+            else:
+                with open(self.json_log, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+
+    def snapshot(self):
+        """
+        :return: JSON-serializable dict of all counters and histograms.
+        """
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+                "histograms": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": histogram.total,
+                        "sum": histogram.sum,
+                        "buckets": dict(zip(map(str, histogram.buckets), histogram.counts)),
+                    }
+                    for (name, labels), histogram in sorted(self._histograms.items())
+                ],
+            }
+
+    def export_prometheus(self):
+        """
+        :return: All metrics in the Prometheus text exposition format.
+        """
+        def label_value(value):
+            # Backslash first, so the escapes added for quotes and newlines are not doubled
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{label_value(v)}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            seen = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} counter")
+                    seen.add(name)
+                lines.append(f"{name}{label_text(labels)} {value}")
+
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} histogram")
+                    seen.add(name)
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{label_text(labels, [('le', repr(float(bound)))])} {cumulative}")
+                lines.append(f"{name}_bucket{label_text(labels, [('le', '+Inf')])} {histogram.total}")
+                lines.append(f"{name}_sum{label_text(labels)} {histogram.sum}")
+                lines.append(f"{name}_count{label_text(labels)} {histogram.total}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Drop all recorded values."""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+# Process-wide registry used by all instrumented modules
+metrics = Metrics()
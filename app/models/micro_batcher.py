@@ -0,0 +1,134 @@
+# micro_batcher.py
+import asyncio
+
+from .metrics import metrics
+
+
+class QueueFullError(Exception):
+    """Raised by MicroBatcher.submit when the queue is at its limit; callers should shed load."""
+
+
+class MicroBatcher:
+    """
+    Collect items submitted by concurrent coroutines and process them in batches.
+
+    A batch is dispatched when it reaches `max_batch_size` items or `max_wait` seconds after
+    its first item arrived, whichever comes first, so a lone request waits at most one window
+    while a burst of requests shares one call. At most `max_queue` items may be waiting or
+    being processed; beyond that `submit` raises QueueFullError instead of queueing, which
+    keeps latency bounded under overload. Must be used from a single event loop.
+    """
+
+    def __init__(self, name, process_batch, max_batch_size=64, max_wait=0.01, max_queue=256, max_concurrent_batches=4):
+        """
+        :param name: Label used in the `askmath_batcher_*_total` metrics.
+        :param process_batch: Async function taking a list of items and returning a list with
+                              one result per item, in the same order.
+        :param max_batch_size: Largest number of items per batch.
+        :param max_wait: Seconds to wait for more items after the first one of a batch.
+        :param max_queue: Maximum number of items waiting or being processed.
+        :param max_concurrent_batches: Batches processed at the same time; later ones wait.
+        """
+        self.name = name
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self.largest_batch = 0
+        self._queued = 0
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+        self._semaphore = asyncio.Semaphore(max_concurrent_batches)
+
+    @property
+    def depth(self):
+        """Number of items waiting or being processed."""
+        return self._queued
+
+    async def submit(self, item):
+        """
+        Add one item to the next batch and wait for its result.
+
+        :param item: Item passed to process_batch.
+        :return: The item's result from process_batch.
+        :raises QueueFullError: If max_queue items are already queued.
+        """
+        if self._queued >= self.max_queue:
+            self.rejected += 1
+            metrics.increment("askmath_batcher_rejected_total", batcher=self.name)
+            raise QueueFullError(f"{self.name} queue is full ({self.max_queue} items)")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        self._queued += 1
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._dispatch)
+        return await future
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        try:
+            async with self._semaphore:
+                # Callers that gave up (client disconnected) are left out of the batch
+                live = [(item, future) for item, future in batch if not future.done()]
+                if not live:
+                    return
+                self.batches += 1
+                self.items += len(live)
+                self.largest_batch = max(self.largest_batch, len(live))
+                metrics.increment("askmath_batcher_batches_total", batcher=self.name)
+                metrics.increment("askmath_batcher_items_total", len(live), batcher=self.name)
+                try:
+                    results = await self.process_batch([item for item, _ in live])
+                except Exception as e:
+                    for _, future in live:
+                        if not future.done():
+                            future.set_exception(e)
+                    return
+                for (_, future), result in zip(live, results):
+                    if not future.done():
+                        future.set_result(result)
+                # A short result list must not leave the remaining callers waiting forever
+                if len(results) != len(live):
+                    error = RuntimeError(f"{self.name} batch returned {len(results)} results for {len(live)} items")
+                    for _, future in live[len(results):]:
+                        if not future.done():
+                            future.set_exception(error)
+        finally:
+            self._queued -= len(batch)
+
+    def stats(self):
+        """
+        :return: Dict with the queue depth, batches sent, items batched, average and largest batch size.
+        """
+        return {
+            "depth": self._queued,
+            "max_queue": self.max_queue,
+            "batches": self.batches,
+            "items": self.items,
+            "rejected": self.rejected,
+            "average_batch_size": self.items / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+        }
+
+    async def close(self):
+        """Dispatch anything still pending and wait for all batches to finish."""
+        self._dispatch()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,233 @@
+# ocr_cache.py
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+
+from .metrics import metrics
+
+# Settings are read from the environment directly because this cache is shared by
+# app/models and app/Text_Extraction, which each have their own config.py.
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "data/cache/ocr.sqlite")
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "50000"))
+OCR_CACHE_PERCEPTUAL = os.getenv("OCR_CACHE_PERCEPTUAL", "0") == "1"
+# A dHash sees a mostly white worksheet as a few dark blocks, so different pages of the same
+# layout can be only a few bits apart; near matches must also have the same shape
+OCR_CACHE_MAX_DISTANCE = int(os.getenv("OCR_CACHE_MAX_DISTANCE", "2"))
+OCR_CACHE_MAX_ASPECT_DIFF = float(os.getenv("OCR_CACHE_MAX_ASPECT_DIFF", "0.02"))
+
+
+def perceptual_hash(image_bytes):
+    """
+    64-bit difference hash (dHash) of an image, stable across re-encoding and small
+    changes in exposure or framing.
+
+    Requires Pillow; returns None if it is not installed or the bytes cannot be decoded,
+    in which case only exact-content lookups are possible.
+
+    :param image_bytes: Raw image file bytes.
+    :return: Hash as a signed 64-bit integer (fits an SQLite INTEGER), or None.
+    """
+    return perceptual_signature(image_bytes)[0]
+
+
+def perceptual_signature(image_bytes):
+    """
+    Perceptual hash of an image together with its pixel size.
+
+    :param image_bytes: Raw image file bytes.
+    :return: Tuple (hash, width, height); all None if Pillow is missing or the bytes cannot be decoded.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None, None, None
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            width, height = image.size
+            pixels = list(image.convert("L").resize((9, 8)).getdata())
+    except Exception:
+        return None, None, None
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return (value - (1 << 64) if value >= (1 << 63) else value), width, height
+
+
+def _same_shape(width, height, other_width, other_height, max_aspect_diff):
+    """True if two images have aspect ratios within `max_aspect_diff` (relative) of each other."""
+    if not (width and height and other_width and other_height):
+        return False
+    aspect, other_aspect = width / height, other_width / other_height
+    return abs(aspect - other_aspect) <= max_aspect_diff * max(aspect, other_aspect)
+
+
+class OCRCache:
+    """
+    Persistent OCR result cache backed by SQLite.
+
+    Entries are keyed by the SHA-256 of the image bytes together with the model ID and the
+    exact prompt text, so editing the prompt or switching models invalidates old results.
+    With `perceptual=True`, a miss on the exact key falls back to the closest stored
+    perceptual hash within `max_distance` bits whose image has the same aspect ratio, so
+    re-encodings and rescans of the same page also hit.
+    """
+
+    def __init__(self, path, max_entries=50000, perceptual=False, max_distance=2, max_aspect_diff=0.02):
+        """
+        :param path: Path of the SQLite database file (created on first use).
+        :param max_entries: Maximum number of results kept before LRU eviction.
+        :param perceptual: Enable near-duplicate matching by perceptual hash.
+        :param max_distance: Maximum Hamming distance between hashes for a near match.
+        :param max_aspect_diff: Maximum relative difference between aspect ratios for a near match.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.perceptual = perceptual
+        self.max_distance = max_distance
+        self.max_aspect_diff = max_aspect_diff
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_results ("
+                "key TEXT PRIMARY KEY, prompt_key TEXT NOT NULL, phash INTEGER, text TEXT NOT NULL, last_used REAL NOT NULL, "
+                "width INTEGER, height INTEGER)"
+            )
+            # Caches written before near matches checked the image shape have no size columns
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(ocr_results)")}
+            for column in ("width", "height"):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE ocr_results ADD COLUMN {column} INTEGER")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ocr_results_prompt ON ocr_results(prompt_key)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ocr_results_last_used ON ocr_results(last_used)")
+        return self._conn
+
+    @staticmethod
+    def _keys(image_bytes, model_id, prompt):
+        prompt_key = hashlib.sha256(f"{model_id}\x00{prompt}".encode("utf-8")).hexdigest()
+        key = hashlib.sha256(prompt_key.encode("ascii") + hashlib.sha256(image_bytes).digest()).hexdigest()
+        return key, prompt_key
+
+    def get(self, image_bytes, model_id, prompt):
+        """
+        Look up the OCR result for an image.
+
+        :param image_bytes: Raw image file bytes.
+        :param model_id: Gemini model used for extraction.
+        :param prompt: Exact prompt text sent with the image.
+        :return: Cached extracted text, or None on a miss.
+        """
+        key, prompt_key = self._keys(image_bytes, model_id, prompt)
+        phash, width, height = perceptual_signature(image_bytes) if self.perceptual else (None, None, None)
+
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT text FROM ocr_results WHERE key = ?", (key,)).fetchone()
+            result = "hit"
+            if row is not None:
+                self.hits += 1
+            elif phash is not None:
+                best = None
+                for candidate_key, candidate_hash, candidate_width, candidate_height, text in conn.execute(
+                    "SELECT key, phash, width, height, text FROM ocr_results WHERE prompt_key = ? AND phash IS NOT NULL",
+                    (prompt_key,),
+                ):
+                    distance = ((candidate_hash ^ phash) & 0xFFFFFFFFFFFFFFFF).bit_count()
+                    if distance > self.max_distance or (best is not None and distance >= best[0]):
+                        continue
+                    if _same_shape(width, height, candidate_width, candidate_height, self.max_aspect_diff):
+                        best = (distance, candidate_key, text)
+                if best is not None:
+                    key, row = best[1], (best[2],)
+                    result = "near_hit"
+                    self.near_hits += 1
+
+            if row is None:
+                self.misses += 1
+                metrics.increment("askmath_cache_requests_total", cache="ocr", result="miss")
+                return None
+
+            metrics.increment("askmath_cache_requests_total", cache="ocr", result=result)
+
+            conn.execute("UPDATE ocr_results SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            return row[0]
+
+    def put(self, image_bytes, model_id, prompt, text):
+        """
+        Store the OCR result for an image and evict the least recently used entries if over the bound.
+
+        :param image_bytes: Raw image file bytes.
+        :param model_id: Gemini model used for extraction.
+        :param prompt: Exact prompt text sent with the image.
+        :param text: Extracted text.
+        """
+        key, prompt_key = self._keys(image_bytes, model_id, prompt)
+        phash, width, height = perceptual_signature(image_bytes) if self.perceptual else (None, None, None)
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO ocr_results (key, prompt_key, phash, text, last_used, width, height) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, prompt_key, phash, text, time.time(), width, height),
+            )
+            overflow = conn.execute("SELECT COUNT(*) FROM ocr_results").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM ocr_results WHERE key IN "
+                    "(SELECT key FROM ocr_results ORDER BY last_used ASC LIMIT ?)", (overflow,)
+                )
+            conn.commit()
+
+    def stats(self):
+        """
+        :return: Dict with hits, near_hits, misses, hit_rate and the number of stored entries.
+        """
+        with self._lock:
+            entries = self._connection().execute("SELECT COUNT(*) FROM ocr_results").fetchone()[0]
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+                "entries": entries,
+            }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_ocr_cache():
+    """
+    Return the process-wide OCR cache configured from the environment.
+
+    :return: Shared OCRCache, or None if OCR_CACHE_PATH is set to an empty string.
+    """
+    global _default_cache
+    if not OCR_CACHE_PATH:
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = OCRCache(
+                OCR_CACHE_PATH, OCR_CACHE_MAX_ENTRIES, OCR_CACHE_PERCEPTUAL, OCR_CACHE_MAX_DISTANCE, OCR_CACHE_MAX_ASPECT_DIFF
+            )
+        return _default_cache
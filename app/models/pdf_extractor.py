@@ -1,82 +1,87 @@
 # pdf_extractor.py
-import requests
 import os
-from config import GEMINI_API_KEY, GEMINI_MODEL_ID
-import base64
+from .config import GEMINI_API_KEY, GEMINI_MODEL_ID
+from .gemini_client import get_client, response_text, GeminiAPIError
 
-def extract_text_from_pdf(pdf_path):
+async def extract_text_from_pdf_bytes_async(pdf_bytes, prompt="Extract all the content from this PDF."):
     """
-    Extracts text content from the entire PDF file using the Gemini API.
-    
-    :param pdf_path: Path to the PDF file.
-    :return: Extracted text content from the PDF.
+    Send PDF bytes (a whole book or a page range split from it) to Gemini and return the text.
+
+    :param pdf_bytes: Raw PDF file content.
+    :param prompt: Instruction sent along with the PDF.
+    :return: Extracted text content, or None on failure.
     """
-    # Ensure the PDF path is absolute to avoid FileNotFoundError issues
-    absolute_pdf_path = os.path.abspath(pdf_path)
+    return await _extract_text_async(pdf_bytes, prompt)
 
-    if not os.path.exists(absolute_pdf_path):
-        print(f"Error: PDF file not found at '{absolute_pdf_path}'")
+async def _extract_text_async(source, prompt, display_name=None):
+    """
+    Send a PDF (file path or bytes) to Gemini and return the text.
+
+    The PDF is never base64-encoded as a whole: small files are encoded chunk by chunk while
+    the request is sent, and files over GEMINI_INLINE_MAX_BYTES are uploaded through the
+    Files API and referenced by URI (see GeminiClient.media_part).
+    """
+    if not GEMINI_API_KEY or not GEMINI_MODEL_ID:
+        print("Error: GEMINI_API_KEY or GEMINI_MODEL_ID is missing in the .env file!")
         return None
 
-    # Read the PDF file and encode it as base64
+    client = get_client(GEMINI_API_KEY)
     try:
-        with open(absolute_pdf_path, "rb") as pdf_file:
-            pdf_data_base64 = base64.b64encode(pdf_file.read()).decode('utf-8')
-    except Exception as e:
+        # Prepare the parts to send the PDF content
+        parts = [
+            {"text": prompt},
+            await client.media_part(source, "application/pdf", display_name),
+        ]
+
+        # Send the request to the Gemini API
+        data = await client.generate_content(f"models/{GEMINI_MODEL_ID}", parts)
+    except GeminiAPIError as e:
+        print(f"Error: {e}")
+        return None
+    except OSError as e:
         print(f"Error reading PDF file: {e}")
         return None
 
-    # Prepare the request URL for Gemini API
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL_ID}:generateContent?key={GEMINI_API_KEY}"
+    # Check if response contains the extracted content
+    extracted_text = response_text(data)
+    if extracted_text is None:
+        print(f"Error: Unexpected response structure from Gemini API: {data}")
+    return extracted_text
 
-    headers = {
-        "Content-Type": "application/json",
-    }
+async def extract_text_from_pdf_async(pdf_path, prompt="Extract all the content from this PDF."):
+    """
+    Async version of extract_text_from_pdf using the shared pooled client.
 
-    # Prepare payload to send the PDF content
-    payload = {
-        "contents": [
-            {
-                "parts": [
-                    {"text": "Extract all the content from this PDF."},
-                    {
-                        "inlineData": {
-                            "mimeType": "application/pdf",  # Set MIME type for PDF
-                            "data": pdf_data_base64
-                        }
-                    }
-                ]
-            }
-        ]
-    }
+    The file is streamed from disk rather than read into memory, so large scanned books do
+    not need several times their size in RAM.
 
-    # Send the request to the Gemini API
-    try:
-        response = requests.post(url, headers=headers, json=payload)
+    :param pdf_path: Path to the PDF file.
+    :param prompt: Instruction sent along with the PDF.
+    :return: Extracted text content from the PDF.
+    """
+    # Ensure the PDF path is absolute to avoid FileNotFoundError issues
+    absolute_pdf_path = os.path.abspath(pdf_path)
 
-        if response.status_code == 200:
-            data = response.json()
-            # Check if response contains the extracted content
-            if data and data.get('candidates') and data['candidates'][0].get('content') and data['candidates'][0]['content'].get('parts'):
-                extracted_text = data['candidates'][0]['content']['parts'][0].get('text', "")
-                return extracted_text
-            else:
-                print(f"Error: Unexpected response structure from Gemini API: {data}")
-                return None
-        else:
-            print(f"Error: {response.status_code} - {response.text}")
-            return None
-    except requests.exceptions.RequestException as e:
-        print(f"Network or API request error: {e}")
-        return None
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+    if not os.path.exists(absolute_pdf_path):
+        print(f"Error: PDF file not found at '{absolute_pdf_path}'")
         return None
 
+    return await _extract_text_async(absolute_pdf_path, prompt, os.path.basename(absolute_pdf_path))
+
+def extract_text_from_pdf(pdf_path):
+    """
+    Extracts text content from the entire PDF file using the Gemini API.
+    
+    :param pdf_path: Path to the PDF file.
+    :return: Extracted text content from the PDF.
+    """
+    return get_client(GEMINI_API_KEY).run(extract_text_from_pdf_async(pdf_path))
+
 # Example usage
-pdf_path = "data/book/MathBook.pdf"
-extracted_text = extract_text_from_pdf(pdf_path)
+if __name__ == "__main__":
+    pdf_path = "data/book/MathBook.pdf"
+    extracted_text = extract_text_from_pdf(pdf_path)
 
-if extracted_text:
-    print("\nExtracted PDF Content:")
-    print(extracted_text[:500])  # Print first 500 characters of the extracted content for preview
+    if extracted_text:
+        print("\nExtracted PDF Content:")
+        print(extracted_text[:500])  # Print first 500 characters of the extracted content for preview
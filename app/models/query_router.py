@@ -0,0 +1,121 @@
+# query_router.py
+from .chapter_map import chunk_chapter_section, get_chapter_map
+from .config import GEMINI_API_KEY, LEXICAL_MIN_COVERAGE, LEXICAL_MIN_MARGIN
+from .index_holder import get_index_manager
+from .lexical_search import get_lexical_index, reciprocal_rank_fusion
+from .metrics import metrics
+from .search import search_semantic_batch
+from .video_metadata import get_video_metadata
+
+
+def _result(query, path, video_metadata=None, row_index=None, score=None):
+    chapter, section, video = video_metadata.rows[row_index] if row_index is not None else (None, None, None)
+    return {"query": query, "path": path, "chapter": chapter, "section": section, "video": video, "score": score}
+
+
+def lexical_route(query, video_metadata, lexical_index):
+    """
+    Lexical fast path for one query.
+
+    :param query: Query string.
+    :param video_metadata: VideoMetadata from get_video_metadata.
+    :param lexical_index: LexicalIndex from get_lexical_index.
+    :return: Result dict (see route_queries) with path "lexical", or None if the query does
+             not name one sheet row unambiguously.
+    """
+    with metrics.span("lexical_search"):
+        match = lexical_index.match(query, LEXICAL_MIN_COVERAGE, LEXICAL_MIN_MARGIN)
+    return _result(query, "lexical", video_metadata, *match) if match is not None else None
+
+
+def fused_route(query, vector_ids, video_metadata, index_manager, lexical_index, chapter_map=None):
+    """
+    Resolve one query's vector hits to sheet rows and fuse them with its lexical rankings.
+
+    :param query: Query string.
+    :param vector_ids: Vector ids of the nearest chunks, best first (-1 for missing hits).
+    :param video_metadata: VideoMetadata from get_video_metadata.
+    :param index_manager: IndexManager the ids belong to.
+    :param lexical_index: LexicalIndex from get_lexical_index.
+    :param chapter_map: Optional ChapterMap for chunks ingested without a chapter.
+    :return: Result dict, see route_queries.
+    """
+    vector_rows = []
+    for vector_id in vector_ids:
+        match = index_manager.lookup(vector_id) if vector_id != -1 else None
+        chapter, section = chunk_chapter_section(match, chapter_map)
+        row_index = video_metadata.find_index(chapter, section) if chapter or section else None
+        if row_index is not None and row_index not in vector_rows:
+            vector_rows.append(row_index)
+
+    lexical_rankings = [ranking for ranking in lexical_index.rankings(query) if ranking]
+    if not vector_rows and not lexical_rankings:
+        return _result(query, "none")
+
+    fused = reciprocal_rank_fusion(lexical_rankings + ([vector_rows] if vector_rows else []))
+    best = min(fused, key=lambda row_index: (-fused[row_index], row_index))
+    if vector_rows and lexical_rankings:
+        path = "hybrid"
+    else:
+        path = "vector" if vector_rows else "lexical_fallback"
+    return _result(query, path, video_metadata, best, fused[best])
+
+
+def route_queries(queries, top_k=5, video_metadata_path="data/csv/Demo_Youtube_link.xlsx", api_key=GEMINI_API_KEY):
+    """
+    Answer text queries by the cheapest path that is confident.
+
+    1. lexical: the query names one sheet row's exercise and problem unambiguously;
+       answered locally, no Gemini call.
+    2. hybrid: the remaining queries are embedded in one batch and searched with one
+       vectorized FAISS call; vector hits and BM25 rankings (sheet labels and chunk text)
+       are combined with reciprocal rank fusion.
+    3. vector / lexical_fallback: only one of the two rankings had results.
+
+    :param queries: List of query strings.
+    :param top_k: Nearest chunks retrieved per query for fusion.
+    :param video_metadata_path: Path to the video spreadsheet.
+    :param api_key: Your Gemini API key.
+    :return: List with one dict per query: query, path ("lexical", "hybrid", "vector",
+             "lexical_fallback" or "none"), chapter, section, video and score.
+    """
+    video_metadata = get_video_metadata(video_metadata_path)
+    if video_metadata is None:
+        print(f"Error: Video metadata file not found at '{video_metadata_path}'")
+        return [_result(query, "none") for query in queries]
+
+    index_manager = get_index_manager()
+    lexical_index = get_lexical_index(video_metadata, index_manager)
+
+    # Step 1: Lexical fast path
+    results = [None] * len(queries)
+    pending = []
+    for i, query in enumerate(queries):
+        results[i] = lexical_route(query, video_metadata, lexical_index)
+        if results[i] is None:
+            pending.append(i)
+
+    # Step 2: One batched vector search for everything else
+    if pending:
+        if index_manager is not None and index_manager.index is not None and index_manager.index.ntotal:
+            _, indices = search_semantic_batch([queries[i] for i in pending], index_manager.index, top_k, api_key)
+        else:
+            indices = [[] for _ in pending]
+
+        # Step 3: Fuse the vector hits with the lexical rankings
+        chapter_map = get_chapter_map()
+        for i, row_ids in zip(pending, indices):
+            results[i] = fused_route(queries[i], row_ids, video_metadata, index_manager, lexical_index, chapter_map)
+
+    for result in results:
+        metrics.increment("askmath_search_path_total", path=result["path"])
+    return results
+
+
+def route_query(query, top_k=5, video_metadata_path="data/csv/Demo_Youtube_link.xlsx", api_key=GEMINI_API_KEY):
+    """
+    Single-query version of route_queries.
+
+    :return: Result dict, see route_queries.
+    """
+    return route_queries([query], top_k, video_metadata_path, api_key)[0]
@@ -0,0 +1,71 @@
+# rate_limiter.py
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. Each API call
+    takes one token, so short bursts go out immediately and sustained traffic is held
+    to `rate` requests per second.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        :param rate: Number of tokens added per second.
+        :param capacity: Maximum number of tokens the bucket can hold (burst size).
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._last_refill = now
+
+    def try_acquire(self, tokens=1):
+        """
+        Take tokens without waiting.
+
+        :param tokens: Number of tokens to take.
+        :return: 0.0 if the tokens were taken, otherwise the number of seconds to wait.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        """
+        Block until the requested number of tokens is available, then take them.
+
+        :param tokens: Number of tokens to take.
+        """
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        """
+        Wait without blocking the event loop until the tokens are available, then take them.
+
+        :param tokens: Number of tokens to take.
+        """
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return
+            await asyncio.sleep(wait)
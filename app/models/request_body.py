@@ -0,0 +1,137 @@
+# request_body.py
+import base64
+import json
+import os
+import re
+import uuid
+
+# Raw bytes read per chunk; a multiple of 3, so every chunk base64-encodes without padding
+# and the encoded chunks can simply be concatenated
+STREAM_CHUNK_BYTES = 3 * 64 * 1024
+
+
+class InlinePart:
+    """
+    An `inlineData` request part whose base64 data is encoded while the request is sent.
+
+    The source is a file path, read chunk by chunk, or a bytes-like object such as a
+    preprocessed image or an mmap. Only one chunk is encoded at a time, so a 100 MB PDF costs
+    one chunk of memory instead of the file, its base64 string and the JSON body around it.
+    """
+
+    def __init__(self, source, mime_type):
+        """
+        :param source: File path, or bytes/bytearray/memoryview/mmap with the content.
+        :param mime_type: MIME type sent with the data, e.g. "application/pdf".
+        """
+        self.source = source
+        self.mime_type = mime_type
+        if isinstance(source, (str, os.PathLike)):
+            self.size = os.path.getsize(source)
+        else:
+            self.size = memoryview(source).nbytes
+
+    @property
+    def encoded_size(self):
+        """Length of the base64 encoding of the content."""
+        return 4 * ((self.size + 2) // 3)
+
+    def iter_chunks(self, chunk_bytes=STREAM_CHUNK_BYTES):
+        """
+        :param chunk_bytes: Bytes per chunk.
+        :return: Generator of bytes chunks of the raw content.
+        """
+        if not isinstance(self.source, (str, os.PathLike)):
+            view = memoryview(self.source).cast("B")
+            for start in range(0, self.size, chunk_bytes):
+                # Copied out, so the caller can close the source while a chunk is still queued
+                yield bytes(view[start:start + chunk_bytes])
+            return
+
+        # Plain reads rather than a memory map: mapped pages count towards the process RSS
+        # until the whole file has been sent. Reading stops at the size announced in the
+        # Content-Length, even if the file grows meanwhile.
+        remaining = self.size
+        with open(self.source, "rb") as f:
+            while remaining > 0:
+                chunk = f.read(min(chunk_bytes, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    async def stream(self):
+        """
+        :return: Async generator of the raw content, for sending the file itself as a request body.
+        """
+        for chunk in self.iter_chunks():
+            yield chunk
+
+    def iter_base64(self, chunk_bytes=STREAM_CHUNK_BYTES):
+        """
+        :param chunk_bytes: Raw bytes encoded per chunk (a multiple of 3).
+        :return: Generator of base64-encoded chunks.
+        """
+        for chunk in self.iter_chunks(chunk_bytes):
+            yield base64.b64encode(chunk)
+
+
+class JSONRequestBody:
+    """
+    A serialized JSON request body in which InlinePart objects are streamed.
+
+    The payload is serialized once with a placeholder in place of each InlinePart's data;
+    sending the body yields the JSON text around the placeholders and the parts' base64
+    chunks in between. The body can be sent any number of times (e.g. on retries) and its
+    size is known up front, so it is sent with a Content-Length instead of chunked encoding.
+    """
+
+    def __init__(self, payload):
+        """
+        :param payload: JSON-serializable request body, possibly containing InlinePart objects.
+        """
+        token = uuid.uuid4().hex
+        parts = []
+
+        def placeholder(value):
+            if isinstance(value, InlinePart):
+                parts.append(value)
+                return {"inlineData": {"mimeType": value.mime_type, "data": f"{token}:{len(parts) - 1}"}}
+            raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+        text = json.dumps(payload, default=placeholder)
+
+        # Alternate JSON text segments (bytes) and the parts whose data goes between them
+        self.segments = []
+        position = 0
+        for match in re.finditer(f"{token}:(\\d+)", text):
+            self.segments.append(text[position:match.start()].encode("utf-8"))
+            self.segments.append(parts[int(match.group(1))])
+            position = match.end()
+        self.segments.append(text[position:].encode("utf-8"))
+        self.size = sum(len(segment) if isinstance(segment, bytes) else segment.encoded_size for segment in self.segments)
+
+    @property
+    def streamed(self):
+        """True if the body contains InlinePart data, False if it is plain JSON."""
+        return len(self.segments) > 1
+
+    def to_bytes(self):
+        """
+        :return: The whole body in memory (only sensible for bodies without large parts).
+        """
+        return b"".join(self)
+
+    def __iter__(self):
+        for segment in self.segments:
+            if isinstance(segment, bytes):
+                yield segment
+            else:
+                yield from segment.iter_base64()
+
+    async def stream(self):
+        """
+        :return: Async generator of body chunks, in the form aiohttp accepts as request data.
+        """
+        for chunk in self:
+            yield chunk
@@ -1,17 +1,19 @@
-import faiss
-import numpy as np
-from embedding import generate_embeddings_for_chunk  # Assuming this function is in embedding.py
-from config import GEMINI_API_KEY
+from .embedding import generate_embeddings_for_chunk, generate_embeddings_for_chunks  # Assuming this function is in embedding.py
+from .config import GEMINI_API_KEY
+from .index_holder import get_faiss_index
+from .metrics import metrics
 
 def load_faiss_index(faiss_index_path="data/processed/faiss_index"):
     """
     Load the FAISS index from disk.
+
+    The index is read once per process and shared; it is reloaded only when the file changes.
     
     :param faiss_index_path: The path where the FAISS index is stored.
     :return: Loaded FAISS index.
     """
-    index = faiss.read_index(faiss_index_path)
-    return index
+    with metrics.span("index_load"):
+        return get_faiss_index(faiss_index_path)
 
 def search_semantic(embedding, index, top_k=5):
     """
@@ -22,23 +24,82 @@ def search_semantic(embedding, index, top_k=5):
     :param top_k: The number of most similar results to return.
     :return: A list of the top K indices and distances.
     """
+    import numpy as np
+
     # Convert query embedding to numpy array if it's not already
     query_embedding = np.array(embedding).astype("float32").reshape(1, -1)
     
     # Perform the search
-    distances, indices = index.search(query_embedding, top_k)
+    with metrics.span("faiss_search"):
+        distances, indices = index.search(query_embedding, top_k)
     
     return distances, indices
 
-# Example usage: Querying the FAISS index
-query_text = "Find the most relevant chapter on Real Number."
-query_embedding = generate_embeddings_for_chunk(query_text, GEMINI_API_KEY)  # Get embedding for query
+def embed_queries(queries, api_key=GEMINI_API_KEY):
+    """
+    Turn a mix of query texts and precomputed vectors into one float32 matrix.
+
+    All texts are embedded together with batched requests (and served from the embedding
+    cache where possible); vectors are used as given.
+
+    :param queries: List whose items are query strings or embedding vectors.
+    :param api_key: Your Gemini API key.
+    :return: Tuple (matrix, query_ids) where row j of the matrix belongs to queries[query_ids[j]].
+             Queries whose embedding failed are left out.
+    """
+    import numpy as np
+
+    vectors = [None if isinstance(query, str) else np.asarray(query, dtype="float32").ravel() for query in queries]
+    text_ids = [i for i, query in enumerate(queries) if isinstance(query, str)]
+    if text_ids:
+        embeddings, chunk_ids, _ = generate_embeddings_for_chunks([queries[i] for i in text_ids], api_key)
+        for row, chunk_id in enumerate(chunk_ids):
+            vectors[text_ids[chunk_id]] = embeddings[row]
+
+    query_ids = [i for i, vector in enumerate(vectors) if vector is not None]
+    if not query_ids:
+        return np.empty((0, 0), dtype="float32"), query_ids
+    return np.ascontiguousarray([vectors[i] for i in query_ids], dtype="float32"), query_ids
+
+def search_semantic_batch(queries, index, top_k=5, api_key=GEMINI_API_KEY):
+    """
+    Search the FAISS index for many queries with a single vectorized `index.search`.
+
+    :param queries: List of query strings and/or precomputed query embeddings.
+    :param index: The FAISS index where embeddings are stored.
+    :param top_k: The number of most similar results to return per query.
+    :param api_key: Your Gemini API key, used to embed the query strings.
+    :return: Tuple (distances, indices), each of shape (len(queries), top_k). Rows of queries
+             that could not be embedded have index -1 and distance inf.
+    """
+    import numpy as np
+
+    distances = np.full((len(queries), top_k), np.inf, dtype="float32")
+    indices = np.full((len(queries), top_k), -1, dtype="int64")
+
+    matrix, query_ids = embed_queries(queries, api_key)
+    if query_ids and matrix.shape[1] != index.d:
+        print(f"Error: Query embeddings have dimension {matrix.shape[1]} but the index expects {index.d}. "
+              f"Was the index built with a different EMBEDDING_BACKEND?")
+        return distances, indices
+    if query_ids:
+        with metrics.span("faiss_search", mode="batch"):
+            found_distances, found_indices = index.search(matrix, top_k)
+        distances[query_ids] = found_distances
+        indices[query_ids] = found_indices
+
+    return distances, indices
+
+if __name__ == "__main__":
+    # Example usage: Querying the FAISS index
+    query_text = "Find the most relevant chapter on Real Number."
+    query_embedding = generate_embeddings_for_chunk(query_text, GEMINI_API_KEY)  # Get embedding for query
 
-# Load FAISS index from file
-index = load_faiss_index()
+    # Load FAISS index from file
+    index = load_faiss_index()
 
-# Perform search and get top 5 most similar embeddings
-distances, indices = search_semantic(query_embedding, index, top_k=5)
+    # Perform search and get top 5 most similar embeddings
+    distances, indices = search_semantic(query_embedding, index, top_k=5)
 
-print(f"Top 5 search results (indices): {indices}")
-print(f"Top 5 distances (similarity): {distances}")
+    print(f"Top 5 search results (indices): {indices}")
+    print(f"Top 5 distances (similarity): {distances}")
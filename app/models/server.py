@@ -0,0 +1,360 @@
+# server.py
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import time
+
+from .config import (
+    GEMINI_API_KEY,
+    SERVER_BATCH_WINDOW_MS,
+    SERVER_EMBEDDING_BURST,
+    SERVER_EMBEDDING_REQUESTS_PER_SECOND,
+    SERVER_HOST,
+    SERVER_MAX_BATCH_SIZE,
+    SERVER_MAX_INFLIGHT,
+    SERVER_MAX_QUEUE,
+    SERVER_MAX_UPLOAD_BYTES,
+    SERVER_PORT,
+)
+from .chapter_map import get_chapter_map
+from .embedding import generate_embeddings_for_chunks_async
+from .gemini_client import get_client
+from .index_holder import get_index_manager
+from .lexical_search import get_lexical_index
+from .metrics import metrics
+from .micro_batcher import MicroBatcher, QueueFullError
+from .query_router import fused_route, lexical_route
+from .rate_limiter import TokenBucket
+from .search import search_semantic_batch
+from .video_metadata import get_video_metadata
+from .video_recommendation import extract_text_from_image_bytes_async
+
+VIDEO_METADATA_PATH = "data/csv/Demo_Youtube_link.xlsx"
+DEFAULT_TOP_K = 5
+MAX_TOP_K = 20
+
+# Seconds clients are asked to wait before retrying a request shed under overload
+RETRY_AFTER_SECONDS = 1
+
+
+def _json_response(data, status=200, headers=None):
+    from aiohttp import web
+
+    return web.json_response(data, status=status, headers=headers, dumps=lambda value: json.dumps(value, ensure_ascii=False))
+
+
+def _parse_top_k(value):
+    """
+    :param value: top_k from the request (string, int or None).
+    :return: top_k as an int between 1 and MAX_TOP_K (DEFAULT_TOP_K if not given).
+    :raises ValueError: If the value is not such an int.
+    """
+    if value in (None, ""):
+        return DEFAULT_TOP_K
+    try:
+        top_k = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"top_k must be an integer, got {value!r}") from None
+    if not 1 <= top_k <= MAX_TOP_K:
+        raise ValueError(f"top_k must be between 1 and {MAX_TOP_K}")
+    return top_k
+
+
+class RecommendationServer:
+    """
+    Long-running HTTP service that recommends videos for problem images and text queries.
+
+    The FAISS index, chunk metadata, video sheet, lexical index and the pooled Gemini session
+    are loaded once and stay warm for the life of the process (the index and sheet are still
+    reloaded when their files change). Queries that the lexical fast path cannot answer are
+    handed to a MicroBatcher: embedding requests arriving from concurrent users within a
+    short window are sent as one batchEmbedContents call, and the batch is searched with one
+    vectorized FAISS call on a worker thread. Each query's hits are then ranked exactly as in
+    query_router (reciprocal rank fusion with the lexical rankings). The embedding calls are
+    paced by the server's own rate limiter (SERVER_EMBEDDING_REQUESTS_PER_SECOND). Everything else that blocks (file reloads,
+    lexical matching, image preprocessing, SQLite caches) also runs on worker threads, so
+    the event loop only waits on the network. Requests beyond the in-flight or queue limits
+    are answered immediately with 503 and Retry-After instead of piling up.
+
+    Endpoints:
+        POST /recommend  image upload (multipart field "image", or a raw image/* body) or JSON
+                         {"text": ...} / {"image": <base64>}, with optional top_k (nearest
+                         chunks fused with the lexical rankings, DEFAULT_TOP_K if not given)
+        GET  /healthz    index and sheet status
+        GET  /stats      in-flight requests, queue depth and batch sizes
+        GET  /metrics    Prometheus metrics (recorded when ASKMATH_METRICS=1)
+    """
+
+    def __init__(self, api_key=GEMINI_API_KEY, video_metadata_path=VIDEO_METADATA_PATH,
+                 batch_window_ms=SERVER_BATCH_WINDOW_MS, max_batch_size=SERVER_MAX_BATCH_SIZE,
+                 max_queue=SERVER_MAX_QUEUE, max_inflight=SERVER_MAX_INFLIGHT, max_upload_bytes=SERVER_MAX_UPLOAD_BYTES,
+                 embedding_rate=SERVER_EMBEDDING_REQUESTS_PER_SECOND, embedding_burst=SERVER_EMBEDDING_BURST):
+        """
+        :param api_key: Gemini API key.
+        :param video_metadata_path: Path to the video spreadsheet.
+        :param batch_window_ms: How long a query waits for others to share its embedding call.
+        :param max_batch_size: Most queries per embedding call (batchEmbedContents allows 100).
+        :param max_queue: Most queries waiting for or inside an embedding call.
+        :param max_inflight: Most /recommend requests being handled at once, OCR included.
+        :param max_upload_bytes: Largest accepted request body.
+        :param embedding_rate: Embedding calls per second allowed to this server.
+        :param embedding_burst: Embedding calls that may be sent at once before pacing starts.
+        """
+        self.api_key = api_key
+        self.video_metadata_path = video_metadata_path
+        self.batch_window_ms = batch_window_ms
+        self.max_batch_size = min(max_batch_size, 100)
+        self.max_queue = max_queue
+        self.max_inflight = max_inflight
+        self.max_upload_bytes = max_upload_bytes
+        self.inflight = 0
+        self.requests = 0
+        self.rejected = 0
+        self.started_at = None
+        self.embedding_rate_limiter = TokenBucket(embedding_rate, embedding_burst)
+        # Created on the server's event loop in start()
+        self.embedding_batcher = None
+
+    def _warm_up(self):
+        # Load everything a request needs, so the first user does not pay for it
+        video_metadata = get_video_metadata(self.video_metadata_path)
+        index_manager = get_index_manager()
+        if video_metadata is not None:
+            get_lexical_index(video_metadata, index_manager)
+        return video_metadata, index_manager
+
+    async def start(self, app=None):
+        """Create the batcher and load the index and sheet. Runs when the app starts."""
+        self.embedding_batcher = MicroBatcher(
+            "embedding",
+            self._search_batch,
+            max_batch_size=self.max_batch_size,
+            max_wait=self.batch_window_ms / 1000,
+            max_queue=self.max_queue,
+        )
+        with metrics.span("server_warm_up"):
+            video_metadata, index_manager = await asyncio.get_running_loop().run_in_executor(None, self._warm_up)
+        vectors = index_manager.index.ntotal if index_manager is not None and index_manager.index is not None else 0
+        if video_metadata is None:
+            print(f"❌ Video metadata file not found at '{self.video_metadata_path}'")
+        if not vectors:
+            print("⚠️ FAISS index is empty or missing; only lexical matches will be answered.")
+        print(f"✅ Loaded {vectors} vectors and {len(video_metadata.rows) if video_metadata else 0} video rows")
+        self.started_at = time.time()
+
+    async def stop(self, app=None):
+        """Finish queued batches and close the Gemini session. Runs when the app shuts down."""
+        if self.embedding_batcher is not None:
+            await self.embedding_batcher.close()
+        await get_client(self.api_key).close()
+
+    async def _search_batch(self, items):
+        """
+        Embed and search a batch of queries from different requests. Run by the batcher.
+
+        :param items: List of (text, top_k).
+        :return: List with one tuple (index_manager, vector_ids) per item, the ids of its
+                 nearest chunks best first, or None where the embedding failed.
+        """
+        texts = [text for text, _ in items]
+        with metrics.span("server_embedding"):
+            embeddings, chunk_ids, _ = await generate_embeddings_for_chunks_async(
+                texts, self.api_key, rate_limiter=self.embedding_rate_limiter
+            )
+
+        results = [None] * len(items)
+        if not chunk_ids:
+            return results
+
+        def search():
+            # The ids are resolved against this manager, even if the index is reloaded meanwhile
+            index_manager = get_index_manager()
+            if index_manager is None or index_manager.index is None or index_manager.index.ntotal == 0:
+                return index_manager, [[] for _ in chunk_ids]
+            top_k = max(items[i][1] for i in chunk_ids)
+            return index_manager, search_semantic_batch(list(embeddings), index_manager.index, top_k, self.api_key)[1]
+
+        # FAISS releases the GIL, so searching on a thread keeps the loop serving requests
+        with metrics.span("server_search"):
+            index_manager, indices = await asyncio.get_running_loop().run_in_executor(None, search)
+        for i, row_ids in zip(chunk_ids, indices):
+            results[i] = (index_manager, [int(vector_id) for vector_id in row_ids[:items[i][1]]])
+        return results
+
+    async def _read_query(self, request):
+        """
+        :return: Tuple (text, image_bytes, image_name, top_k); text is None for image queries.
+        :raises ValueError: If the request carries neither a text nor an image.
+        """
+        content_type = request.content_type
+        if content_type == "multipart/form-data":
+            form = await request.post()
+            image = form.get("image")
+            text = form.get("text")
+            top_k = _parse_top_k(form.get("top_k"))
+            if image is not None and hasattr(image, "file"):
+                return None, image.file.read(), image.filename, top_k
+        elif content_type == "application/json":
+            try:
+                body = await request.json()
+            except ValueError:
+                raise ValueError("Request body is not valid JSON") from None
+            if not isinstance(body, dict):
+                raise ValueError("Request body must be a JSON object")
+            text = body.get("text")
+            top_k = _parse_top_k(body.get("top_k"))
+            if body.get("image"):
+                try:
+                    return None, base64.b64decode(body["image"], validate=True), body.get("filename"), top_k
+                except (binascii.Error, TypeError):
+                    raise ValueError("image must be base64-encoded") from None
+        elif content_type.startswith("image/"):
+            return None, await request.read(), None, _parse_top_k(request.query.get("top_k"))
+        else:
+            raise ValueError("Send multipart/form-data, application/json or an image/* body")
+
+        if not isinstance(text, str) or not text.strip():
+            raise ValueError("Provide an image or a non-empty text")
+        return text, None, None, top_k
+
+    def _overloaded(self, reason):
+        self.rejected += 1
+        metrics.increment("askmath_server_rejected_total", reason=reason)
+        return _json_response(
+            {"error": f"Server is overloaded ({reason}), retry later"},
+            status=503,
+            headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+        )
+
+    def _lexical_result(self, text, video_metadata):
+        # Explicit chapter/exercise queries are answered locally, without an embedding call.
+        # Runs on a worker thread: the lexical index is rebuilt here after a sheet or index reload
+        return lexical_route(text, video_metadata, get_lexical_index(video_metadata, get_index_manager()))
+
+    def _fused_result(self, text, found, video_metadata):
+        # Same ranking as query_router: vector hits fused with the lexical rankings. Worker thread
+        index_manager, vector_ids = found
+        lexical_index = get_lexical_index(video_metadata, index_manager)
+        return fused_route(text, vector_ids, video_metadata, index_manager, lexical_index, get_chapter_map())
+
+    async def recommend(self, request):
+        """POST /recommend: OCR the image if there is one, then recommend a video for the text."""
+        if self.inflight >= self.max_inflight:
+            return self._overloaded("inflight")
+        self.inflight += 1
+        self.requests += 1
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            with metrics.span("server_request"):
+                try:
+                    text, image_bytes, image_name, top_k = await self._read_query(request)
+                except ValueError as e:
+                    return _json_response({"error": str(e)}, status=400)
+
+                # Checks the sheet's modification time and reloads it if it changed
+                video_metadata = await loop.run_in_executor(None, get_video_metadata, self.video_metadata_path)
+                if video_metadata is None:
+                    return _json_response({"error": "Video metadata is not available"}, status=500)
+
+                # Step 1: Extract the problem text from the image
+                if image_bytes is not None:
+                    if not image_bytes:
+                        return _json_response({"error": "The image is empty"}, status=400)
+                    text = await extract_text_from_image_bytes_async(image_bytes, self.api_key, image_name=image_name)
+                    if not text:
+                        return _json_response({"error": "Text extraction failed"}, status=502)
+
+                # Step 2: Lexical fast path, then the micro-batched embedding and search
+                result = await loop.run_in_executor(None, self._lexical_result, text, video_metadata)
+                if result is None:
+                    try:
+                        found = await self.embedding_batcher.submit((text, top_k))
+                    except QueueFullError:
+                        return self._overloaded("queue")
+                    if found is None:
+                        return _json_response({"error": "Could not generate embedding", "text": text}, status=502)
+                    result = await loop.run_in_executor(None, self._fused_result, text, found, video_metadata)
+
+            metrics.increment("askmath_search_path_total", path=result["path"])
+            result["text"] = result.pop("query")
+            result["seconds"] = round(time.perf_counter() - started, 4)
+            return _json_response(result)
+        finally:
+            self.inflight -= 1
+
+    async def health(self, request):
+        """GET /healthz: 200 when the sheet is loaded, with the number of indexed vectors."""
+        loop = asyncio.get_running_loop()
+        video_metadata = await loop.run_in_executor(None, get_video_metadata, self.video_metadata_path)
+        index_manager = await loop.run_in_executor(None, get_index_manager)
+        vectors = index_manager.index.ntotal if index_manager is not None and index_manager.index is not None else 0
+        return _json_response(
+            {"status": "ok" if video_metadata is not None else "no_video_metadata", "vectors": vectors,
+             "video_rows": len(video_metadata.rows) if video_metadata is not None else 0},
+            status=200 if video_metadata is not None else 503,
+        )
+
+    async def stats(self, request):
+        """GET /stats: load and batching statistics."""
+        return _json_response({
+            "uptime_seconds": round(time.time() - self.started_at, 1) if self.started_at else 0.0,
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "batch_window_ms": self.batch_window_ms,
+            "embedding_batcher": self.embedding_batcher.stats() if self.embedding_batcher is not None else None,
+        })
+
+    async def prometheus_metrics(self, request):
+        """GET /metrics: Prometheus text format."""
+        from aiohttp import web
+
+        return web.Response(text=metrics.export_prometheus(), content_type="text/plain")
+
+
+def create_app(server=None):
+    """
+    Build the aiohttp application.
+
+    :param server: RecommendationServer to serve (a default one if None).
+    :return: aiohttp.web.Application.
+    """
+    from aiohttp import web
+
+    server = server or RecommendationServer()
+    app = web.Application(client_max_size=server.max_upload_bytes)
+    app.router.add_post("/recommend", server.recommend)
+    app.router.add_get("/healthz", server.health)
+    app.router.add_get("/stats", server.stats)
+    app.router.add_get("/metrics", server.prometheus_metrics)
+    app.on_startup.append(server.start)
+    app.on_cleanup.append(server.stop)
+    return app
+
+
+if __name__ == "__main__":
+    from aiohttp import web
+
+    parser = argparse.ArgumentParser(description="Serve video recommendations over HTTP with micro-batched embedding.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--window-ms", type=float, default=SERVER_BATCH_WINDOW_MS, help="Micro-batching window")
+    parser.add_argument("--max-batch", type=int, default=SERVER_MAX_BATCH_SIZE, help="Most queries per embedding call")
+    parser.add_argument("--max-queue", type=int, default=SERVER_MAX_QUEUE, help="Most queries waiting for embedding")
+    parser.add_argument("--max-inflight", type=int, default=SERVER_MAX_INFLIGHT, help="Most requests handled at once")
+    parser.add_argument("--video-metadata", default=VIDEO_METADATA_PATH, help="Path to the video spreadsheet")
+    args = parser.parse_args()
+
+    recommendation_server = RecommendationServer(
+        video_metadata_path=args.video_metadata,
+        batch_window_ms=args.window_ms,
+        max_batch_size=args.max_batch,
+        max_queue=args.max_queue,
+        max_inflight=args.max_inflight,
+    )
+    web.run_app(create_app(recommendation_server), host=args.host, port=args.port,
+                print=lambda _: print(f"✅ Serving recommendations on http://{args.host}:{args.port}"))
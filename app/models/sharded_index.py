@@ -0,0 +1,252 @@
+# sharded_index.py
+import argparse
+import contextlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .index_factory import FAISS_INDEX_MMAP
+from .index_holder import get_index_manager
+from .index_manager import IndexManager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Root directory holding one sub-directory per shard
+FAISS_SHARDS_DIR = os.getenv("FAISS_SHARDS_DIR", "data/processed/shards")
+
+SHARD_INDEX_FILE = "faiss_index"
+SHARD_INFO_FILE = "shard.json"
+SHARD_LOCK_FILE = ".lock"
+
+
+def validate_shard_name(name):
+    """
+    :param name: Shard name, e.g. "class9-algebra".
+    :return: The name.
+    :raises ValueError: If the name is empty or could escape the shards directory.
+    """
+    if not name or name.startswith(".") or any(separator in name for separator in ("/", "\\", os.sep)):
+        raise ValueError(f"Invalid shard name: {name!r}")
+    return name
+
+
+@contextlib.contextmanager
+def _exclusive_lock(lock_path):
+    # An OS-level lock, so writers in different processes wait for each other
+    with open(lock_path, "a+") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ShardedIndex:
+    """
+    A set of independent index shards (one per book, subject or grade) under one directory.
+
+    Each shard is a normal IndexManager at `<root>/<shard>/faiss_index`, plus a
+    `shard.json` with free-form tags such as book, subject and grade. Shards are written
+    independently (an OS file lock serializes writers of the same shard across processes)
+    and searched together: `search` fans out to the selected shards on a thread pool
+    (FAISS releases the GIL during search) and merges the per-shard top-k by distance.
+    """
+
+    def __init__(self, root=FAISS_SHARDS_DIR, mmap=FAISS_INDEX_MMAP, max_workers=None):
+        """
+        :param root: Directory containing the shard directories.
+        :param mmap: Memory-map shard index files when loading them for search.
+        :param max_workers: Threads used for fan-out (defaults to the CPU count).
+        """
+        self.root = root
+        self.mmap = mmap
+        self.max_workers = max_workers or os.cpu_count() or 4
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def shard_path(self, name):
+        """
+        :return: Path of the shard's FAISS index file.
+        """
+        return os.path.join(self.root, validate_shard_name(name), SHARD_INDEX_FILE)
+
+    def shard_names(self):
+        """
+        :return: Sorted names of the shards that have an index on disk.
+        """
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if not name.startswith(".") and os.path.exists(os.path.join(self.root, name, SHARD_INDEX_FILE))
+        )
+
+    def shard_info(self, name):
+        """
+        :return: Tags recorded for the shard (empty dict if none).
+        """
+        try:
+            with open(os.path.join(self.root, validate_shard_name(name), SHARD_INFO_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def select(self, shards=None, **tags):
+        """
+        Pick the shards to search.
+
+        :param shards: Shard names to restrict to (None for all).
+        :param tags: Only shards whose shard.json has these values, e.g. grade="9", subject="algebra".
+        :return: List of shard names.
+        """
+        names = self.shard_names()
+        if shards is not None:
+            wanted = set(shards)
+            names = [name for name in names if name in wanted]
+        if tags:
+            names = [
+                name for name in names
+                if all(str(self.shard_info(name).get(key)) == str(value) for key, value in tags.items())
+            ]
+        return names
+
+    @contextlib.contextmanager
+    def writer(self, name, reset=False, **tags):
+        """
+        Open a shard for writing, creating it if needed: `with shards.writer("class9-algebra", grade="9") as manager: ...`.
+
+        Holds an exclusive cross-process lock on the shard until the block exits, then saves
+        the index. Different shards can be written by different processes at the same time.
+
+        :param name: Shard name.
+        :param reset: Delete the shard's index, metadata and checkpoints first (keeps its tags).
+        :param tags: Tags merged into the shard's shard.json (book, subject, grade, ...).
+        :return: Context manager yielding a writable IndexManager.
+        """
+        shard_dir = os.path.dirname(self.shard_path(name))
+        os.makedirs(shard_dir, exist_ok=True)
+        with _exclusive_lock(os.path.join(shard_dir, SHARD_LOCK_FILE)):
+            if reset:
+                for file_name in os.listdir(shard_dir):
+                    if file_name not in (SHARD_LOCK_FILE, SHARD_INFO_FILE):
+                        os.remove(os.path.join(shard_dir, file_name))
+            if tags:
+                info = self.shard_info(name)
+                info.update({key: value for key, value in tags.items() if value is not None})
+                tmp_path = os.path.join(shard_dir, f"{SHARD_INFO_FILE}.tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(info, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, os.path.join(shard_dir, SHARD_INFO_FILE))
+
+            manager = IndexManager(self.shard_path(name))
+            try:
+                yield manager
+                manager.save()
+            finally:
+                manager.close()
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="shard-search")
+            return self._pool
+
+    def search(self, query_embeddings, top_k=5, shards=None, **tags):
+        """
+        Search the selected shards in parallel and merge their results.
+
+        :param query_embeddings: A single query vector or a matrix of query vectors.
+        :param top_k: The number of results to return per query.
+        :param shards: Shard names to search (None for all), see select.
+        :param tags: Shard tag filter, see select.
+        :return: List with one list per query of up to top_k hit dicts, best first. Each hit
+                 has shard, vector_id, distance and the chunk metadata (book, chapter, section, ...).
+        """
+        import faiss
+        import numpy as np
+
+        queries = np.ascontiguousarray(query_embeddings, dtype="float32")
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+
+        def search_shard(name):
+            manager = get_index_manager(self.shard_path(name), self.mmap)
+            if manager is None or manager.index is None or manager.index.ntotal == 0:
+                return name, None, None
+            return name, manager.index.metric_type, manager.search(queries, top_k)
+
+        names = self.select(shards, **tags)
+        if len(names) == 1:
+            shard_results = [search_shard(names[0])]
+        else:
+            shard_results = list(self._executor().map(search_shard, names))
+        shard_results = [result for result in shard_results if result[2] is not None]
+
+        # Inner-product indexes rank larger scores first, L2 indexes smaller distances
+        descending = any(metric == faiss.METRIC_INNER_PRODUCT for _, metric, _ in shard_results)
+
+        merged = []
+        for query_id in range(len(queries)):
+            hits = []
+            for name, _, (distances, indices, metadata) in shard_results:
+                for distance, vector_id, chunk in zip(distances[query_id], indices[query_id], metadata[query_id]):
+                    if vector_id == -1:
+                        continue
+                    hit = dict(chunk or {}, shard=name, vector_id=int(vector_id), distance=float(distance))
+                    hits.append(hit)
+            hits.sort(key=lambda hit: -hit["distance"] if descending else hit["distance"])
+            merged.append(hits[:top_k])
+        return merged
+
+    def close(self):
+        """Stop the fan-out threads."""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List or search the index shards.")
+    parser.add_argument("--root", default=FAISS_SHARDS_DIR, help="Shards directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="Show every shard with its tags and vector count")
+    search_parser = commands.add_parser("search", help="Search the shards for a query")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--shard", action="append", help="Only search this shard (repeatable)")
+    search_parser.add_argument("--tag", action="append", default=[], help="Only shards with this tag, e.g. grade=9")
+    search_parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    sharded_index = ShardedIndex(args.root)
+    if args.command == "list":
+        for shard in sharded_index.shard_names():
+            manager = get_index_manager(sharded_index.shard_path(shard), sharded_index.mmap)
+            vectors = manager.index.ntotal if manager is not None and manager.index is not None else 0
+            print(f"{shard}: {vectors} vectors {json.dumps(sharded_index.shard_info(shard), ensure_ascii=False)}")
+    else:
+        # Imported here so listing shards works without a Gemini API key
+        from .config import GEMINI_API_KEY
+        from .embedding import generate_embeddings_for_chunk
+
+        tags = dict(tag.split("=", 1) for tag in args.tag)
+        query_embedding = generate_embeddings_for_chunk(args.query, GEMINI_API_KEY)
+        if query_embedding is None:
+            print("❌ Could not generate embedding.")
+        else:
+            for hit in sharded_index.search(query_embedding, args.top_k, args.shard, **tags)[0]:
+                print(f"{hit['distance']:.4f}  {hit['shard']}  {hit.get('book')}  {hit.get('chapter')}  {hit.get('section')}  page={hit.get('page')}")
+        sharded_index.close()
@@ -0,0 +1,64 @@
+# single_flight.py
+import asyncio
+import threading
+
+from .metrics import metrics
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical async calls into one.
+
+    The first caller for a key starts the work; callers arriving with the same key while it
+    is still running await the same result instead of issuing a duplicate request. Nothing
+    is kept after the call finishes, so this complements the on-disk caches rather than
+    replacing them. Calls are only shared within one event loop; synchronous callers all
+    run on the Gemini client's background loop, so they are coalesced as well.
+    """
+
+    def __init__(self, name):
+        """
+        :param name: Label used in the `askmath_singleflight_total` metric.
+        """
+        self.name = name
+        self.leaders = 0
+        self.shared = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    async def do(self, key, make_coro):
+        """
+        Run `make_coro()` unless an identical call is already in flight.
+
+        :param key: Hashable identity of the call, e.g. a content hash.
+        :param make_coro: Zero-argument callable returning the coroutine to run.
+        :return: The result of the (possibly shared) call.
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        with self._lock:
+            task = self._calls.get(flight_key)
+            if task is None:
+                task = loop.create_task(make_coro())
+                self._calls[flight_key] = task
+                task.add_done_callback(lambda _: self._forget(flight_key, task))
+                self.leaders += 1
+                result = "leader"
+            else:
+                self.shared += 1
+                result = "shared"
+        metrics.increment("askmath_singleflight_total", flight=self.name, result=result)
+        # Shield so one caller being cancelled does not cancel the call for everyone else
+        return await asyncio.shield(task)
+
+    def _forget(self, flight_key, task):
+        with self._lock:
+            if self._calls.get(flight_key) is task:
+                del self._calls[flight_key]
+
+    def stats(self):
+        """
+        :return: Dict with the number of calls started (leaders) and calls that joined one (shared).
+        """
+        with self._lock:
+            return {"leaders": self.leaders, "shared": self.shared, "in_flight": len(self._calls)}
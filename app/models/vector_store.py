@@ -1,35 +1,80 @@
-import faiss
-import numpy as np
-from embedding import generate_embeddings_for_text
-from config import GEMINI_API_KEY
-
-def create_faiss_index(embedding_dimension):
-    return faiss.IndexFlatL2(embedding_dimension)
+from .embedding import generate_embeddings_for_chunks, generate_embeddings_for_text_batched
+from .chunker import iter_chunks
+from .config import GEMINI_API_KEY, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+from .index_factory import create_faiss_index, train_faiss_index
 
 def store_embeddings_in_faiss(embeddings, index, faiss_index_path="data/processed/faiss_index"):
     import os
+    import faiss
+    import numpy as np
+
     os.makedirs(os.path.dirname(faiss_index_path), exist_ok=True)
     
-    embeddings_np = np.array(embeddings).astype("float32")
+    # A float32 matrix from generate_embeddings_for_chunks is used as-is without a copy
+    embeddings_np = np.ascontiguousarray(embeddings, dtype="float32")
+    # IVF and PQ indexes must be trained before vectors can be added
+    train_faiss_index(index, embeddings_np)
     index.add(embeddings_np)
     faiss.write_index(index, faiss_index_path)
     print(f"✅ Embeddings stored successfully at: {faiss_index_path}")
 
+def index_document(manager, doc_id, text, api_key, book=None, chapter=None, section=None, max_tokens=CHUNK_MAX_TOKENS,
+                   overlap_tokens=CHUNK_OVERLAP_TOKENS, model_id="models/embedding-001"):
+    """
+    Chunk, embed and append one document to an IndexManager, replacing any previous version.
+
+    The previous version is only replaced when every chunk embedded; if any chunk fails, the
+    index is left unchanged so a failed run never removes or truncates a document.
+
+    :param manager: IndexManager that owns the index and metadata store.
+    :param doc_id: Stable identifier of the document.
+    :param text: Full document text.
+    :param api_key: Your Gemini API key.
+    :param book: Book the document belongs to.
+    :param chapter: Chapter (অধ্যায়) of the document.
+    :param section: Exercise section (অনুশীলনী) of the document.
+    :param max_tokens: Token budget per chunk, see chunker.iter_chunks.
+    :param overlap_tokens: Tokens of trailing sentences repeated in the next chunk.
+    :param model_id: The ID of the Gemini embedding model to use.
+    :return: Tuple (vector_ids, failed_ids) with the IDs added and the chunk indices that failed
+             to embed; vector_ids is empty when anything failed, as nothing was stored.
+    """
+    chunks = list(iter_chunks(text, max_tokens, overlap_tokens))
+    embeddings, chunk_ids, failed_ids = generate_embeddings_for_chunks([chunk.text for chunk in chunks], api_key, model_id)
+    if failed_ids:
+        print(f"❌ {len(failed_ids)} of {len(chunks)} chunks of '{doc_id}' failed to embed; the index was not changed.")
+        return [], failed_ids
+
+    # Each chunk is stored with its own offset, so IDs stay aligned
+    vector_ids = manager.update_document(
+        doc_id,
+        [chunks[i].text for i in chunk_ids],
+        embeddings,
+        book=book,
+        chapter=chapter,
+        section=section,
+        offsets=[chunks[i].offset for i in chunk_ids],
+    )
+    manager.save()
+    return vector_ids, failed_ids
+
 # ----- Main Execution -----
 
-# Your input text (can load from file or another source)
-extracted_text = """
-Sample extracted text from the PDF. This is a longer text to demonstrate chunking and embedding generation for multiple parts.
-The more text you have, the more important it is to break it down into manageable pieces for API calls.
-"""
-
-# Step 1: Get embeddings from embedding.py
-embeddings = generate_embeddings_for_text(extracted_text , api_key =GEMINI_API_KEY, model_id="models/embedding-001")
-
-# Step 2: Create index and store if embeddings are valid
-if embeddings and len(embeddings) > 0:
-    embedding_dimension = len(embeddings[0])
-    index = create_faiss_index(embedding_dimension)
-    store_embeddings_in_faiss(embeddings, index)
-else:
-    print("❌ No embeddings were generated. Nothing to store.")
+# Only as a script: this overwrites data/processed/faiss_index with the sample text
+if __name__ == "__main__":
+    # Your input text (can load from file or another source)
+    extracted_text = """
+    Sample extracted text from the PDF. This is a longer text to demonstrate chunking and embedding generation for multiple parts.
+    The more text you have, the more important it is to break it down into manageable pieces for API calls.
+    """
+
+    # Step 1: Get embeddings from embedding.py (one float32 matrix, failed chunks reported separately)
+    embeddings, chunk_ids, failed_ids = generate_embeddings_for_text_batched(extracted_text, api_key=GEMINI_API_KEY, model_id="models/embedding-001")
+
+    # Step 2: Create index and store if embeddings are valid
+    if len(embeddings) > 0:
+        embedding_dimension = embeddings.shape[1]
+        index = create_faiss_index(embedding_dimension)
+        store_embeddings_in_faiss(embeddings, index)
+    else:
+        print("❌ No embeddings were generated. Nothing to store.")
@@ -0,0 +1,171 @@
+# video_metadata.py
+import os
+import pickle
+import re
+import threading
+import unicodedata
+
+from .index_holder import IndexHolder
+
+CHAPTER_COLUMN = "অধ্যায়"
+SECTION_COLUMN = "অনুশীলনী"
+LINK_COLUMN = "YouTube link"
+
+# Bump when the compiled layout changes so stale cache files are rebuilt
+CACHE_FORMAT_VERSION = 1
+
+_BANGLA_DIGITS = str.maketrans("০১২৩৪৫৬৭৮৯", "0123456789")
+_ZERO_WIDTH = re.compile("[\u200b\u200c\u200d\ufeff]")
+
+
+def normalize_key(value):
+    """
+    Normalize a chapter/section label so spreadsheet and query spellings compare equal.
+
+    Applies NFC, drops zero-width joiners, maps Bangla digits to ASCII, collapses
+    whitespace and case-folds Latin text. "২.১ er ১. (ক) " and "2.1 ER 1. (ক)" give the same key.
+
+    :param value: Raw label.
+    :return: Normalized key ("" for missing values).
+    """
+    if value is None:
+        return ""
+    text = unicodedata.normalize("NFC", str(value))
+    text = _ZERO_WIDTH.sub("", text).translate(_BANGLA_DIGITS)
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+class VideoMetadata:
+    """
+    Compiled, in-memory view of the video spreadsheet.
+
+    Rows keep their spreadsheet order; lookup dicts map normalized chapter, section and
+    (chapter, section) keys to the first matching row index.
+    """
+
+    def __init__(self, rows):
+        """
+        :param rows: List of (chapter, section, link) tuples in spreadsheet order.
+        """
+        self.rows = rows
+        self.by_chapter = {}
+        self.by_section = {}
+        self.by_chapter_section = {}
+        for i, (chapter, section, _) in enumerate(rows):
+            chapter_key, section_key = normalize_key(chapter), normalize_key(section)
+            if chapter_key:
+                self.by_chapter.setdefault(chapter_key, i)
+            if section_key:
+                self.by_section.setdefault(section_key, i)
+            self.by_chapter_section.setdefault((chapter_key, section_key), i)
+
+    def find(self, chapter, section):
+        """
+        Find the row for a chapter and section.
+
+        A row matching both the chapter and the section wins. Otherwise the first row whose
+        chapter or section matches is returned, which is what the original boolean scan
+        (chapter OR section) picked.
+
+        :param chapter: Chapter label (অধ্যায়).
+        :param section: Section label (অনুশীলনী).
+        :return: Row tuple (chapter, section, link), or None.
+        """
+        row_index = self.find_index(chapter, section)
+        return self.rows[row_index] if row_index is not None else None
+
+    def find_index(self, chapter, section):
+        """
+        Same lookup as find (exact (chapter, section) match first, then the first row
+        matching either), but return the row's position in `rows`.
+
+        :return: Row index, or None.
+        """
+        chapter_key, section_key = normalize_key(chapter), normalize_key(section)
+        exact = self.by_chapter_section.get((chapter_key, section_key))
+        if exact is not None:
+            return exact
+        candidates = [i for i in (self.by_chapter.get(chapter_key), self.by_section.get(section_key)) if i is not None]
+        return min(candidates) if candidates else None
+
+
+def compile_video_metadata(video_metadata_path):
+    """
+    Parse the spreadsheet with pandas. Only called when the cache is missing or stale.
+
+    :param video_metadata_path: Path to the Excel file containing video metadata.
+    :return: List of (chapter, section, link) tuples.
+    """
+    import pandas as pd
+
+    video_df = pd.read_excel(video_metadata_path)
+
+    def cell(value):
+        return None if pd.isna(value) else str(value)
+
+    # Match headers by normalized name; "য়" may be stored precomposed or decomposed
+    columns = {normalize_key(column): column for column in video_df.columns}
+    chapter_column, section_column, link_column = (
+        columns[normalize_key(name)] for name in (CHAPTER_COLUMN, SECTION_COLUMN, LINK_COLUMN)
+    )
+
+    rows = []
+    for chapter, section, link in zip(video_df[chapter_column], video_df[section_column], video_df[link_column]):
+        if cell(chapter) is None and cell(section) is None:
+            continue
+        rows.append((cell(chapter), cell(section), cell(link)))
+    return rows
+
+
+def load_video_metadata(video_metadata_path, cache_path=None):
+    """
+    Load the compiled metadata, rebuilding the binary cache if the spreadsheet changed.
+
+    :param video_metadata_path: Path to the Excel file containing video metadata.
+    :param cache_path: Path of the compiled cache (defaults to data/processed/<name>.pickle).
+    :return: VideoMetadata.
+    """
+    if cache_path is None:
+        name = os.path.splitext(os.path.basename(video_metadata_path))[0]
+        cache_path = os.path.join("data", "processed", f"{name}.pickle")
+
+    stat = os.stat(video_metadata_path)
+    source_signature = (CACHE_FORMAT_VERSION, stat.st_size, stat.st_mtime_ns)
+
+    try:
+        with open(cache_path, "rb") as f:
+            cached = pickle.load(f)
+        if cached.get("source_signature") == source_signature:
+            return VideoMetadata(cached["rows"])
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass
+
+    rows = compile_video_metadata(video_metadata_path)
+    directory = os.path.dirname(cache_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"source_signature": source_signature, "rows": rows}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+    return VideoMetadata(rows)
+
+
+_holders = {}
+_holders_lock = threading.Lock()
+
+
+def get_video_metadata(video_metadata_path="data/csv/Demo_Youtube_link.xlsx"):
+    """
+    Return the process-wide compiled metadata, reloaded only when the spreadsheet changes.
+
+    :param video_metadata_path: Path to the Excel file containing video metadata.
+    :return: VideoMetadata, or None if the spreadsheet does not exist.
+    """
+    key = os.path.abspath(video_metadata_path)
+    with _holders_lock:
+        holder = _holders.get(key)
+        if holder is None:
+            holder = IndexHolder(video_metadata_path, load_video_metadata)
+            _holders[key] = holder
+    return holder.get()
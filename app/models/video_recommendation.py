@@ -1,14 +1,76 @@
-import requests
-import numpy as np
-import faiss
-import pandas as pd
-from config import GEMINI_API_KEY
-from embedding import generate_embeddings_for_chunk
-from vector_store import create_faiss_index
-import time
-import base64
+from .config import GEMINI_API_KEY
+from .embedding import generate_embeddings_for_chunk
+from .search import search_semantic_batch
+from .index_holder import get_faiss_index, get_index_manager
+from .gemini_client import get_client
+from .image_ocr import OCR_PROMPT, ocr_image_bytes_async
+from .video_metadata import get_video_metadata
+from .chapter_map import chunk_chapter_section, get_chapter_map
+from .metrics import metrics
+from .batch_ocr import ocr_images_batched_async
+
+# Chapter and section recommended when the matched chunk has none: indexes built before chunk
+# metadata existed, or books ingested without a chapter map
+FALLBACK_CHAPTER = "অধ্যায় ২"
+FALLBACK_SECTION = "২.১ er ১. (ক)"
 
 # Function to extract text from the image using Gemini API
+async def extract_text_from_image_async(image_path, api_key, model_id="models/gemini-2.5-flash"):
+    """
+    Async version of extract_text_from_image using the shared pooled client.
+
+    :param image_path: Path to the image file.
+    :param api_key: Gemini API key.
+    :param model_id: Gemini model ID for text extraction.
+    :return: Extracted text from the image.
+    """
+    with open(image_path, "rb") as img_file:
+        image_bytes = img_file.read()
+    return await extract_text_from_image_bytes_async(image_bytes, api_key, model_id, image_path)
+
+async def extract_text_from_image_bytes_async(image_bytes, api_key, model_id="models/gemini-2.5-flash", image_name=None):
+    """
+    Extract text from image bytes already in memory, e.g. an upload received by the server.
+
+    Shares the OCR cache and in-flight requests with Text_Extraction/ocr.py (see image_ocr.py).
+
+    :param image_bytes: Encoded image (JPEG, PNG, ...).
+    :param api_key: Gemini API key.
+    :param model_id: Gemini model ID for text extraction.
+    :param image_name: File name used to guess the image type when it cannot be sniffed.
+    :return: Extracted text from the image, or None on failure.
+    """
+    return await ocr_image_bytes_async(image_bytes, api_key, model_id, image_name)
+
+async def extract_text_from_images_async(image_paths, api_key, model_id="models/gemini-2.5-flash"):
+    """
+    Extract text from several images, packing them into batched generateContent requests
+    (see batch_ocr.py); images whose batched answer cannot be split are sent one by one.
+
+    :param image_paths: List of image file paths.
+    :param api_key: Gemini API key.
+    :param model_id: Gemini model ID for text extraction.
+    :return: List with the extracted text for each image, or None where extraction failed.
+    """
+    images = []
+    positions = []
+    for position, image_path in enumerate(image_paths):
+        try:
+            with open(image_path, "rb") as img_file:
+                images.append((img_file.read(), image_path))
+            positions.append(position)
+        except OSError as e:
+            print(f"Error: Could not read image '{image_path}': {e}")
+
+    texts = await ocr_images_batched_async(
+        images, OCR_PROMPT, api_key, model_id,
+        lambda image_bytes, image_name, upload: ocr_image_bytes_async(image_bytes, api_key, model_id, image_name, upload),
+    )
+    results = [None] * len(image_paths)
+    for position, text in zip(positions, texts):
+        results[position] = text
+    return results
+
 def extract_text_from_image(image_path, api_key, model_id="models/gemini-2.5-flash"):
     """
     Extract text from an image using the Gemini API.
@@ -18,73 +80,37 @@ def extract_text_from_image(image_path, api_key, model_id="models/gemini-2.5-fla
     :param model_id: Gemini model ID for text extraction.
     :return: Extracted text from the image.
     """
-    url = f"https://generativelanguage.googleapis.com/v1beta/{model_id}:generateContent?key={api_key}"
-
-    headers = {
-        "Content-Type": "application/json",
-    }
-
-    try:
-        with open(image_path, "rb") as img_file:
-            image_data_base64 = base64.b64encode(img_file.read()).decode('utf-8')
-
-        payload = {
-            "contents": [
-                {
-                    "parts": [
-                        {"text": "Extract all text and mathematical expressions from this image."},
-                        {
-                            "inlineData": {
-                                "mimeType": "image/jpeg",  # Adjust mimeType based on your image type
-                                "data": image_data_base64
-                            }
-                        }
-                    ]
-                }
-            ]
-        }
-
-        response = requests.post(url, headers=headers, json=payload)
-
-        if response.status_code == 200:
-            data = response.json()
-            if data.get('candidates') and data['candidates'][0].get('content') and data['candidates'][0]['content'].get('parts'):
-                extracted_text = data['candidates'][0]['content']['parts'][0].get('text', "")
-                return extracted_text
-            else:
-                print(f"Error: Unexpected response structure from Gemini API: {data}")
-                return None
-        else:
-            print(f"Error: {response.status_code} - {response.text}")
-            return None
-
-    except requests.exceptions.RequestException as e:
-        print(f"Network or API request error: {e}")
-        return None
+    return get_client(api_key).run(extract_text_from_image_async(image_path, api_key, model_id))
 
 # Function to load the FAISS index
 def create_faiss_index(faiss_index_path="data/processed/faiss_index"):
     """
     Load the FAISS index from disk.
+
+    The index is read once per process and shared; it is reloaded only when the file changes.
     
     :param faiss_index_path: The path where the FAISS index is stored.
     :return: Loaded FAISS index.
     """
-    index = faiss.read_index(faiss_index_path)
-    return index
+    return get_faiss_index(faiss_index_path)
 
 # Function to perform semantic search
-def search_semantic(query_text, index, top_k=5):
+def search_semantic(query_text, index, top_k=5, query_embedding=None):
     """
     Perform a semantic search by querying the FAISS index.
     
-    :param query_text: The user query to search for.
+    :param query_text: The user query to search for (ignored if query_embedding is given).
     :param index: The FAISS index where embeddings are stored.
     :param top_k: The number of most similar results to return.
+    :param query_embedding: Precomputed embedding of the query, so callers that already
+                            embedded the text do not pay for a second API call.
     :return: A list of the top K indices and distances.
     """
-    # Generate the embedding for the query text
-    query_embedding = generate_embeddings_for_chunk(query_text, api_key=GEMINI_API_KEY)  # Replace with your key
+    import numpy as np
+
+    # Generate the embedding for the query text unless the caller already has it
+    if query_embedding is None:
+        query_embedding = generate_embeddings_for_chunk(query_text, api_key=GEMINI_API_KEY)  # Replace with your key
     
     if query_embedding is None:
         print("Error: Could not generate embedding for the query.")
@@ -94,7 +120,8 @@ def search_semantic(query_text, index, top_k=5):
     query_embedding = np.array(query_embedding).astype("float32").reshape(1, -1)
     
     # Perform the search
-    distances, indices = index.search(query_embedding, top_k)
+    with metrics.span("faiss_search"):
+        distances, indices = index.search(query_embedding, top_k)
     
     return distances, indices
 
@@ -102,21 +129,27 @@ def search_semantic(query_text, index, top_k=5):
 def get_video_recommendation(chapter, section, video_metadata_path="data/csv/Demo_Youtube_link.xlsx"):
     """
     Get the YouTube video recommendation based on the chapter and section.
+
+    The spreadsheet is compiled once into dict lookups (see video_metadata.py) and only
+    re-read when the file changes, so no Excel parsing happens per call.
     
     :param chapter: The matched chapter.
     :param section: The matched section.
     :param video_metadata_path: Path to the CSV file containing video metadata.
     :return: YouTube video title and link.
     """
-    # Load video metadata from CSV
-    video_df = pd.read_excel(video_metadata_path)
-    
+    with metrics.span("video_metadata_load"):
+        video_metadata = get_video_metadata(video_metadata_path)
+    if video_metadata is None:
+        print(f"Error: Video metadata file not found at '{video_metadata_path}'")
+        return None
+
     # Find the row matching the chapter and section
-    video_row = video_df[(video_df['অধ্যায়'] == chapter) | (video_df['অনুশীলনী'] == section)]
+    with metrics.span("video_lookup"):
+        video_row = video_metadata.find(chapter, section)
 
-    
-    if not video_row.empty:
-        video_title = video_row.iloc[0]['YouTube link']
+    if video_row is not None:
+        video_title = video_row[2]
         return video_title
     else:
         return None
@@ -127,9 +160,11 @@ def recommend_video_from_image(image_path):
     Full flow to recommend video based on image input: extract text, perform semantic search, and fetch YouTube link.
     
     :param image_path: Path to the image file containing the math problem.
+    :return: The recommended YouTube link, or None if any step failed.
     """
     # Step 1: Extract text from the image using Gemini API
-    extracted_text = extract_text_from_image(image_path, GEMINI_API_KEY)
+    with metrics.span("recommend_ocr"):
+        extracted_text = extract_text_from_image(image_path, GEMINI_API_KEY)
     
     if extracted_text is None:
         print("❌ Text extraction failed. Exiting...")
@@ -138,32 +173,35 @@ def recommend_video_from_image(image_path):
     print(f"Extracted Text: {extracted_text}")
 
     # Step 2: Generate embeddings for the extracted text
-    embedding = generate_embeddings_for_chunk(extracted_text, GEMINI_API_KEY)
+    with metrics.span("recommend_embedding"):
+        embedding = generate_embeddings_for_chunk(extracted_text, GEMINI_API_KEY)
 
     if embedding is None:
         print("❌ Could not generate embedding.")
         return
 
-    # Calculate the embedding dimension from the first generated embedding
-    embedding_dimension = len(embedding)  # This will give the embedding dimension
-
-    # Step 3: Load FAISS index
-    index = create_faiss_index()  # Load FAISS index
+    # Step 3: Get the shared FAISS index together with its chunk metadata
+    with metrics.span("index_load"):
+        index_manager = get_index_manager()
+    if index_manager is None or index_manager.index is None:
+        print("❌ FAISS index not found.")
+        return
     
-    # Step 4: Perform semantic search using the extracted text embedding
-    distances, indices = search_semantic(extracted_text, index, top_k=1)
+    # Step 4: Perform semantic search reusing the embedding from step 2
+    distances, indices = search_semantic(extracted_text, index_manager.index, top_k=1, query_embedding=embedding)
     
-    if indices is None or len(indices[0]) == 0:
+    if indices is None or len(indices[0]) == 0 or indices[0][0] == -1:
         print("❌ No relevant chapter/section found.")
         return
     
     print(f"Top match index: {indices[0][0]}, Distance: {distances[0][0]}")
 
-    # Step 5: Find the corresponding chapter and section from FAISS index
-    # Assuming that the indices correspond to chapter and section info in the CSV metadata
-    # This is a placeholder, you should implement a way to map FAISS indices to chapters/sections.
-    chapter = "অধ্যায় ২"  # Retrieve this info based on FAISS results, here as an example
-    section = "২.১ er ১. (ক)"  # Example section, would be extracted based on matching content
+    # Step 5: Resolve the matched vector ID to its chapter and section
+    chapter, section = chunk_chapter_section(index_manager.lookup(indices[0][0]), get_chapter_map())
+    if chapter is None and section is None:
+        print("⚠️ No chapter/section known for the matched chunk; using the default chapter. "
+              "Add the book's pages to the chapter map (CHAPTER_MAP_PATH) and re-ingest it.")
+        chapter, section = FALLBACK_CHAPTER, FALLBACK_SECTION
     
     # Step 6: Fetch the relevant YouTube video and explanation
     video_title = get_video_recommendation(chapter, section)
@@ -172,7 +210,76 @@ def recommend_video_from_image(image_path):
         print(f"Recommended Video: {video_title}")
     else:
         print("❌ No video found for the selected chapter and section.")
+    return video_title
+
+def recommend_videos_batch(queries, top_k=1):
+    """
+    Recommend videos for many queries at once: the texts are embedded with batched
+    requests and the index is searched with one vectorized call.
+
+    :param queries: List of query strings and/or precomputed query embeddings.
+    :param top_k: The number of nearest chunks considered per query; the closest one that
+                  resolves to a video wins.
+    :return: List with one dict per query (chapter, section, video, distance), or None
+             where no video was found. Hits without a known chapter/section are tried
+             last, as FALLBACK_CHAPTER/FALLBACK_SECTION.
+    """
+    with metrics.span("index_load"):
+        index_manager = get_index_manager()
+    if index_manager is None or index_manager.index is None:
+        print("❌ FAISS index not found.")
+        return [None] * len(queries)
+
+    distances, indices = search_semantic_batch(queries, index_manager.index, top_k=top_k)
+    chapter_map = get_chapter_map()
+
+    results = []
+    for row_distances, row_indices in zip(distances, indices):
+        # Hits with a known chapter/section come first; unlabelled chunks get the fallback
+        hits = [(distance, *chunk_chapter_section(index_manager.lookup(vector_id), chapter_map))
+                for distance, vector_id in zip(row_distances, row_indices) if vector_id != -1]
+        labelled = [hit for hit in hits if hit[1] is not None or hit[2] is not None]
+        if len(labelled) < len(hits):
+            labelled.append((hits[0][0], FALLBACK_CHAPTER, FALLBACK_SECTION))
+
+        result = None
+        for distance, chapter, section in labelled:
+            video_title = get_video_recommendation(chapter, section)
+            if video_title:
+                result = {
+                    "chapter": chapter,
+                    "section": section,
+                    "video": video_title,
+                    "distance": float(distance),
+                }
+                break
+        results.append(result)
+    return results
+
+def recommend_videos_from_images(image_paths, top_k=1):
+    """
+    Bulk version of recommend_video_from_image: OCR the images with batched multi-image
+    requests, then recommend for all extracted texts with one batched search.
+
+    :param image_paths: List of image file paths.
+    :param top_k: See recommend_videos_batch.
+    :return: List with one dict per image (extracted_text plus the recommendation fields),
+             or None where text extraction failed.
+    """
+    with metrics.span("recommend_ocr", mode="batch"):
+        texts = get_client(GEMINI_API_KEY).run(extract_text_from_images_async(image_paths, GEMINI_API_KEY))
+
+    text_ids = [i for i, text in enumerate(texts) if text]
+    recommendations = recommend_videos_batch([texts[i] for i in text_ids], top_k=top_k)
+
+    results = [None] * len(image_paths)
+    for i, recommendation in zip(text_ids, recommendations):
+        results[i] = dict(recommendation or {}, extracted_text=texts[i])
+    return results
+
+if __name__ == "__main__":
+    import sys
 
-# Example usage: Provide the path to the image
-image_path = "data/images/test.png"
-recommend_video_from_image(image_path)
+    # Example usage: Provide the path to the image
+    image_path = sys.argv[1] if len(sys.argv) > 1 else "data/images/test.png"
+    recommend_video_from_image(image_path)
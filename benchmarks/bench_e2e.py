@@ -0,0 +1,398 @@
+# bench_e2e.py
+"""
+End-to-end throughput/latency benchmark that runs fully offline.
+
+Starts benchmarks/mock_gemini.py as a subprocess in place of the Gemini API, copies the
+sample assets from data/images and data/csv into a temporary workspace, seeds a FAISS index
+with chunks labelled by the chapters and sections of the video spreadsheet, and then drives:
+
+  recommend  recommend_video_from_image over the sample images
+  search     query embedding + FAISS search (video_recommendation.search_semantic)
+  search_batch  the same queries in batches (search.search_semantic_batch)
+  ingest     page-parallel PDF ingestion (ingest.ingest_pdf) of a synthetic PDF
+  server     concurrent POST /recommend text queries against server.py, whose micro-batcher
+             merges them into shared embedding calls (the average batch size is reported)
+
+Each scenario reports throughput, p50/p95/p99 latency, errors and the process peak RSS.
+A call counts as an error if it raises or returns a false value (no video recommended, a
+query left without hits, a non-200 response). The app modules run in the temporary
+workspace so their default data/ paths (index, caches, spreadsheet) point at the copies.
+
+Usage (from the repository root):
+    python benchmarks/bench_e2e.py
+    python benchmarks/bench_e2e.py --latency-ms 200 --fail-rate 0.05 --concurrency 16 --requests 400
+    python benchmarks/bench_e2e.py --scenarios search --caches --json results.json
+"""
+import argparse
+import asyncio
+import contextlib
+import glob
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+MOCK_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_gemini.py")
+SCENARIOS = ("recommend", "search", "search_batch", "ingest", "server")
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000.0) if samples else float("nan")
+
+
+@contextlib.contextmanager
+def quiet(enabled=True):
+    """Silence the progress prints of the app modules while measuring."""
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def start_mock_server(args):
+    """
+    Launch the mock Gemini API in its own process so it does not compete for the GIL.
+
+    :return: Tuple (process, base_url).
+    """
+    process = subprocess.Popen(
+        [
+            sys.executable, MOCK_SERVER,
+            "--latency-ms", str(args.latency_ms),
+            "--jitter-ms", str(args.jitter_ms),
+            "--fail-rate", str(args.fail_rate),
+            "--retry-after", str(args.retry_after),
+            "--dimension", str(args.dimension),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    port = int(process.stdout.readline())
+    return process, f"http://127.0.0.1:{port}/v1beta"
+
+
+def prepare_workspace(args, base_url):
+    """
+    Create the temporary workspace, point the app at the mock server and import it.
+
+    :return: Dict of the imported app modules.
+    """
+    workspace = tempfile.mkdtemp(prefix="askmath-bench-")
+    for asset_dir in ("images", "csv"):
+        shutil.copytree(os.path.join(REPO_ROOT, "data", asset_dir), os.path.join(workspace, "data", asset_dir))
+    os.makedirs(os.path.join(workspace, "data", "processed"))
+
+    # Configuration is read at import time, so the environment must be ready first
+    os.environ.update({
+        "GEMINI_API_KEY": "bench-key",
+        "GEMINI_MODEL_ID": "gemini-bench",
+        "GEMINI_API_BASE_URL": base_url,
+        "GEMINI_MAX_CONCURRENCY": str(args.client_concurrency),
+        "GEMINI_MAX_RETRIES": str(args.max_retries),
+        "EMBEDDING_REQUESTS_PER_SECOND": str(args.embedding_rps),
+        "EMBEDDING_BURST": str(max(1, int(args.embedding_rps))),
+        "EMBEDDING_CACHE_PATH": "data/cache/embeddings.sqlite" if args.caches else "",
+        "OCR_CACHE_PATH": "data/cache/ocr.sqlite" if args.caches else "",
+        "EMBEDDING_BACKEND": args.embedding_backend,
+    })
+    os.chdir(workspace)
+    sys.path.insert(0, REPO_ROOT)
+
+    with quiet(not args.verbose):
+        from app.models import (embedding, index_holder, index_manager, ingest, search, server, video_metadata,
+                                video_recommendation)
+
+    return {
+        "workspace": workspace,
+        "embedding": embedding,
+        "index_holder": index_holder,
+        "index_manager": index_manager,
+        "ingest": ingest,
+        "search": search,
+        "server": server,
+        "video_metadata": video_metadata,
+        "video_recommendation": video_recommendation,
+    }
+
+
+def seed_index(modules, corpus_size):
+    """
+    Replace the workspace index with `corpus_size` chunks spread over the spreadsheet's
+    chapters and sections, so every search hit resolves to a video.
+
+    :return: List of query strings built from the same sections.
+    """
+    for path in glob.glob("data/processed/faiss_index*"):
+        os.remove(path)
+
+    rows = modules["video_metadata"].get_video_metadata().rows
+    chunks = [f"{rows[i % len(rows)][0]} {rows[i % len(rows)][1]} exercise {i}" for i in range(corpus_size)]
+    embeddings, chunk_ids, _ = modules["embedding"].generate_embeddings_for_chunks(chunks, "bench-key")
+
+    manager = modules["index_manager"].IndexManager()
+    by_row = {}
+    for position, chunk_id in enumerate(chunk_ids):
+        by_row.setdefault(chunk_id % len(rows), []).append(position)
+    for row_id, positions in by_row.items():
+        chapter, section, _ = rows[row_id]
+        manager.add_document(
+            f"bench-{row_id}", [chunks[chunk_ids[p]] for p in positions], embeddings[positions],
+            book="bench", chapter=chapter, section=section,
+        )
+    manager.save()
+    manager.close()
+    return [f"Explain {chapter} {section}" for chapter, section, _ in rows]
+
+
+def make_pdf(path, pages):
+    """Write a blank PDF with `pages` pages; the mock server supplies the page text."""
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=595, height=842)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def run_load(call, items, concurrency):
+    """
+    Call `call(item)` for every item from `concurrency` threads.
+
+    :param call: Callable returning a true value on success.
+    :return: Tuple (latencies in seconds, error count, wall-clock seconds).
+    """
+    def timed(item):
+        start = time.perf_counter()
+        try:
+            ok = bool(call(item))
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, items))
+    wall = time.perf_counter() - start
+    return [latency for latency, ok in results if ok], sum(1 for _, ok in results if not ok), wall
+
+
+def report(name, latencies, errors, wall, units, unit_name="req"):
+    return {
+        "scenario": name,
+        "count": len(latencies) + errors,
+        "errors": errors,
+        "seconds": wall,
+        "throughput": units / wall if wall else 0.0,
+        "throughput_unit": f"{unit_name}/s",
+        "p50_ms": percentile_ms(latencies, 50),
+        "p95_ms": percentile_ms(latencies, 95),
+        "p99_ms": percentile_ms(latencies, 99),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_recommend(modules, args):
+    images = sorted(glob.glob("data/images/*"))
+    items = [images[i % len(images)] for i in range(args.requests)]
+    recommend_video_from_image = modules["video_recommendation"].recommend_video_from_image
+
+    def recommend(image_path):
+        return recommend_video_from_image(image_path) is not None
+
+    with quiet(not args.verbose):
+        latencies, errors, wall = run_load(recommend, items, args.concurrency)
+    return report("recommend", latencies, errors, wall, args.requests)
+
+
+def bench_search(modules, args, queries):
+    search_semantic = modules["video_recommendation"].search_semantic
+    get_index_manager = modules["index_holder"].get_index_manager
+
+    def search(query):
+        _, indices = search_semantic(query, get_index_manager().index, top_k=args.top_k)
+        return indices is not None
+
+    items = [f"{queries[i % len(queries)]} #{i}" for i in range(args.requests)]
+    with quiet(not args.verbose):
+        latencies, errors, wall = run_load(search, items, args.concurrency)
+    return report("search", latencies, errors, wall, args.requests)
+
+
+def bench_search_batch(modules, args, queries):
+    search_semantic_batch = modules["search"].search_semantic_batch
+    get_index_manager = modules["index_holder"].get_index_manager
+
+    def search(batch):
+        _, indices = search_semantic_batch(batch, get_index_manager().index, top_k=args.top_k)
+        # Queries that could not be embedded come back with no hits
+        return bool((indices[:, 0] != -1).all())
+
+    items = [f"{queries[i % len(queries)]} #{i}" for i in range(args.requests)]
+    batches = [items[start:start + args.batch_size] for start in range(0, len(items), args.batch_size)]
+    with quiet(not args.verbose):
+        latencies, errors, wall = run_load(search, batches, args.concurrency)
+    return report("search_batch", latencies, errors, wall, args.requests, "query")
+
+
+def bench_ingest(modules, args):
+    ingest = modules["ingest"]
+    index_manager = modules["index_manager"]
+    pdf_path = "data/bench_book.pdf"
+    make_pdf(pdf_path, args.pages)
+
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for run in range(args.ingest_runs):
+        # A fresh index and checkpoint per run, otherwise later runs would skip every page
+        manager = index_manager.IndexManager(f"data/processed/ingest_{run}")
+        run_start = time.perf_counter()
+        with quiet(not args.verbose):
+            stats = ingest.ingest_pdf(
+                pdf_path, manager, book=f"bench_{run}",
+                pages_per_request=args.pages_per_request, max_concurrency=args.concurrency,
+            )
+        latencies.append(time.perf_counter() - run_start)
+        errors += len(stats["pages_failed"])
+        manager.close()
+    wall = time.perf_counter() - start
+    return report("ingest", latencies, errors, wall, args.pages * args.ingest_runs, "page")
+
+
+def bench_server(modules, args):
+    import requests
+    from aiohttp import web
+
+    # Run the server on its own event loop thread, like a separate process would
+    recommendation_server = modules["server"].RecommendationServer(
+        batch_window_ms=args.window_ms, max_batch_size=args.batch_size, max_inflight=max(args.concurrency, 1) * 4,
+    )
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(modules["server"].create_app(recommendation_server))
+    with quiet(not args.verbose):
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        loop.run_until_complete(site.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+
+    def recommend(query):
+        response = session.post(f"{url}/recommend", json={"text": query, "top_k": args.top_k}, timeout=60)
+        return response.status_code == 200
+
+    # Free-form questions, so the lexical fast path does not answer them without embedding
+    items = [f"How do I solve problem {i} step by step?" for i in range(args.requests)]
+    try:
+        latencies, errors, wall = run_load(recommend, items, args.concurrency)
+        stats = session.get(f"{url}/stats", timeout=10).json()["embedding_batcher"]
+    finally:
+        with quiet(not args.verbose):
+            asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    result = report("server", latencies, errors, wall, args.requests)
+    result.update(embedding_batches=stats["batches"], average_batch_size=stats["average_batch_size"])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated scenarios to run")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per recommend/search scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent callers (and pages in flight for ingest)")
+    parser.add_argument("--corpus", type=int, default=2000, help="Chunks in the seeded index")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32,
+                        help="Queries per call in the search_batch scenario (and the server's largest micro-batch)")
+    parser.add_argument("--window-ms", type=float, default=10.0, help="Micro-batching window of the server scenario")
+    parser.add_argument("--pages", type=int, default=40, help="Pages in the synthetic PDF")
+    parser.add_argument("--pages-per-request", type=int, default=1)
+    parser.add_argument("--ingest-runs", type=int, default=3)
+    parser.add_argument("--dimension", type=int, default=768, help="Embedding dimension returned by the mock")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Mock server response delay")
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Probability of a 429 from the mock")
+    parser.add_argument("--retry-after", type=float, default=0.1)
+    parser.add_argument("--max-retries", type=int, default=4)
+    parser.add_argument("--client-concurrency", type=int, default=8, help="GEMINI_MAX_CONCURRENCY for the client")
+    parser.add_argument("--embedding-rps", type=float, default=1000.0,
+                        help="Embedding rate limit; the default is high so the limiter does not mask the code under test")
+    parser.add_argument("--embedding-backend", default="gemini", choices=("gemini", "local"),
+                        help="Embedding backend; 'local' keeps embeddings off the mock server entirely")
+    parser.add_argument("--caches", action="store_true", help="Keep the OCR and embedding caches enabled")
+    parser.add_argument("--keep-workspace", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own output")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(",")
+    json_path = os.path.abspath(args.json) if args.json else None
+    process, base_url = start_mock_server(args)
+    modules = None
+    try:
+        modules = prepare_workspace(args, base_url)
+        with quiet(not args.verbose):
+            queries = seed_index(modules, args.corpus)
+        print(f"Workspace: {modules['workspace']}, mock API: {base_url}, corpus: {args.corpus} chunks, "
+              f"baseline RSS: {peak_rss_mb():.1f} MB")
+
+        results = []
+        print(f"{'scenario':<14}{'count':>7}{'errors':>8}{'throughput':>16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'peak RSS MB':>13}")
+        for name in scenarios:
+            if name == "recommend":
+                result = bench_recommend(modules, args)
+            elif name == "search":
+                result = bench_search(modules, args, queries)
+            elif name == "search_batch":
+                result = bench_search_batch(modules, args, queries)
+            elif name == "ingest":
+                result = bench_ingest(modules, args)
+            elif name == "server":
+                result = bench_server(modules, args)
+            else:
+                raise SystemExit(f"Unknown scenario: {name}")
+            results.append(result)
+            throughput = f"{result['throughput']:.1f} {result['throughput_unit']}"
+            print(
+                f"{name:<14}{result['count']:>7}{result['errors']:>8}{throughput:>16}{result['p50_ms']:>10.1f}"
+                f"{result['p95_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['peak_rss_mb']:>13.1f}"
+            )
+            if "average_batch_size" in result:
+                print(f"{'':<14}{result['embedding_batches']} embedding calls, "
+                      f"{result['average_batch_size']:.1f} queries per call on average")
+
+        if json_path:
+            with open(json_path, "w") as f:
+                json.dump(results, f, indent=2)
+    finally:
+        process.terminate()
+        process.wait()
+        if modules is not None and not args.keep_workspace:
+            os.chdir(REPO_ROOT)
+            shutil.rmtree(modules["workspace"], ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# bench_embedding_backends.py
+"""
+Throughput comparison of the embedding backends in app/models/embedding_backends.py.
+
+  local          HashingEmbeddingBackend on the CPU, one call per batch
+  gemini_batch   batchEmbedContents against the mock Gemini server (benchmarks/mock_gemini.py)
+  gemini_single  one embedContent request per chunk, `--concurrency` in flight
+
+The remote rows measure client overhead plus the mock's simulated latency; pass
+--latency-ms to match what you see from the real API.
+
+Usage (from the repository root):
+    python benchmarks/bench_embedding_backends.py
+    python benchmarks/bench_embedding_backends.py --chunks 5000 --chunk-size 500 --latency-ms 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_e2e import REPO_ROOT, percentile_ms, quiet, start_mock_server
+
+sys.path.insert(0, REPO_ROOT)
+
+VOCABULARY = (
+    "equation root polynomial set function triangle ratio proof solve value sum series term "
+    "সমীকরণ মূল বহুপদী সেট ফাংশন ত্রিভুজ অনুপাত প্রমাণ সমাধান মান যোগফল ধারা পদ x y = + - 2 3 5"
+).split()
+
+
+def synthetic_chunks(count, chunk_size, seed=0):
+    rng = random.Random(seed)
+    chunks = []
+    for _ in range(count):
+        words = []
+        while sum(len(word) + 1 for word in words) < chunk_size:
+            words.append(rng.choice(VOCABULARY))
+        chunks.append(" ".join(words)[:chunk_size])
+    return chunks
+
+
+def result_row(name, latencies, chunk_count, wall):
+    return {
+        "backend": name,
+        "chunks": chunk_count,
+        "chunks_per_s": chunk_count / wall if wall else 0.0,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p99_ms": percentile_ms(latencies, 99),
+    }
+
+
+def bench_local(chunks, batch_size, dimension):
+    from app.models.embedding_backends import HashingEmbeddingBackend
+
+    backend = HashingEmbeddingBackend(dimension)
+    latencies = []
+    start = time.perf_counter()
+    for offset in range(0, len(chunks), batch_size):
+        batch_start = time.perf_counter()
+        backend.embed(chunks[offset:offset + batch_size])
+        latencies.append(time.perf_counter() - batch_start)
+    return result_row("local", latencies, len(chunks), time.perf_counter() - start)
+
+
+def bench_gemini_batch(embedding, chunks, batch_size):
+    latencies = []
+    start = time.perf_counter()
+    for offset in range(0, len(chunks), batch_size):
+        batch_start = time.perf_counter()
+        embedding.generate_embeddings_for_chunks(chunks[offset:offset + batch_size], "bench-key", batch_size=batch_size)
+        latencies.append(time.perf_counter() - batch_start)
+    return result_row("gemini_batch", latencies, len(chunks), time.perf_counter() - start)
+
+
+def bench_gemini_single(embedding, chunks, concurrency):
+    latencies = []
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(chunk):
+            async with semaphore:
+                chunk_start = time.perf_counter()
+                await embedding.generate_embeddings_for_chunk_async(chunk, "bench-key")
+                latencies.append(time.perf_counter() - chunk_start)
+
+        await asyncio.gather(*(one(chunk) for chunk in chunks))
+
+    start = time.perf_counter()
+    embedding.get_client("bench-key").run(run_all())
+    return result_row("gemini_single", latencies, len(chunks), time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--chunk-size", type=int, default=500, help="Characters per chunk")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight for gemini_single")
+    parser.add_argument("--single-chunks", type=int, default=200, help="Chunks used for gemini_single (it is slow)")
+    parser.add_argument("--local-dimension", type=int, default=384)
+    parser.add_argument("--dimension", type=int, default=768, help="Embedding dimension returned by the mock")
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Mock server response delay")
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.1)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.chunks, args.chunk_size)
+    process, base_url = start_mock_server(args)
+    try:
+        # Remote backend with caching and pacing disabled, so only the request path is measured
+        os.environ.update({
+            "GEMINI_API_KEY": "bench-key",
+            "GEMINI_MODEL_ID": "gemini-bench",
+            "GEMINI_API_BASE_URL": base_url,
+            "GEMINI_MAX_CONCURRENCY": str(args.concurrency),
+            "EMBEDDING_BACKEND": "gemini",
+            "EMBEDDING_CACHE_PATH": "",
+            "EMBEDDING_REQUESTS_PER_SECOND": "1000",
+            "EMBEDDING_BURST": "1000",
+        })
+        with quiet():
+            from app.models import embedding
+
+        results = [
+            bench_local(chunks, args.batch_size, args.local_dimension),
+            bench_gemini_batch(embedding, chunks, args.batch_size),
+            bench_gemini_single(embedding, chunks[:args.single_chunks], args.concurrency),
+        ]
+    finally:
+        process.terminate()
+        process.wait()
+
+    print(f"{args.chunks} chunks of {args.chunk_size} chars, batch size {args.batch_size}, mock latency {args.latency_ms} ms")
+    print(f"{'backend':<15}{'chunks':>8}{'chunks/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for result in results:
+        print(f"{result['backend']:<15}{result['chunks']:>8}{result['chunks_per_s']:>12.1f}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# bench_import_time.py
+"""
+Import-time budget for the app packages.
+
+Imports every module of app/models and app/Text_Extraction in a fresh interpreter (so each
+one is a cold start, like a new worker process) and checks that the import:
+
+  - finishes within the budget (`python -X importtime`, cumulative time of the module),
+  - does not load the heavy libraries (numpy, faiss, pandas, aiohttp, pypdf),
+  - prints nothing and needs no Gemini settings,
+  - creates or modifies no file in the working directory (data/processed in particular).
+
+Exits with status 1 if any module breaks the budget, so it can run in CI.
+
+Usage (from the repository root):
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --budget-ms 100 --repeat 5 --json import_times.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+PACKAGES = ("app.models", "app.Text_Extraction")
+HEAVY_MODULES = ("numpy", "faiss", "pandas", "aiohttp", "pypdf")
+
+# Run in the child: import the module (via __import__, which -X importtime reports, unlike
+# importlib.import_module), then report which heavy libraries got loaded
+PROBE = """
+import json, sys
+__import__(sys.argv[1])
+print(json.dumps(sorted(name for name in sys.argv[2:] if name in sys.modules)))
+"""
+
+
+def list_modules():
+    """
+    :return: Dotted names of the packages and every module in them, except __main__.
+    """
+    modules = []
+    for package in PACKAGES:
+        modules.append(package)
+        directory = os.path.join(REPO_ROOT, *package.split("."))
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".py") and name not in ("__init__.py", "__main__.py"):
+                modules.append(f"{package}.{name[:-3]}")
+    return modules
+
+
+def snapshot(directory):
+    """
+    :return: Dict of relative path -> (size, mtime_ns) for every file under the directory.
+    """
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            files[os.path.relpath(path, directory)] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def cumulative_import_us(stderr, module):
+    """
+    :param stderr: Output of `python -X importtime`.
+    :param module: Dotted module name.
+    :return: Cumulative import time of the module in microseconds, or None if not found.
+    """
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and line.rsplit("|", 1)[-1].strip() == module:
+            return int(line.split("|")[1])
+    return None
+
+
+def measure(module, workspace, env, repeat):
+    """
+    Import a module `repeat` times, each in a new interpreter.
+
+    :return: Dict with the median import time, the heavy modules loaded and anything printed.
+    """
+    times = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", PROBE, module, *HEAVY_MODULES],
+            cwd=workspace, env=env, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            return {"module": module, "error": result.stderr.strip().splitlines()[-1]}
+        *printed, heavy = result.stdout.strip().splitlines()
+        times.append(cumulative_import_us(result.stderr, module) / 1000)
+    return {
+        "module": module,
+        "import_ms": statistics.median(times),
+        "heavy_modules": json.loads(heavy),
+        "printed": "\n".join(printed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=150.0,
+                        help="Maximum cumulative import time per module (asyncio alone takes ~60 ms)")
+    parser.add_argument("--repeat", type=int, default=3, help="Cold imports per module (the median is reported)")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    # A workspace with an existing index, so writes to data/processed would be noticed
+    workspace = tempfile.mkdtemp(prefix="askmath-import-")
+    processed = os.path.join(workspace, "data", "processed")
+    os.makedirs(processed)
+    with open(os.path.join(processed, "faiss_index"), "wb") as f:
+        f.write(b"sentinel")
+    for asset_dir in ("csv",):
+        shutil.copytree(os.path.join(REPO_ROOT, "data", asset_dir), os.path.join(workspace, "data", asset_dir))
+
+    # No Gemini settings: importing must not require them
+    env = {key: value for key, value in os.environ.items() if not key.startswith("GEMINI_")}
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+
+    try:
+        before = snapshot(workspace)
+        results = [measure(module, workspace, env, args.repeat) for module in list_modules()]
+        after = snapshot(workspace)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    failures = 0
+    print(f"{'module':<40}{'import ms':>10}  problems")
+    for result in results:
+        problems = []
+        if "error" in result:
+            problems.append(result["error"])
+        else:
+            if result["import_ms"] > args.budget_ms:
+                problems.append(f"over the {args.budget_ms:g} ms budget")
+            if result["heavy_modules"]:
+                problems.append(f"loads {', '.join(result['heavy_modules'])}")
+            if result["printed"]:
+                problems.append("prints at import")
+        failures += bool(problems)
+        import_ms = f"{result['import_ms']:.1f}" if "import_ms" in result else "-"
+        print(f"{result['module']:<40}{import_ms:>10}  {'; '.join(problems)}")
+
+    changed = sorted(path for path in set(before) | set(after) if before.get(path) != after.get(path))
+    if changed:
+        failures += 1
+        print(f"\n❌ Importing changed files in the working directory: {', '.join(changed)}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"budget_ms": args.budget_ms, "results": results, "changed_files": changed}, f, indent=2)
+
+    if failures:
+        print(f"\n❌ {failures} import budget violation(s)")
+        sys.exit(1)
+    print(f"\n✅ All {len(results)} modules import within {args.budget_ms:g} ms without side effects")
+
+
+if __name__ == "__main__":
+    main()
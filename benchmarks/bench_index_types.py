@@ -0,0 +1,128 @@
+# bench_index_types.py
+"""
+Recall/latency benchmark for the FAISS index types in app/models/index_factory.py.
+
+Runs a query set against every index type and reports recall@k against the exact flat
+baseline, p50/p99 single-query latency, build (train + add) time and serialized size.
+
+Usage (from the repository root):
+    python benchmarks/bench_index_types.py --vectors data/processed/embeddings.npy
+    python benchmarks/bench_index_types.py --synthetic 100000 --dimension 768 --queries 500
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from app.models.index_factory import INDEX_TYPES, build_faiss_index, set_search_params
+
+
+def synthetic_vectors(count, dimension, clusters=200, seed=0):
+    """
+    Clustered Gaussian vectors, closer to real embedding distributions than uniform noise.
+
+    :param count: Number of vectors.
+    :param dimension: Vector dimension.
+    :param clusters: Number of cluster centers.
+    :param seed: Random seed.
+    :return: Float32 matrix of shape (count, dimension).
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension), dtype=np.float32)
+    labels = rng.integers(0, clusters, size=count)
+    return centers[labels] + 0.3 * rng.standard_normal((count, dimension), dtype=np.float32)
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000.0)
+
+
+def benchmark_index(index_type, base, queries, ground_truth, top_k, params, nprobe, ef_search):
+    """
+    Build one index type and measure it.
+
+    :return: Dict of results for the report.
+    """
+    start = time.perf_counter()
+    index = build_faiss_index(base, index_type, **params)
+    build_seconds = time.perf_counter() - start
+    set_search_params(index, nprobe=nprobe, ef_search=ef_search)
+
+    # Single-query latency is what the recommendation path pays per request
+    latencies = []
+    found = np.empty((len(queries), top_k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, indices = index.search(query.reshape(1, -1), top_k)
+        latencies.append(time.perf_counter() - start)
+        found[i] = indices[0]
+
+    hits = sum(len(set(found[i]) & set(ground_truth[i])) for i in range(len(queries)))
+    return {
+        "index_type": index_type,
+        "recall_at_k": hits / float(ground_truth.size),
+        "p50_ms": percentile_ms(latencies, 50),
+        "p99_ms": percentile_ms(latencies, 99),
+        "build_s": build_seconds,
+        "size_mb": faiss.serialize_index(index).nbytes / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", help="Path to a .npy float32 matrix of corpus embeddings")
+    parser.add_argument("--synthetic", type=int, default=50000, help="Number of synthetic vectors if --vectors is not given")
+    parser.add_argument("--dimension", type=int, default=768, help="Dimension of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200, help="Number of held-out query vectors")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--index-types", default=",".join(INDEX_TYPES), help="Comma-separated index types to compare")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF clusters (default: 4*sqrt(n))")
+    parser.add_argument("--pq-m", type=int, default=16)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.vectors:
+        vectors = np.ascontiguousarray(np.load(args.vectors), dtype="float32")
+    else:
+        vectors = synthetic_vectors(args.synthetic + args.queries, args.dimension)
+
+    queries, base = vectors[:args.queries], vectors[args.queries:]
+    nlist = args.nlist or max(1, int(4 * np.sqrt(len(base))))
+    params_by_type = {
+        "flat": {},
+        "ivf_flat": {"nlist": nlist},
+        "ivf_pq": {"nlist": nlist, "pq_m": args.pq_m},
+        "hnsw": {"hnsw_m": args.hnsw_m},
+    }
+
+    # Exact neighbors from the flat baseline are the ground truth for recall
+    _, ground_truth = build_faiss_index(base, "flat").search(queries, args.top_k)
+
+    print(f"Corpus: {len(base)} x {base.shape[1]}, queries: {len(queries)}, k={args.top_k}, nlist={nlist}")
+    print(f"{'index':<10}{'recall@k':>10}{'p50 ms':>10}{'p99 ms':>10}{'build s':>10}{'size MB':>10}")
+    results = []
+    for index_type in args.index_types.split(","):
+        result = benchmark_index(
+            index_type, base, queries, ground_truth, args.top_k, params_by_type[index_type], args.nprobe, args.ef_search
+        )
+        results.append(result)
+        print(
+            f"{index_type:<10}{result['recall_at_k']:>10.3f}{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}"
+            f"{result['build_s']:>10.2f}{result['size_mb']:>10.1f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+# bench_upload_memory.py
+"""
+Peak memory of sending a large PDF to Gemini, as a function of the file size.
+
+Starts benchmarks/mock_gemini.py as a subprocess in place of the Gemini API, writes PDF
+files of the given sizes and extracts each one in a fresh interpreter, recording how much
+the process peak RSS grows during the call. Modes:
+
+  buffered  the previous request path: read the file, base64 it into a string, embed the
+            string in the payload dict and serialize that (kept for comparison)
+  inline    pdf_extractor.extract_text_from_pdf with inline data: the file is read and
+            base64-encoded chunk by chunk while the request body is sent
+  upload    the same call above GEMINI_INLINE_MAX_BYTES: the file is streamed to the Files
+            API (resumable upload) and the request references it by URI
+
+With streaming, the growth should stay flat (a few MB) whatever the file size; the
+buffered path grows by several times the file size.
+
+Usage (from the repository root):
+    python benchmarks/bench_upload_memory.py
+    python benchmarks/bench_upload_memory.py --sizes-mb 16,64,128 --modes inline,upload --json upload_memory.json
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+MOCK_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_gemini.py")
+MODES = ("buffered", "inline", "upload")
+
+# Run in the child: warm up the client with a tiny PDF (so imports and the connection pool are
+# not counted), then extract the large one and report the peak RSS before and after
+PROBE = """
+import base64, json, resource, sys
+from app.models import pdf_extractor
+from app.models.gemini_client import get_client, response_text
+
+mode, path, small_path = sys.argv[1:4]
+
+def peak_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+pdf_extractor.extract_text_from_pdf(small_path)
+before = peak_mb()
+if mode == "buffered":
+    client = get_client(pdf_extractor.GEMINI_API_KEY)
+    with open(path, "rb") as pdf_file:
+        pdf_bytes = pdf_file.read()
+    parts = [
+        {"text": "Extract all the content from this PDF."},
+        {"inlineData": {"mimeType": "application/pdf", "data": base64.b64encode(pdf_bytes).decode("utf-8")}},
+    ]
+    text = response_text(client.run(client.generate_content(f"models/{pdf_extractor.GEMINI_MODEL_ID}", parts)))
+else:
+    text = pdf_extractor.extract_text_from_pdf(path)
+print(json.dumps({"ok": bool(text), "before_mb": before, "after_mb": peak_mb()}))
+"""
+
+
+def write_pdf(path, size):
+    """
+    Write a file of `size` bytes that starts like a PDF; the content is random so nothing
+    along the way can compress or deduplicate it.
+    """
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        remaining = size - 9
+        while remaining > 0:
+            block = os.urandom(min(remaining, 1 << 20))
+            f.write(block)
+            remaining -= len(block)
+
+
+def measure(mode, path, small_path, env):
+    """
+    :return: Dict with the peak RSS before the call and its growth during it, in MB.
+    """
+    child_env = dict(env, GEMINI_INLINE_MAX_BYTES="0" if mode == "upload" else str(1 << 40))
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, mode, path, small_path],
+        cwd=REPO_ROOT, env=child_env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1]}
+    values = json.loads(result.stdout.strip().splitlines()[-1])
+    return {"ok": values["ok"], "base_mb": values["before_mb"], "growth_mb": values["after_mb"] - values["before_mb"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mb", default="1,8,32,64", help="Comma-separated PDF sizes in MB")
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated modes to run")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    sizes = [float(size) for size in args.sizes_mb.split(",")]
+    modes = args.modes.split(",")
+    for mode in modes:
+        if mode not in MODES:
+            raise SystemExit(f"Unknown mode: {mode}")
+
+    process = subprocess.Popen([sys.executable, MOCK_SERVER], stdout=subprocess.PIPE, text=True)
+    port = int(process.stdout.readline())
+    workspace = tempfile.mkdtemp(prefix="askmath-upload-")
+    env = dict(
+        os.environ,
+        GEMINI_API_KEY="bench-key",
+        GEMINI_MODEL_ID="gemini-bench",
+        GEMINI_API_BASE_URL=f"http://127.0.0.1:{port}/v1beta",
+        PYTHONPATH=REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""),
+    )
+
+    results = []
+    try:
+        small_path = os.path.join(workspace, "small.pdf")
+        write_pdf(small_path, 64 * 1024)
+        print(f"{'size MB':>8}" + "".join(f"{mode + ' +MB':>16}" for mode in modes))
+        for size_mb in sizes:
+            path = os.path.join(workspace, f"book_{size_mb:g}mb.pdf")
+            write_pdf(path, int(size_mb * 1024 * 1024))
+            row = {"size_mb": size_mb}
+            for mode in modes:
+                row[mode] = measure(mode, path, small_path, env)
+            os.remove(path)
+            results.append(row)
+
+            cells = []
+            for mode in modes:
+                result = row[mode]
+                if "error" in result:
+                    cells.append("error")
+                else:
+                    cells.append(f"{result['growth_mb']:.1f}" + ("" if result["ok"] else " (failed)"))
+            print(f"{size_mb:>8g}" + "".join(f"{cell:>16}" for cell in cells))
+    finally:
+        process.terminate()
+        process.wait()
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    for row in results:
+        for mode in modes:
+            if "error" in row[mode]:
+                print(f"❌ {mode} at {row['size_mb']:g} MB: {row[mode]['error']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+# mock_gemini.py
+"""
+Local stand-in for the Gemini REST API, for offline benchmarks.
+
+Answers `:generateContent` (plain text, or a JSON array per image when structured output is
+requested), `:embedContent` and `:batchEmbedContents` with deterministic fake results after
+a configurable delay, and can inject 429 responses with a Retry-After header so the client's
+retry path is exercised too. Embeddings are seeded from the text,
+so identical inputs always produce identical vectors. Files API uploads (resumable protocol,
+`/upload/v1beta/files`) are accepted and only their size and hash are kept, so `fileData`
+parts can reference them.
+
+Usage (prints the bound port on the first line of stdout):
+    python benchmarks/mock_gemini.py --port 8089 --latency-ms 150 --fail-rate 0.02
+
+Point the app at it with GEMINI_API_BASE_URL=http://127.0.0.1:<port>/v1beta.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+PAGE_RANGE = re.compile(r"pages (\d+) to (\d+)")
+
+# Stand-in OCR answers; varied so downstream embeddings and searches do not all coincide
+OCR_SAMPLES = [
+    "Solve for x: 2x^2 - 5x + 3 = 0",
+    "Prove that the square root of 2 is irrational.",
+    "If A = {1, 2, 3} and B = {3, 4}, find A ∪ B and A ∩ B.",
+    "Find the value of sin 30° + cos 60°.",
+    "Simplify (a + b)^2 - (a - b)^2.",
+    "The sum of an arithmetic series with first term 3 and common difference 4 has 20 terms. Find the sum.",
+]
+
+
+def fake_embedding(text, dimension):
+    """
+    :return: Deterministic unit-length vector for `text`.
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+def fake_page_text(page, words=180):
+    rng = random.Random(page)
+    vocabulary = ["equation", "root", "polynomial", "set", "function", "triangle", "ratio", "proof", "x", "y", "=", "+"]
+    return f"Page {page}. " + " ".join(rng.choice(vocabulary) for _ in range(words))
+
+
+class MockGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=()):
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        match = re.search(r"/files/(\d+)$", self.path)
+        file = self.server.files.get(int(match.group(1))) if match else None
+        if file is None:
+            self._send(404, {"error": {"code": 404, "message": f"Unknown file {self.path}"}})
+        else:
+            self._send(200, file)
+
+    def _upload(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        command = self.headers.get("X-Goog-Upload-Command", "")
+        if command == "start":
+            self.rfile.read(length)
+            upload_id = server.new_upload(self.headers.get("X-Goog-Upload-Header-Content-Type", "application/octet-stream"))
+            session_url = f"http://127.0.0.1:{server.server_port}/upload/v1beta/files?upload_id={upload_id}"
+            self._send(200, {}, [("X-Goog-Upload-URL", session_url), ("X-Goog-Upload-Status", "active")])
+            return
+
+        # Hash the content as it arrives instead of keeping it, like a real upload target
+        upload_id = int(self.path.rsplit("upload_id=", 1)[-1])
+        digest = hashlib.sha256()
+        remaining = length
+        while remaining:
+            block = self.rfile.read(min(remaining, 1 << 20))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+        file = server.files[upload_id]
+        file.update(sizeBytes=str(length - remaining), sha256Hash=digest.hexdigest(), state="ACTIVE")
+        self._send(200, {"file": file}, [("X-Goog-Upload-Status", "final")])
+
+    def do_POST(self):
+        server = self.server
+        if self.path.startswith("/upload/"):
+            server.record_request()
+            self._upload()
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server.record_request()
+
+        delay = server.latency + random.uniform(0.0, server.jitter)
+        if delay:
+            time.sleep(delay)
+
+        if random.random() < server.fail_rate:
+            server.record_throttled()
+            self._send(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}, [("Retry-After", str(server.retry_after))])
+            return
+
+        if self.path.endswith(":batchEmbedContents"):
+            self._send(200, {"embeddings": [
+                {"values": fake_embedding(request["content"]["parts"][0]["text"], server.dimension)}
+                for request in body.get("requests", [])
+            ]})
+        elif self.path.endswith(":embedContent"):
+            self._send(200, {"embedding": {"values": fake_embedding(body["content"]["parts"][0]["text"], server.dimension)}})
+        elif self.path.endswith(":generateContent"):
+            self._send(200, {"candidates": [{"content": {"parts": [{"text": self._generate_text(body)}]}}]})
+        else:
+            self._send(404, {"error": {"code": 404, "message": f"Unknown endpoint {self.path}"}})
+
+    def _media(self, part):
+        if "inlineData" in part:
+            return part["inlineData"]
+        # Stand in for uploaded content with its hash, which is what OCR samples are picked by
+        file = self.server.files.get(int(part["fileData"]["fileUri"].rsplit("/", 1)[-1]), {})
+        return {"mimeType": part["fileData"].get("mimeType"), "data": file.get("sha256Hash", "")}
+
+    def _generate_text(self, body):
+        parts = body["contents"][0]["parts"]
+        prompt = parts[0].get("text", "")
+        media = [self._media(part) for part in parts if "inlineData" in part or "fileData" in part]
+        inline = media[0] if media else {}
+
+        # Batched OCR asks for structured output: one {"image", "text"} object per image
+        if body.get("generationConfig", {}).get("responseMimeType") == "application/json":
+            return json.dumps([
+                {"image": number, "text": self._ocr_text(item)} for number, item in enumerate(media, start=1)
+            ])
+
+        if inline.get("mimeType") == "application/pdf":
+            match = PAGE_RANGE.search(prompt)
+            if match is None:
+                return fake_page_text(len(inline.get("data", "")))
+            first_page, last_page = int(match.group(1)), int(match.group(2))
+            return "\n".join(f"=== PAGE {page} ===\n{fake_page_text(page)}" for page in range(first_page, last_page + 1))
+
+        return self._ocr_text(inline)
+
+    @staticmethod
+    def _ocr_text(inline):
+        digest = hashlib.sha256(inline.get("data", "").encode("ascii")).digest()
+        return OCR_SAMPLES[digest[0] % len(OCR_SAMPLES)]
+
+
+class MockGeminiServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server that answers like the Gemini API.
+    """
+    daemon_threads = True
+
+    def __init__(self, port=0, latency_ms=0.0, jitter_ms=0.0, fail_rate=0.0, retry_after=0.1, dimension=768):
+        """
+        :param port: Port to bind on 127.0.0.1 (0 picks a free one).
+        :param latency_ms: Fixed delay added to every response.
+        :param jitter_ms: Extra uniform random delay of up to this many milliseconds.
+        :param fail_rate: Probability of answering 429 instead of the real response.
+        :param retry_after: Seconds advertised in the Retry-After header of 429 responses.
+        :param dimension: Dimension of the fake embeddings.
+        """
+        super().__init__(("127.0.0.1", port), MockGeminiHandler)
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.fail_rate = fail_rate
+        self.retry_after = retry_after
+        self.dimension = dimension
+        self.requests = 0
+        self.throttled = 0
+        self.files = {}
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_throttled(self):
+        with self._lock:
+            self.throttled += 1
+
+    def new_upload(self, mime_type):
+        """
+        :return: ID of a new upload session; the file resource is completed when the upload finishes.
+        """
+        with self._lock:
+            upload_id = len(self.files) + 1
+            self.files[upload_id] = {
+                "name": f"files/{upload_id}",
+                "uri": f"http://127.0.0.1:{self.server_port}/v1beta/files/{upload_id}",
+                "mimeType": mime_type,
+                "state": "PROCESSING",
+            }
+        return upload_id
+
+    def start(self):
+        """
+        Serve from a daemon thread.
+
+        :return: Base URL to use as GEMINI_API_BASE_URL.
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.server_port}/v1beta"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Probability of a 429 response")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After seconds sent with 429 responses")
+    parser.add_argument("--dimension", type=int, default=768)
+    args = parser.parse_args()
+
+    server = MockGeminiServer(args.port, args.latency_ms, args.jitter_ms, args.fail_rate, args.retry_after, args.dimension)
+    print(server.server_port, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"requests={server.requests} throttled={server.throttled}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()